@@ -0,0 +1,1103 @@
+#!/usr/bin/env python3
+"""
+Mac Setup Benchmarks
+
+Compare the performance of the configuration manager against the behaviour it
+replaced. Each benchmark prints wall time and the number of processes forked.
+
+Usage:
+    python scripts/benchmark.py [BENCHMARK ...] [--repeat N]
+    python scripts/benchmark.py suite [--sizes 10,1000,100000] [--save] [--compare [FILE]]
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import tempfile
+import subprocess
+import tracemalloc
+import importlib.util
+from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+RESULTS_DIR = PROJECT_ROOT / ".benchmarks"
+SUITE_SIZES = [10, 100, 1000, 10000]
+
+def load_script(filename: str, module_name: str):
+    """Import one of the hyphenated scripts in this directory as a module"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPT_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+class ForkCounter:
+    """Count child processes started through subprocess"""
+
+    def __init__(self):
+        self.count = 0
+
+    @contextmanager
+    def counting(self):
+        original_init = subprocess.Popen.__init__
+        counter = self
+
+        def counting_init(self, *args, **kwargs):
+            counter.count += 1
+            original_init(self, *args, **kwargs)
+
+        subprocess.Popen.__init__ = counting_init
+        try:
+            yield self
+        finally:
+            subprocess.Popen.__init__ = original_init
+
+def measure(label: str, func: Callable[[], None], repeat: int) -> Dict[str, float]:
+    """Run func `repeat` times and report the best wall time and forks per run"""
+    best = float("inf")
+    forks = 0
+    for _ in range(repeat):
+        counter = ForkCounter()
+        with counter.counting():
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        forks = counter.count
+    print(f"  {label:<48} {best * 1000:10.2f} ms {forks:8d} forks")
+    return {"seconds": best, "forks": forks}
+
+def legacy_check_requirements(config) -> List[str]:
+    """The original one-`which`-per-requirement check"""
+    missing = []
+    for req in config.requires:
+        result = subprocess.run(['which', req], capture_output=True, text=True)
+        if result.returncode != 0:
+            missing.append(req)
+    return missing
+
+def bench_requirements(cm, repeat: int):
+    """`--check` followed by a full deploy-time check, old vs new"""
+    manager = cm.ConfigManager(PROJECT_ROOT)
+    items = [item for configs in manager.configs.values() for item in configs]
+    print(f"requirements: {len(items)} configs, "
+          f"{sum(len(item.requires) for item in items)} requirement lookups per pass")
+
+    def legacy():
+        for _ in range(2):
+            for item in items:
+                legacy_check_requirements(item)
+
+    def resolver(cache_file=None):
+        r = cm.RequirementResolver(cache_file)
+        for _ in range(2):
+            for item in items:
+                r.missing(item.requires)
+        r.save()
+
+    results = {"legacy": measure("legacy (which per requirement)", legacy, repeat)}
+    results["cold"] = measure("resolver, no disk cache", resolver, repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = Path(tmp) / "requirements.json"
+        resolver(cache_file)
+        results["warm"] = measure("resolver, warm disk cache", lambda: resolver(cache_file), repeat)
+    return results
+
+@contextmanager
+def temporary_home():
+    """Point HOME at a scratch directory so deploys never touch the real one"""
+    original = os.environ.get("HOME")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["HOME"] = tmp
+        try:
+            yield Path(tmp)
+        finally:
+            if original is None:
+                del os.environ["HOME"]
+            else:
+                os.environ["HOME"] = original
+
+@contextmanager
+def quiet_console(cm):
+    """Silence the manager's console, including prints from worker threads"""
+    cm.console.quiet = True
+    try:
+        yield
+    finally:
+        cm.console.quiet = False
+
+@contextmanager
+def slow_copies(cm, latency: float):
+    """Add a fixed delay to every copy to emulate a network home directory"""
+    original_copy = cm.shutil.copy2
+
+    def slow_copy(*args, **kwargs):
+        time.sleep(latency)
+        return original_copy(*args, **kwargs)
+
+    cm.shutil.copy2 = slow_copy
+    try:
+        yield
+    finally:
+        cm.shutil.copy2 = original_copy
+
+def isolate_manager(cm, manager, root: Path):
+    """Keep a manager's backups, journals and deploy state under root"""
+    manager.backup_dir = root / ".config-backups"
+    manager.journal_dir = manager.backup_dir / "journal"
+    manager.backups = cm.BackupStore(manager.backup_dir)
+    manager.state = cm.DeployState(root / ".config-cache" / "deploy-state.json")
+
+def bench_deploy(cm, repeat: int, latency: float = 0.02):
+    """Full-profile deploy with 1 worker vs the default pool"""
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        manager = cm.ConfigManager(PROJECT_ROOT)
+        isolate_manager(cm, manager, Path(tmp))
+        items = [cm.ConfigItem.create(item.name, item.source, item.dest, item.category, item.description)
+                 for configs in manager.configs.values() for item in configs]
+        groups = len(cm.DeployScheduler.group_by_directory(items))
+        print(f"deploy: {len(items)} configs in {groups} destination directories, "
+              f"{latency * 1000:.0f} ms simulated latency per copy")
+
+        results = {}
+        with slow_copies(cm, latency), quiet_console(cm):
+            for jobs in (1, 4, cm.DeployScheduler.DEFAULT_JOBS):
+                scheduler = cm.DeployScheduler(manager, jobs, force=True)
+                results[f"jobs={jobs}"] = measure(f"{jobs} worker(s)", lambda: scheduler.run(items), repeat)
+        return results
+
+def write_synthetic_registry(root: Path, count: int, size: int = 0, chain: int = 0) -> Path:
+    """Create a configs/ tree and registry with `count` entries under root
+
+    Each source file is padded to `size` bytes when size is given. With
+    chain, config i is deployed after config i - chain.
+    """
+    configs_dir = root / "configs"
+    categories: Dict[str, list] = {}
+    for i in range(count):
+        category = f"category-{i % 20}"
+        source = f"{category}/config-{i}.conf"
+        (configs_dir / category).mkdir(parents=True, exist_ok=True)
+        header = f"# synthetic config {i}\n"
+        (configs_dir / source).write_text(header + "#" * max(0, size - len(header)))
+        categories.setdefault(category, []).append({
+            "name": f"Config {i}", "source": source, "dest": f"~/.config/synthetic/{i}/config",
+            "description": f"Synthetic configuration {i}", "requires": ["sh"],
+        })
+        if chain and i >= chain:
+            categories[category][-1]["after"] = [f"Config {i - chain}"]
+    registry_file = configs_dir / "registry.json"
+    registry_file.write_text(json.dumps({"categories": categories}))
+    return registry_file
+
+def bench_registry(cm, repeat: int, count: int = 5000):
+    """Single-config lookup: eager load-and-stat vs the lazy registry"""
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count)
+        print(f"registry: {count} synthetic configs, deploying one by name")
+
+        def eager():
+            registry = cm.ConfigRegistry(registry_file, root / "configs")
+            configs = {}
+            for category, items in registry.by_category.items():
+                configs[category] = [item for item in items
+                                     if (root / "configs" / item.source).exists() and item.check_installed() is not None]
+            target = f"config {count - 1}"
+            for items in configs.values():
+                for item in items:
+                    if item.name.lower() == target:
+                        return item
+
+        def lazy():
+            manager = cm.ConfigManager(root, registry_file=registry_file)
+            return manager.find_config(f"Config {count - 1}")
+
+        return {
+            "eager": measure("eager (stat every source and dest)", eager, repeat),
+            "lazy": measure("lazy registry lookup", lazy, repeat),
+        }
+
+def bench_link(cm, repeat: int, count: int = 200, size: int = 256 * 1024):
+    """Forced redeploy of large configs: copy vs symlink vs hardlink"""
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count, size)
+        print(f"link: {count} configs of {size // 1024} KB each")
+
+        results = {}
+        with quiet_console(cm):
+            for mode in ("copy", "symlink", "hardlink"):
+                manager = cm.ConfigManager(root, registry_file=registry_file, link=mode != "copy")
+                items = [item._replace(link=mode) for item in manager.all_configs()]
+
+                def deploy():
+                    for item in items:
+                        manager.deploy_config(item, force=True)
+
+                results[mode] = measure(f"{mode} mode", deploy, repeat)
+        return results
+
+def write_synthetic_brewfile(path: Path, count: int):
+    """Write a Brewfile with `count` entries of every kind, comments and options"""
+    kinds = ('brew "formula-{i}"', 'cask "app-{i}"', 'brew "svc-{i}", restart_service: true',
+             'tap "org/tap-{i}"', 'mas "App {i}", id: {i}', 'vscode "pub.ext-{i}"')
+    with open(path, "w") as f:
+        f.write("# Synthetic Brewfile\n")
+        for i in range(count):
+            if i % 50 == 0:
+                f.write(f"\n# Section {i // 50}\n")
+            f.write(kinds[i % len(kinds)].format(i=i) + f"  # entry {i}\n")
+
+def legacy_parse_brewfile(path: Path):
+    """The original two-regex-per-line parser"""
+    formulas, casks = set(), set()
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            brew_match = re.match(r'brew\s+"([^"]+)"', line)
+            if brew_match:
+                formulas.add(brew_match.group(1))
+            cask_match = re.match(r'cask\s+"([^"]+)"', line)
+            if cask_match:
+                casks.add(cask_match.group(1))
+    return formulas, casks
+
+def bench_brewfile(cm, repeat: int, count: int = 50000):
+    """Brewfile parsing: legacy regexes vs the tokenizer, cold and from the parse cache"""
+    vg = load_script("validate-brewfile-graph.py", "validate_brewfile_graph")
+    with tempfile.TemporaryDirectory() as tmp:
+        brewfile = Path(tmp) / "Brewfile"
+        cache_dir = Path(tmp) / "cache"
+        write_synthetic_brewfile(brewfile, count)
+        print(f"brewfile: {count} entries")
+
+        results = {"legacy": measure("legacy (brew and cask only)", lambda: legacy_parse_brewfile(brewfile), repeat)}
+        results["tokenizer"] = measure("tokenizer, no cache",
+                                       lambda: vg.BrewfileParser(str(brewfile), None).parse(), repeat)
+
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            vg.BrewfileParser(str(brewfile), cache_dir).parse()
+
+        results["cold"] = measure("tokenizer, writing the parse cache", cold, repeat)
+        results["cached"] = measure("warm parse cache",
+                                    lambda: vg.BrewfileParser(str(brewfile), cache_dir).parse(), repeat)
+        return results
+
+def write_brew_snapshot(path: Path, count: int):
+    """A `brew info --json=v2 --installed` snapshot for write_synthetic_brewfile's packages"""
+    formulae = [{"name": f"formula-{i}", "aliases": [], "installed": [{"version": "1.0"}],
+                 "binaries": [f"formula-{i}-bin"]} for i in range(0, count, 6)]
+    casks = [{"token": f"app-{i}", "installed": "1.0",
+              "artifacts": [{"app": [f"App {i}.app"]}, {"binary": [f"$APPDIR/App {i}.app/bin/app-{i}"]}]}
+             for i in range(1, count, 6)]
+    path.write_text(json.dumps({"formulae": formulae, "casks": casks}))
+
+def bench_packages(cm, repeat: int, count: int = 20000):
+    """Requirement checks through the package index: compile, cached load and lookups"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        write_synthetic_brewfile(root / "Brewfile", count)
+        write_brew_snapshot(root / "snapshot.json", count)
+        # Half installed, half missing, by package name and by provided command
+        requirements = [f"formula-{i}" for i in range(0, count, 3)] + \
+                       [f"app-{i}" for i in range(1, count, 3)]
+        print(f"packages: {count} Brewfile entries, {len(requirements)} requirements checked")
+
+        def index():
+            return cm.PackageIndex(root / "packages.json", root / "Brewfile", root / "snapshot.json",
+                                   root / "package-index.json", cm.RequirementResolver(path=""), cm.StatCache())
+
+        def compile_index():
+            (root / "package-index.json").unlink(missing_ok=True)
+            index().load()
+
+        warm = index()
+        warm.load()
+        return {
+            "compile": measure("compile from Brewfile and snapshot", compile_index, repeat),
+            "cached": measure("load the cached index", lambda: index().load(), repeat),
+            "check": measure("check every requirement", lambda: warm.missing(requirements), repeat),
+            "hints": measure("install hints for the missing ones",
+                             lambda: warm.install_commands(warm.missing(requirements)), repeat),
+        }
+
+def bench_graph(cm, repeat: int, count: int = 20000, mismatches: int = 10):
+    """Graph validation: pull every tool vs server-side diff, by records transferred"""
+    vg = load_script("validate-brewfile-graph.py", "validate_brewfile_graph")
+    tools = [{"tool_key": f"tool-{i}", "command": f"brew install formula-{i}"} for i in range(count)]
+    brewfile = {f"formula-{i}" for i in range(mismatches, count + mismatches)}
+    print(f"graph: {count} tools, {2 * mismatches} mismatches (in-process stand-in driver)")
+
+    def run(method):
+        driver = vg.InMemoryGraphDriver({"bench": tools})
+        validator = vg.KnowledgeGraphValidator(None, None, None, "bench", driver=driver)
+        report = vg.ValidationReport()
+        if method == "pull":
+            report.compare(brewfile, validator.get_tools_from_graph())
+        else:
+            report.record_diff(brewfile, *validator.diff(brewfile))
+        return driver.records_returned
+
+    results = {}
+    for method, label in (("pull", "pull all tools, compare locally"), ("diff", "server-side diff")):
+        records = run(method)
+        results[method] = measure(f"{label} ({records} records)", lambda: run(method), repeat)
+        results[method]["records"] = records
+    return results
+
+def bench_projects(cm, repeat: int, projects: int = 50, count: int = 5000, latency: float = 0.02):
+    """Many Brewfile/project pairs: one after another vs process pool plus a single query"""
+    vg = load_script("validate-brewfile-graph.py", "validate_brewfile_graph")
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = {}
+        graph = {}
+        for p in range(projects):
+            path = Path(tmp) / f"Brewfile-{p}"
+            write_synthetic_brewfile(path, count)
+            targets[f"image-{p}"] = str(path)
+            graph[f"image-{p}"] = [{"tool_key": f"tool-{i}", "command": f"brew install formula-{i}"}
+                                   for i in range(0, count, 6)]
+        print(f"projects: {projects} Brewfiles of {count} entries, "
+              f"{latency * 1000:.0f} ms simulated latency per query")
+
+        def validator():
+            driver = vg.InMemoryGraphDriver(graph)
+            run = driver.run
+
+            def slow_run(query, **params):
+                time.sleep(latency)
+                return run(query, **params)
+
+            driver.run = slow_run
+            return vg.KnowledgeGraphValidator(None, None, None, driver=driver)
+
+        def one_at_a_time():
+            graph_validator = validator()
+            for project, path in targets.items():
+                graph_validator.project = project
+                graph_validator.diff(vg.parse_brewfile_tools(path))
+
+        def together():
+            tools = vg.parse_brewfiles(list(targets.values()))
+            validator().diff_projects({project: tools[path] for project, path in targets.items()})
+
+        def single():
+            graph_validator = validator()
+            graph_validator.project = "image-0"
+            graph_validator.diff(vg.parse_brewfile_tools(targets["image-0"]))
+
+        return {
+            "single": measure("one project (today's single run)", single, repeat),
+            "sequential": measure(f"{projects} projects one after another", one_at_a_time, repeat),
+            "together": measure(f"{projects} projects, {os.cpu_count()} processes + one query",
+                                together, repeat),
+        }
+
+def bench_snapshot(cm, repeat: int, count: int = 20000, mismatches: int = 10, latency: float = 0.02):
+    """Validation against a live server vs the SQLite snapshot, and refreshing the snapshot"""
+    vg = load_script("validate-brewfile-graph.py", "validate_brewfile_graph")
+    tools = [{"tool_key": f"tool-{i}", "category": f"category-{i % 20}", "command": f"brew install formula-{i}"}
+             for i in range(count)]
+    brewfile = {f"formula-{i}" for i in range(mismatches, count + mismatches)}
+    print(f"snapshot: {count} tools, {latency * 1000:.0f} ms simulated latency per server query")
+
+    def server():
+        driver = vg.InMemoryGraphDriver({"bench": tools})
+        run = driver.run
+
+        def slow_run(query, **params):
+            time.sleep(latency)
+            return run(query, **params)
+
+        driver.run = slow_run
+        return vg.KnowledgeGraphValidator(None, None, None, "bench", driver=driver)
+
+    def validate(validator):
+        report = vg.ValidationReport()
+        report.compare(brewfile, validator.get_tools_from_graph())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "graph.sqlite")
+
+        def export():
+            Path(path).unlink(missing_ok=True)
+            snapshot = vg.GraphSnapshot(path)
+            snapshot.refresh(server(), ["bench"])
+            snapshot.close()
+
+        def refresh_unchanged():
+            snapshot = vg.GraphSnapshot(path)
+            snapshot.refresh(server(), ["bench"])
+            snapshot.close()
+
+        def offline():
+            validate(vg.KnowledgeGraphValidator(None, None, None, "bench", driver=vg.GraphSnapshot(path)))
+
+        results = {"live": measure("live server, pull and compare", lambda: validate(server()), repeat)}
+        results["export"] = measure("export the project to a new snapshot", export, repeat)
+        results["refresh"] = measure("refresh, server marker unchanged", refresh_unchanged, repeat)
+        results["offline"] = measure("offline, compare against the snapshot", offline, repeat)
+        results["snapshot_bytes"] = os.path.getsize(path)
+        print(f"  {'snapshot size':<48} {results['snapshot_bytes'] / 1024:10.0f} KB")
+        return results
+
+def bench_tui(cm, repeat: int, count: int = 10000):
+    """Redraw after one keypress in a huge category: full table, visible window, changed lines"""
+    cm.load_rich()
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count)
+        manager = cm.ConfigManager(root, registry_file=registry_file)
+        configs = [item for items in manager.configs.values() for item in items]
+        for item in configs:
+            item.installed = False
+        screen = cm.Console(file=io.StringIO(), width=120, height=40, force_terminal=True)
+        print(f"tui: {count} configs in one category, 120x40 terminal")
+
+        def full_table():
+            table = cm.Table(box=cm.box.ROUNDED)
+            for _ in range(5):
+                table.add_column("")
+            for i, config in enumerate(configs):
+                table.add_row("▶" if i == 1 else " ", "☐", config.name, "Not installed", config.description)
+            screen.print(table)
+
+        original_console = cm.console
+        cm.console = screen
+        try:
+            ui = cm.ConfigUI(manager)
+            ui.current_item = 1
+            results = {
+                "full": measure("full table (previous renderer)", full_table, repeat),
+                "window": measure("visible window, whole screen",
+                                  lambda: screen.print(ui.render_category("synthetic", configs)), repeat),
+            }
+            diff = cm.DiffScreen(screen)
+            diff.update(ui.render_category("synthetic", configs))
+
+            def cursor_move():
+                ui.current_item = 3 - ui.current_item
+                diff.update(ui.render_category("synthetic", configs))
+
+            results["diff"] = measure("visible window, changed lines only", cursor_move, repeat)
+            written = screen.file.tell()
+            screen.print(ui.render_category("synthetic", configs))
+            whole = screen.file.tell() - written
+            cursor_move()
+            changed = screen.file.tell() - written - whole
+            print(f"  bytes sent for a cursor move: {whole} whole screen, {changed} changed lines")
+        finally:
+            cm.console = original_console
+        return results
+
+@contextmanager
+def slow_stats(cm, latency: float):
+    """Add a fixed delay to every stat to emulate a network home directory or cold disk"""
+    original_stat = cm.os.stat
+
+    def slow_stat(*args, **kwargs):
+        time.sleep(latency)
+        return original_stat(*args, **kwargs)
+
+    cm.os.stat = slow_stat
+    try:
+        yield
+    finally:
+        cm.os.stat = original_stat
+
+def bench_status(cm, repeat: int, count: int = 2000, latency: float = 0.0005):
+    """Install-state scan: one stat at a time vs the thread pool, and time to the first screen"""
+    cm.load_rich()
+    with tempfile.TemporaryDirectory() as tmp, temporary_home() as home:
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count)
+        for i in range(0, count, 2):
+            dest = home / ".config" / "synthetic" / str(i) / "config"
+            dest.parent.mkdir(parents=True)
+            dest.touch()
+        manager = cm.ConfigManager(root, registry_file=registry_file)
+        configs = manager.all_configs()
+        screen = cm.Console(file=io.StringIO(), width=120, height=40, force_terminal=True)
+        print(f"status: {count} configs, half installed, "
+              f"{latency * 1000:.1f} ms simulated latency per stat")
+
+        def sequential():
+            for config in configs:
+                config.check_installed()
+
+        def scan():
+            for config in configs:
+                config.installed = None
+            cm.StatusScan(cm.StatCache(), configs).run()
+
+        def first_screen():
+            for config in configs:
+                config.installed = None
+            background = cm.StatusScan(cm.StatCache(), configs).start()
+            screen.print(ui.render_menu())
+            background.cancel()
+
+        original_console = cm.console
+        cm.console = screen
+        try:
+            ui = cm.ConfigUI(manager)
+            with slow_stats(cm, latency):
+                return {
+                    "sequential": measure("one stat at a time", sequential, repeat),
+                    "scan": measure(f"thread pool scan ({cm.StatCache().jobs} workers)", scan, repeat),
+                    "first_screen": measure("first screen, scan in background", first_screen, repeat),
+                }
+        finally:
+            cm.console = original_console
+
+def bench_dependencies(cm, repeat: int, count: int = 200, chain: int = 20, latency: float = 0.005):
+    """Dependent configs: one at a time in topological order vs parallel waves"""
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count, chain=chain)
+        manager = cm.ConfigManager(root, registry_file=registry_file)
+        isolate_manager(cm, manager, root)
+        items = manager.all_configs()
+        waves = manager.dependencies.layers(items)
+        print(f"dependencies: {count} configs in chains of {count // chain}, {len(waves)} waves, "
+              f"{latency * 1000:.0f} ms simulated latency per copy")
+
+        def graph():
+            registry = cm.ConfigRegistry(registry_file, root / "configs")
+            registry.dependencies.layers(list(registry.by_name.values()))
+
+        results = {"graph": measure("build graph, check cycles, layer", graph, repeat)}
+        with slow_copies(cm, latency), quiet_console(cm):
+            for jobs in (1, cm.DeployScheduler.DEFAULT_JOBS):
+                scheduler = cm.DeployScheduler(manager, jobs, force=True)
+                label = "one at a time" if jobs == 1 else f"waves, {jobs} workers"
+                results[f"jobs={jobs}"] = measure(label, lambda: scheduler.run(items), repeat)
+
+        # Take away the first chain's head: everything deployed after it must be skipped
+        registry = json.loads(registry_file.read_text())
+        for entries in registry["categories"].values():
+            for entry in entries:
+                if entry["name"] == "Config 0":
+                    entry["requires"] = ["no-such-tool"]
+        registry_file.write_text(json.dumps(registry))
+        manager = cm.ConfigManager(root, registry_file=registry_file)
+        isolate_manager(cm, manager, root)
+        items = manager.all_configs()
+        first_chain = {f"Config {i}" for i in range(0, count, chain)}
+
+        def failed_prerequisite():
+            batch = cm.DeployScheduler(manager, force=True).run(items)
+            deployed = {result.config.name for result in batch if result.ok}
+            if deployed & first_chain or len(deployed) != count - len(first_chain):
+                raise RuntimeError(f"deployed {sorted(deployed & first_chain)} after a missing prerequisite")
+
+        with quiet_console(cm):
+            results["blocked"] = measure("one chain's head missing, its dependents skipped",
+                                         failed_prerequisite, repeat)
+        return results
+
+def bench_watch(cm, repeat: int, count: int = 100, saves: int = 3, idle: float = 2.0):
+    """Bursts of saves: a deploy per save vs the debounced watcher, and idle CPU of each backend"""
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count)
+        manager = cm.ConfigManager(root, registry_file=registry_file)
+        isolate_manager(cm, manager, root)
+        items = manager.all_configs()
+        sources = [root / "configs" / item.source for item in items]
+        scheduler = cm.DeployScheduler(manager)
+        backends = ([False] if cm.InotifyWatcher.available() else []) + [True]
+        print(f"watch: {count} deployed configs, each saved {saves} times in a burst; "
+              f"idle CPU over {idle:g} s")
+
+        def save(path: Path):
+            with open(path, "a") as f:
+                f.write("#\n")
+
+        def per_save():
+            for _ in range(saves):
+                for item, path in zip(items, sources):
+                    save(path)
+                    scheduler.run([item])
+
+        def burst(watcher):
+            for _ in range(saves):
+                for path in sources:
+                    save(path)
+            while watcher.step() is None:
+                pass
+
+        def idle_cpu(watcher) -> float:
+            start = time.process_time()
+            deadline = time.monotonic() + idle
+            while time.monotonic() < deadline:
+                watcher.step(deadline - time.monotonic())
+            return time.process_time() - start
+
+        results = {}
+        with quiet_console(cm):
+            scheduler.run(items)
+            results["per_save"] = measure("deploy on every save", per_save, repeat)
+            for polling in backends:
+                name = "polling" if polling else "inotify"
+                watcher = cm.ConfigWatcher(manager, polling=polling)
+                try:
+                    results[name] = measure(f"{name}, {watcher.debounce:g} s debounce",
+                                            lambda: burst(watcher), repeat)
+                    cpu = idle_cpu(watcher)
+                finally:
+                    watcher.close()
+                print(f"  {name + ' idle':<48} {cpu * 1000:10.2f} ms CPU")
+                results[f"{name}_idle"] = {"cpu_seconds": cpu}
+        return results
+
+class LegacyConfigItem:
+    """The dict-backed ConfigItem that mixed definition and UI state"""
+
+    def __init__(self, name, source, dest, category, description="", requires=None,
+                 link="symlink", template=False, after=None):
+        self.name = name
+        self.source = source
+        self.dest = dest
+        self.category = category
+        self.description = description
+        self.requires = requires or []
+        self.link = link
+        self.template = template
+        self.after = after or []
+        self.selected = False
+        self._installed = None
+        self.backup_path = None
+        self.bytes_written = 0
+
+def legacy_registry(registry_file: Path) -> Dict[str, list]:
+    """Registry indexes built from LegacyConfigItem, as ConfigRegistry used to"""
+    with open(registry_file) as f:
+        data = json.load(f)
+    by_name, by_category = {}, {}
+    for category, entries in data["categories"].items():
+        items = by_category.setdefault(category, [])
+        for entry in entries:
+            item = LegacyConfigItem(entry["name"], entry["source"], entry["dest"], category,
+                                    entry.get("description", ""), entry.get("requires"),
+                                    entry.get("link", "symlink"), entry.get("template", False),
+                                    entry.get("after"))
+            items.append(item)
+            by_name[item.name.lower()] = item
+    return by_category
+
+def retained_bytes(build: Callable[[], object]) -> int:
+    """Memory still allocated by build's result once build returns"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+def bench_memory(cm, repeat: int, count: int = 50000):
+    """Registry footprint: dict-backed items vs named-tuple items with bitset state"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        registry_file = write_synthetic_registry(root, count)
+        # Names, paths and descriptions are unique per entry in both layouts
+        entries = [entry for entries in json.loads(registry_file.read_text())["categories"].values()
+                   for entry in entries]
+        strings = sum(sys.getsizeof(text) for entry in entries
+                      for text in (entry["name"], entry["name"].lower(), entry["source"],
+                                   entry["dest"], entry["description"])) / count
+        print(f"memory: {count} synthetic configs, {strings:.0f} B of unique strings per item")
+        builds = {
+            "legacy": ("dict-backed items", lambda: legacy_registry(registry_file)),
+            "tuple": ("named-tuple items + bitset state",
+                      lambda: cm.ConfigRegistry(registry_file, root / "configs")),
+        }
+        results = {}
+        for key, (label, build) in builds.items():
+            results[key] = measure(f"build, {label}", build, repeat)
+            results[key]["bytes_per_item"] = retained_bytes(build) / count
+        for key, (label, _) in builds.items():
+            per_item = results[key]["bytes_per_item"]
+            print(f"  {'per item, ' + label:<48} {per_item:10.0f} B {per_item - strings:6.0f} B excluding strings")
+        return results
+
+SEARCH_WORDS = ("git", "zsh", "fish", "starship", "tmux", "neovim", "kitty", "docker", "rust", "cargo",
+                "python", "node", "aws", "kube", "terraform", "ssh", "gnupg", "alacritty", "ripgrep", "bat")
+SEARCH_QUERIES = ("g", "st", "starsh", "neo vim", "dockr", "kube ssh", "zzzz")
+SEARCH_TARGET_MS = 3.0
+
+def synthetic_search_items(cm, count: int):
+    """Items with varied names built from a small tool vocabulary"""
+    items = []
+    for i in range(count):
+        first = SEARCH_WORDS[i % len(SEARCH_WORDS)]
+        second = SEARCH_WORDS[(i // len(SEARCH_WORDS)) % len(SEARCH_WORDS)]
+        items.append(cm.ConfigItem.create(f"{first} {second} {i}", f"c/{i}", f"~/.c/{i}", f"category-{i % 20}",
+                                          f"Settings for {first} with {second}", [first]))
+    return items
+
+def bench_search(cm, repeat: int, count: int = 20000):
+    """Per-keystroke search latency, each query on its own, against SEARCH_TARGET_MS"""
+    results = {}
+    for size in (count // 2, count):
+        items = synthetic_search_items(cm, size)
+        print(f"search: {size} configs, one query at a time with the result cache cleared, "
+              f"target {SEARCH_TARGET_MS:g} ms")
+        index = {}
+
+        def build():
+            index["index"] = cm.SearchIndex(items)
+
+        results[f"build-{size}"] = measure("build trigram index (once per run)", build, repeat)
+        slowest = 0.0
+        for q in SEARCH_QUERIES:
+            def scan():
+                [item for item in items
+                 if q in item.name.lower() or q in item.description.lower()
+                 or q in item.category or any(q in r for r in item.requires)]
+
+            def query():
+                index["index"]._cache.clear()
+                index["index"].search(q)
+
+            results[f"scan-{size}-{q}"] = measure(f"'{q}' substring scan (exact matches only)", scan, repeat)
+            result = results[f"query-{size}-{q}"] = measure(f"'{q}' trigram index, ranked", query, repeat)
+            slowest = max(slowest, result["seconds"] * 1000)
+        verdict = "within" if slowest <= SEARCH_TARGET_MS else "OVER"
+        print(f"  slowest indexed query {slowest:.2f} ms, {verdict} the {SEARCH_TARGET_MS:g} ms target\n")
+    return results
+
+def bench_fanout(cm, repeat: int, hosts: int = 16):
+    """Deploy the profile to many hosts: one command per file vs one tar stream per host"""
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        manager = cm.ConfigManager(PROJECT_ROOT)
+        items = [cm.ConfigItem.create(item.name, item.source, item.dest, item.category, item.description,
+                                      ["sh"], item.link, item.template)
+                 for item in manager.all_configs()]
+        specs = [f"local:{root}/host-{i}" for i in range(hosts)]
+        print(f"fanout: {len(items)} configs to {hosts} local stand-in hosts")
+
+        def per_file():
+            # What the shell loop did: a fresh connection (here a process) per file
+            for spec in specs:
+                transport = cm.LocalTransport(Path(spec[len("local:"):]))
+                for item in items:
+                    dest = cm.FanOutDeployer.home_path(item)
+                    transport.run(f'mkdir -p "$HOME/$(dirname {dest})" && cat > "$HOME/{dest}"',
+                                  (manager.configs_dir / item.source).read_bytes())
+
+        deployer = cm.FanOutDeployer(manager, specs)
+        return {
+            "per_file": measure("one command per file, hosts in turn", per_file, repeat),
+            "fanout": measure(f"tar stream per host, {deployer.jobs} hosts at a time",
+                              lambda: deployer.run(items), repeat),
+        }
+
+def bench_templates(cm, repeat: int, hosts: int = 300):
+    """Render two templates for a fleet: no caching vs compiled + rendered caches"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        sources = [PROJECT_ROOT / "configs/git/gitconfig", PROJECT_ROOT / "configs/terminal/kitty.conf"]
+        fleet = [{"host": f"host-{i}", "git_name": f"User {i}", "git_email": f"user{i}@example.com",
+                  "font_size": 12 + i % 5} for i in range(hosts)]
+        print(f"templates: {len(sources)} templates for {hosts} hosts")
+
+        def uncached():
+            for variables in fleet:
+                for source in sources:
+                    cm.Template(source.read_text()).render(variables)
+
+        renderer = cm.TemplateRenderer(root / "rendered")
+
+        def render_fleet():
+            for variables in fleet:
+                for source in sources:
+                    renderer.render(source, variables)
+
+        results = {"uncached": measure("parse and render every host", uncached, repeat)}
+        results["cold"] = measure("cached, first run (cold)", render_fleet, 1)
+        results["warm"] = measure("cached, nothing changed", render_fleet, repeat)
+        before = renderer.renders
+        fleet[7]["font_size"] = 20
+        results["one_changed"] = measure("cached, one host's font_size changed", render_fleet, 1)
+        print(f"  renders: {before} for the cold run, {renderer.renders - before} after the change")
+        return results
+
+def bench_tracing(cm, repeat: int, count: int = 20000):
+    """Cost of span instrumentation on a hot path: undecorated, disabled and enabled"""
+    tracer = sys.modules["tracing"].tracer
+    with tempfile.TemporaryDirectory() as tmp, temporary_home():
+        root = Path(tmp)
+        manager = cm.ConfigManager(root, registry_file=write_synthetic_registry(root, 10))
+        item = next(iter(manager.configs.values()))[0]
+        raw = cm.ConfigManager.check_requirements.__wrapped__
+        print(f"tracing: {count} check_requirements calls (resolved, so the call itself is cheap)")
+
+        def undecorated():
+            for _ in range(count):
+                raw(manager, item)
+
+        def instrumented():
+            for _ in range(count):
+                manager.check_requirements(item)
+
+        results = {
+            "undecorated": measure("no instrumentation", undecorated, repeat),
+            "disabled": measure("instrumented, tracing disabled", instrumented, repeat),
+        }
+        tracer.enable()
+        try:
+            results["enabled"] = measure("instrumented, tracing enabled", instrumented, repeat)
+        finally:
+            tracer.enabled = False
+            tracer.spans.clear()
+        return results
+
+STARTUP_COMMANDS = {
+    "--list": ["--list"],
+    "--check": ["--check"],
+    "--status": ["--status"],
+    "--search": ["--search", "git"],
+    "--deploy": ["--deploy", "tmux"],
+    "--category": ["--category", "terminal"],
+}
+
+def import_time(stderr: str) -> float:
+    """Total self time in seconds of every module listed by -X importtime"""
+    total = 0
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|", line)
+        if match:
+            total += int(match.group(1))
+    return total / 1e6
+
+def bench_startup(cm, repeat: int):
+    """Cold start of each subcommand under -X importtime: rich output vs plain"""
+    print("startup: import time / wall time per subcommand, best of runs")
+    results = {}
+    with temporary_home():
+        for command, argv in STARTUP_COMMANDS.items():
+            for fmt in ("rich", "plain"):
+                best_imports = best_wall = float("inf")
+                loads_rich = False
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    proc = subprocess.run(
+                        [sys.executable, "-X", "importtime", str(SCRIPT_DIR / "config-manager.py"),
+                         *argv, "--format", fmt],
+                        capture_output=True, text=True, cwd=PROJECT_ROOT)
+                    best_wall = min(best_wall, time.perf_counter() - start)
+                    best_imports = min(best_imports, import_time(proc.stderr))
+                    loads_rich = "| rich" in proc.stderr
+                label = f"{command} --format {fmt}"
+                print(f"  {label:<34} imports {best_imports * 1000:7.1f} ms   "
+                      f"wall {best_wall * 1000:7.1f} ms   rich {'loaded' if loads_rich else 'skipped'}")
+                results[label] = {"imports": best_imports, "seconds": best_wall, "rich": loads_rich}
+    return results
+
+def io_syscalls() -> Optional[int]:
+    """Read and write syscalls made by this process so far; None without /proc"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ", 1) for line in f.read().splitlines())
+        return int(fields["syscr"]) + int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def profile(func: Callable[[], None], repeat: int) -> Dict[str, Optional[float]]:
+    """Best wall time of `repeat` runs, then forks, I/O syscalls and peak memory of one run each
+
+    Syscalls are the read/write counts from /proc/self/io, less the reads
+    needed to sample them. Peak memory comes from tracemalloc, in its own run
+    so tracing does not skew the timing.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    counter = ForkCounter()
+    baseline = io_syscalls()
+    sampling = io_syscalls() - baseline if baseline is not None else 0
+    before = io_syscalls()
+    with counter.counting():
+        func()
+    after = io_syscalls()
+    syscalls = after - before - sampling if before is not None else None
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "forks": counter.count, "syscalls": syscalls, "peak_bytes": peak}
+
+def suite_cases(cm, vg, root: Path, size: int) -> Dict[str, Callable[[], None]]:
+    """Synthetic inputs of `size` entries and one callable per profiled operation"""
+    registry_file = write_synthetic_registry(root, size)
+    brewfile = root / "Brewfile"
+    write_synthetic_brewfile(brewfile, size)
+    manager = cm.ConfigManager(root, registry_file=registry_file)
+    items = [item for configs in manager.configs.values() for item in configs]
+    brewfile_tools = vg.BrewfileParser(str(brewfile), cache_dir=None).parse()["formulas"]
+    # Every other formula is in the graph, plus as many graph-only tools
+    graph_tools = {f"tool-{i}": name for i, name in enumerate(sorted(brewfile_tools)) if i % 2 == 0}
+    graph_tools.update({f"extra-{i}": f"graph-only-{i}" for i in range(len(graph_tools))})
+
+    def load_configurations():
+        manager.load_configurations()
+        manager.configs
+
+    def check_requirements():
+        manager.resolver = manager.packages.resolver = cm.RequirementResolver()
+        for item in items:
+            manager.check_requirements(item)
+
+    def deploy_config():
+        for item in items:
+            manager.deploy_config(item, force=True)
+
+    def create_backup():
+        for item in items:
+            manager.create_backup(item)
+
+    return {
+        "load_configurations": load_configurations,
+        "check_requirements": check_requirements,
+        "deploy_config": deploy_config,
+        "create_backup": create_backup,
+        "BrewfileParser.parse": lambda: vg.BrewfileParser(str(brewfile), cache_dir=None).parse(),
+        "ValidationReport.compare": lambda: vg.ValidationReport().compare(brewfile_tools, graph_tools),
+    }
+
+def git_revision() -> Dict[str, object]:
+    """Current commit and whether the tree has local changes"""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "--short", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "scripts"))}
+
+def latest_results(exclude: Optional[Path] = None) -> Optional[Path]:
+    """Most recently saved suite results"""
+    saved = sorted(path for path in RESULTS_DIR.glob("*.json") if path != exclude)
+    return saved[-1] if saved else None
+
+def format_delta(current: float, previous: Optional[float]) -> str:
+    """Relative change, marked when it is over 10% and over a millisecond"""
+    if not previous:
+        return ""
+    change = (current - previous) / previous * 100
+    regressed = change > 10 and current - previous > 0.001
+    return f"{change:+6.0f}%{' !' if regressed else '  '}"
+
+def bench_suite(cm, repeat: int, sizes: List[int] = SUITE_SIZES, save: bool = False,
+                compare: Optional[str] = None):
+    """Profile core operations over synthetic inputs from 10 to 100k entries"""
+    vg = load_script("validate-brewfile-graph.py", "validate_brewfile_graph")
+    baseline = None
+    if compare:
+        compare_path = latest_results() if compare == "latest" else Path(compare)
+        if compare_path and compare_path.exists():
+            baseline = json.loads(compare_path.read_text())
+            print(f"suite: comparing with {compare_path.name} ({baseline.get('commit')})")
+        else:
+            print("suite: no saved results to compare with")
+
+    print(f"  {'operation':<26}{'entries':>8}{'time':>12}{'forks':>7}{'syscalls':>10}{'peak':>11}{'vs base':>10}")
+    results: Dict[str, Dict[str, dict]] = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp, temporary_home(), quiet_console(cm):
+            for name, func in suite_cases(cm, vg, Path(tmp), size).items():
+                result = profile(func, repeat)
+                results.setdefault(name, {})[str(size)] = result
+                previous = (baseline or {}).get("results", {}).get(name, {}).get(str(size), {})
+                syscalls = "-" if result["syscalls"] is None else result["syscalls"]
+                print(f"  {name:<26}{size:>8}{result['seconds'] * 1000:>9.2f} ms{result['forks']:>7}"
+                      f"{syscalls:>10}{result['peak_bytes'] / 1024:>8.0f} KB"
+                      f"{format_delta(result['seconds'], previous.get('seconds')):>10}")
+
+    report = {**git_revision(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "platform": platform.platform(),
+              "repeat": repeat, "results": results}
+    if save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"{datetime.now():%Y%m%d_%H%M%S}-{report['commit'] or 'unknown'}.json"
+        path.write_text(json.dumps(report, indent=1))
+        print(f"  saved {path.relative_to(PROJECT_ROOT)}")
+    return report
+
+BENCHMARKS = {
+    "requirements": bench_requirements,
+    "deploy": bench_deploy,
+    "registry": bench_registry,
+    "link": bench_link,
+    "brewfile": bench_brewfile,
+    "packages": bench_packages,
+    "graph": bench_graph,
+    "projects": bench_projects,
+    "snapshot": bench_snapshot,
+    "tui": bench_tui,
+    "status": bench_status,
+    "dependencies": bench_dependencies,
+    "watch": bench_watch,
+    "memory": bench_memory,
+    "search": bench_search,
+    "startup": bench_startup,
+    "fanout": bench_fanout,
+    "templates": bench_templates,
+    "tracing": bench_tracing,
+    "suite": bench_suite,
+}
+
+def main():
+    """Run the selected benchmarks"""
+    parser = argparse.ArgumentParser(description="Mac Setup Benchmarks")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+    parser.add_argument("--sizes", default=",".join(map(str, SUITE_SIZES)),
+                        help="suite: comma-separated entry counts (default: %(default)s)")
+    parser.add_argument("--save", action="store_true",
+                        help=f"suite: store results under {RESULTS_DIR.name}/ for later comparison")
+    parser.add_argument("--compare", nargs="?", const="latest", metavar="FILE",
+                        help="suite: show changes against saved results (default: the latest)")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    try:
+        sizes = [int(size) for size in args.sizes.split(",") if size]
+    except ValueError:
+        parser.error(f"--sizes must be comma-separated integers: {args.sizes}")
+
+    cm = load_script("config-manager.py", "config_manager")
+    for name in args.benchmarks or BENCHMARKS:
+        if name == "suite":
+            bench_suite(cm, args.repeat, sizes, args.save, args.compare)
+        else:
+            BENCHMARKS[name](cm, args.repeat)
+        print()
+
+if __name__ == "__main__":
+    main()
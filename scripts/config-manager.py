@@ -4,409 +4,3090 @@ Mac Setup Configuration Manager
 Interactive TUI for selecting and deploying configurations
 """
 
+from __future__ import annotations
+
 import os
 import sys
 import json
 import shutil
+import gzip
+import stat
+import errno
+import fcntl
+import uuid
+import re
+import io
+import shlex
+import heapq
+import bisect
 import subprocess
+import tempfile
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from queue import Queue
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, NamedTuple, Set, Tuple, Optional
 import argparse
 
-try:
-    from rich.console import Console
-    from rich.table import Table
-    from rich.panel import Panel
-    from rich.prompt import Prompt, Confirm
-    from rich.layout import Layout
-    from rich.live import Live
-    from rich.text import Text
-    from rich.progress import Progress, SpinnerColumn, TextColumn
-    from rich.tree import Tree
-    from rich import box
-    from rich.columns import Columns
-except ImportError:
-    print("Error: This script requires the 'rich' library.")
-    print("Please install it with: pip3 install rich")
-    sys.exit(1)
-
-console = Console()
-
-class ConfigItem:
-    """Represents a configuration item"""
-    def __init__(self, name: str, source: str, dest: str, category: str, 
-                 description: str = "", requires: List[str] = None):
-        self.name = name
-        self.source = source
-        self.dest = dest
-        self.category = category
-        self.description = description
-        self.requires = requires or []
-        self.selected = False
-        self.installed = False
-        self.backup_path = None
+from tracing import tracer, traced
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+RICH_AVAILABLE: Optional[bool] = None
+
+def load_rich() -> bool:
+    """Import rich on first use and publish its classes as module globals
+
+    Non-interactive commands never call this in plain or JSON output, which
+    keeps cron and provisioning runs from paying rich's import cost.
+    """
+    global RICH_AVAILABLE
+    if RICH_AVAILABLE is None:
+        try:
+            with tracer.span("load.rich"):
+                from rich.console import Console
+                from rich.table import Table
+                from rich.panel import Panel
+                from rich.prompt import Prompt, Confirm
+                from rich.layout import Layout
+                from rich.control import Control
+                from rich.segment import Segment, Segments
+                from rich.text import Text
+                from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+                from rich import box
+        except ImportError:
+            RICH_AVAILABLE = False
+        else:
+            globals().update(Console=Console, Table=Table, Panel=Panel, Prompt=Prompt,
+                             Confirm=Confirm, Layout=Layout, Control=Control, Segment=Segment,
+                             Segments=Segments, Text=Text,
+                             Progress=Progress, SpinnerColumn=SpinnerColumn,
+                             TextColumn=TextColumn, BarColumn=BarColumn, box=box)
+            RICH_AVAILABLE = True
+    return RICH_AVAILABLE
+
+class PlainConsole:
+    """Stand-in for rich's Console that prints text with the markup stripped"""
+    
+    MARKUP = re.compile(r"(?<!\\)\[/?[a-z#@][^\[\]]*\]")
+    
+    def __init__(self, file=None):
+        self.file = file or sys.stdout
+        self.quiet = False
+        self._lock = threading.Lock()
+        
+    def print(self, *objects, sep: str = " ", end: str = "\n", **kwargs):
+        if self.quiet:
+            return
+        text = self.MARKUP.sub("", sep.join(str(o) for o in objects)).replace("\\[", "[")
+        with self._lock:
+            self.file.write(text + end)
+            self.file.flush()
+
+console = PlainConsole()
+
+def file_digest(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_json_atomic(path: Path, data):
+    """Write JSON through a temporary file so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+def map_concurrent(func: Callable, items: list, jobs: int = 16, threshold: int = 64) -> list:
+    """func over items in order, from a thread pool once there are enough items to pay for it
+
+    Small registries stay sequential: concurrent.futures pulls in logging,
+    which costs more than a few dozen stats.
+    """
+    if len(items) < threshold or jobs < 2:
+        return [func(item) for item in items]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(func, items))
+
+class StatCache:
+    """stat() results for one run
+
+    Each path is stat'ed at most once, so the registry, the status scan and
+    the views share a single look at the filesystem. Missing files are cached
+    as None. `forget` drops a path this run is about to change.
+    """
+
+    def __init__(self, jobs: int = 16):
+        self.jobs = jobs
+        self._results: Dict[str, Optional[os.stat_result]] = {}
+
+    def stat(self, path) -> Optional[os.stat_result]:
+        key = os.fspath(path)
+        try:
+            return self._results[key]
+        except KeyError:
+            pass
+        try:
+            result = os.stat(key)
+        except OSError:
+            result = None
+        self._results[key] = result
+        return result
+
+    def exists(self, path) -> bool:
+        return self.stat(path) is not None
+
+    def forget(self, path):
+        self._results.pop(os.fspath(path), None)
+
+    @traced("status.prefetch", lambda self, paths: {"paths": len(paths)})
+    def prefetch(self, paths: list):
+        """Stat every path not cached yet, concurrently for large batches"""
+        pending = [key for key in dict.fromkeys(map(os.fspath, paths)) if key not in self._results]
+        map_concurrent(self.stat, pending, self.jobs)
+
+class ConfigState:
+    """Per-run state of a registry's items, indexed by item position
+
+    Selection and install state are bitsets, so 50k items cost a few KB.
+    Install state takes two bits: whether it has been checked, and the
+    result. Backup paths and written byte counts are rarely set and live in
+    dicts. Bit updates take a lock because status scans set them from worker
+    threads.
+    """
+
+    def __init__(self, size: int):
+        self.selected = bytearray((size + 7) // 8)
+        self.checked = bytearray((size + 7) // 8)
+        self.installed = bytearray((size + 7) // 8)
+        self.backup_paths: Dict[int, Path] = {}
+        self.bytes_written: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get(bits: bytearray, index: int) -> bool:
+        return bool(bits[index >> 3] & (1 << (index & 7)))
+
+    def set(self, bits: bytearray, index: int, value: bool):
+        mask = 1 << (index & 7)
+        with self._lock:
+            if value:
+                bits[index >> 3] |= mask
+            else:
+                bits[index >> 3] &= ~mask
+
+class ConfigItem(NamedTuple):
+    """Represents a configuration item
+
+    The definition is an immutable named tuple, so a registry with 50k
+    entries holds one compact object per entry with no instance dict.
+    Selection, install state and backup details live in a ConfigState shared
+    by the whole registry, at this item's slot; the properties below read and
+    write it there. `create` builds a standalone item with a store of its own.
+    """
+    name: str
+    source: str
+    dest: str
+    category: str
+    description: str
+    requires: Tuple[str, ...]
+    link: str
+    template: bool
+    after: Tuple[str, ...]
+    state: ConfigState
+    slot: int
+
+    @classmethod
+    def create(cls, name: str, source: str, dest: str, category: str,
+               description: str = "", requires: List[str] = None, link: str = "symlink",
+               template: bool = False, after: List[str] = None) -> "ConfigItem":
+        return cls(name, source, dest, category, description, tuple(requires or ()),
+                   link, template, tuple(after or ()), ConfigState(1), 0)
+
+    def __repr__(self) -> str:
+        return f"ConfigItem({self.name!r})"
+        
+    @property
+    def selected(self) -> bool:
+        return self.state.get(self.state.selected, self.slot)
+        
+    @selected.setter
+    def selected(self, value: bool):
+        self.state.set(self.state.selected, self.slot, value)
+        
+    @property
+    def installed(self) -> bool:
+        """Whether the destination exists, checked on first access"""
+        if not self.state.get(self.state.checked, self.slot):
+            self.check_installed()
+        return self.state.get(self.state.installed, self.slot)
+        
+    @installed.setter
+    def installed(self, value: Optional[bool]):
+        """Record install state; None marks it unchecked again"""
+        if value is not None:
+            self.state.set(self.state.installed, self.slot, value)
+        self.state.set(self.state.checked, self.slot, value is not None)
+        
+    @property
+    def installed_state(self) -> Optional[bool]:
+        """Installed state if it has been checked, None while still pending"""
+        if not self.state.get(self.state.checked, self.slot):
+            return None
+        return self.state.get(self.state.installed, self.slot)
+        
+    @property
+    def backup_path(self) -> Optional[Path]:
+        return self.state.backup_paths.get(self.slot)
+        
+    @backup_path.setter
+    def backup_path(self, value: Optional[Path]):
+        if value is None:
+            self.state.backup_paths.pop(self.slot, None)
+        else:
+            self.state.backup_paths[self.slot] = value
+            
+    @property
+    def bytes_written(self) -> int:
+        return self.state.bytes_written.get(self.slot, 0)
+        
+    @bytes_written.setter
+    def bytes_written(self, value: int):
+        self.state.bytes_written[self.slot] = value
+        
+    def check_installed(self):
+        """Check if configuration is already installed"""
+        dest_path = Path(self.dest).expanduser()
+        self.installed = dest_path.exists()
+        return self.installed_state
+
+class RegistryError(ValueError):
+    """Raised when the registry file cannot be read or an entry lacks a required field"""
+
+class ConfigRegistry:
+    """Configuration definitions loaded from a registry file
+
+    The file is parsed once and indexed by lower-cased name and by category.
+    Nothing touches the filesystem until an item is asked for: a source is
+    only checked for existence the first time its item is looked up.
+    Category, link and requirement strings are interned and identical
+    requirement tuples shared, since large generated registries repeat them
+    on every entry. All items keep their state in one ConfigState.
+    """
+
+    def __init__(self, registry_file: Path, configs_dir: Path, stats: Optional[StatCache] = None):
+        self.registry_file = registry_file
+        self.configs_dir = configs_dir
+        self.stats = stats or StatCache()
+        self.by_name: Dict[str, ConfigItem] = {}
+        self.by_category: Dict[str, List[ConfigItem]] = {}
+        self._available: Dict[str, bool] = {}
+        self._dependencies: Optional[DependencyGraph] = None
+        self._by_source: Optional[Dict[str, List[ConfigItem]]] = None
+
+        try:
+            with open(registry_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise RegistryError(f"cannot load {registry_file}: {e}") from e
+        categories = data.get("categories", {})
+        self.state = ConfigState(sum(map(len, categories.values())))
+        self._shared: Dict[tuple, tuple] = {}
+        index = 0
+        for category, entries in categories.items():
+            category = sys.intern(category)
+            items = self.by_category.setdefault(category, [])
+            for entry in entries:
+                missing = [key for key in ("name", "source", "dest") if key not in entry]
+                if missing:
+                    raise RegistryError(f"entry {index + 1} in {registry_file} has no {', '.join(missing)}")
+                item = ConfigItem(entry["name"], entry["source"], entry["dest"], category,
+                                  entry.get("description", ""), self._share(entry.get("requires")),
+                                  sys.intern(entry.get("link", "symlink")), entry.get("template", False),
+                                  self._share(entry.get("after")), self.state, index)
+                index += 1
+                items.append(item)
+                self.by_name[item.name.lower()] = item
+
+    def _share(self, names: Optional[List[str]]) -> Tuple[str, ...]:
+        """One tuple of interned strings per distinct list of names"""
+        if not names:
+            return ()
+        key = tuple(names)
+        shared = self._shared.get(key)
+        if shared is None:
+            shared = self._shared[key] = tuple(map(sys.intern, key))
+        return shared
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self.by_category)
+
+    def source_paths(self) -> List[Path]:
+        return [self.configs_dir / item.source for item in self.by_name.values()]
+
+    def available(self, item: ConfigItem) -> bool:
+        """Whether the item's source file exists in configs/ (memoized)"""
+        if item.name not in self._available:
+            self._available[item.name] = self.stats.exists(self.configs_dir / item.source)
+        return self._available[item.name]
+
+    def forget(self, item: ConfigItem):
+        """Drop the memoized availability of an item whose source was created or removed"""
+        self._available.pop(item.name, None)
+        self.stats.forget(self.configs_dir / item.source)
+
+    @property
+    def by_source(self) -> Dict[str, List[ConfigItem]]:
+        """Every item by absolute source path, built on first use"""
+        if self._by_source is None:
+            self._by_source = {}
+            for item in self.by_name.values():
+                path = os.path.abspath(self.configs_dir / item.source)
+                self._by_source.setdefault(path, []).append(item)
+        return self._by_source
+
+    def get(self, name: str) -> Optional[ConfigItem]:
+        """Look up an available item by case-insensitive name"""
+        item = self.by_name.get(name.lower())
+        return item if item and self.available(item) else None
+
+    def category(self, category: str) -> List[ConfigItem]:
+        """Available items in a category, in registry order"""
+        return [item for item in self.by_category.get(category, []) if self.available(item)]
+
+    @property
+    def dependencies(self) -> DependencyGraph:
+        """Deploy-order graph over every item, built and validated on first use"""
+        if self._dependencies is None:
+            self._dependencies = DependencyGraph(self.by_name)
+        return self._dependencies
+
+class DependencyError(ValueError):
+    """Raised for an unknown "after" entry or a dependency cycle in the registry"""
+
+class DependencyGraph:
+    """Deploy-order dependencies between configurations
+
+    An item's "after" list names the configs that must be deployed before it,
+    e.g. Git Ignore after Git, whose gitconfig points at the ignore file.
+    Unknown names and cycles raise DependencyError when the graph is built.
+    `layers` splits a batch into waves where every prerequisite sits in an
+    earlier wave and every item in the earliest wave it can, so a batch takes
+    as many sequential steps as its longest chain.
+    """
+
+    def __init__(self, by_name: Dict[str, ConfigItem]):
+        self.prerequisites: Dict[str, List[ConfigItem]] = {}
+        for item in by_name.values():
+            if not item.after:
+                continue
+            prerequisites = []
+            for name in item.after:
+                prerequisite = by_name.get(name.lower())
+                if prerequisite is None:
+                    raise DependencyError(f"{item.name} is deployed after unknown config '{name}'")
+                prerequisites.append(prerequisite)
+            self.prerequisites[item.name] = prerequisites
+        self._check_cycles()
+
+    def _check_cycles(self):
+        """Depth-first search that raises DependencyError naming the first cycle found"""
+        done = set()
+        for start in self.prerequisites:
+            if start in done:
+                continue
+            path = [start]
+            stack = [iter(self.prerequisites[start])]
+            while stack:
+                prerequisite = next(stack[-1], None)
+                if prerequisite is None:
+                    done.add(path.pop())
+                    stack.pop()
+                    continue
+                name = prerequisite.name
+                if name in path:
+                    cycle = path[path.index(name):] + [name]
+                    raise DependencyError(f"dependency cycle: {' → '.join(reversed(cycle))}")
+                if name not in done:
+                    path.append(name)
+                    stack.append(iter(self.prerequisites.get(name, ())))
+
+    def closure(self, configs: List[ConfigItem]) -> List[ConfigItem]:
+        """configs followed by every config they are transitively deployed after"""
+        result = list(configs)
+        seen = {config.name for config in configs}
+        for config in result:
+            for prerequisite in self.prerequisites.get(config.name, ()):
+                if prerequisite.name not in seen:
+                    seen.add(prerequisite.name)
+                    result.append(prerequisite)
+        return result
+
+    def layers(self, configs: List[ConfigItem]) -> List[List[ConfigItem]]:
+        """Deploy waves for a batch, each in the batch's order
+
+        Only edges between configs in the batch count; pull prerequisites in
+        with `closure` first to order against them.
+        """
+        order = {config.name: i for i, config in enumerate(configs)}
+        waiting = {name: 0 for name in order}
+        dependents: Dict[str, List[ConfigItem]] = {}
+        for config in configs:
+            for prerequisite in self.prerequisites.get(config.name, ()):
+                if prerequisite.name in order:
+                    waiting[config.name] += 1
+                    dependents.setdefault(prerequisite.name, []).append(config)
+        wave = [config for config in configs if not waiting[config.name]]
+        layers = []
+        while wave:
+            layers.append(wave)
+            ready = []
+            for config in wave:
+                for dependent in dependents.get(config.name, ()):
+                    waiting[dependent.name] -= 1
+                    if not waiting[dependent.name]:
+                        ready.append(dependent)
+            wave = sorted(ready, key=lambda config: order[config.name])
+        return layers
+
+class SearchIndex:
+    """Trigram index over configuration names, requirements, categories and descriptions
+
+    Results come in tiers, and a tier is only searched when the ones above it
+    leave room: names equal to or starting with the query (found by bisecting
+    the sorted names), names containing it (str.find over all names joined in
+    sorted order), names with at least half of its trigrams (rounded down),
+    and then items with them in any field, name trigrams weighted highest.
+    The first two tiers are alphabetical and stop at `limit`. The last tier
+    reads only the rarest postings, since an item with that many of the
+    trigrams must be in one of them. The last query word is matched as a
+    prefix so results narrow as the user types, and results are memoized per
+    query string.
+    """
+
+    FIELD_WEIGHTS = (("name", 3), ("requires", 2), ("category", 1), ("description", 1))
+    WORD = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, items: List[ConfigItem]):
+        self.items = items
+        self.names = [item.name.lower() for item in items]
+        self.by_name = sorted(range(len(items)), key=self.names.__getitem__)
+        self.sorted_names = [self.names[i] for i in self.by_name]
+        self.rank = [0] * len(items)
+        for k, i in enumerate(self.by_name):
+            self.rank[i] = k
+        # All names in sorted order, one per line, and where each one starts
+        self.name_blob = "\n".join(self.sorted_names)
+        self.name_starts = []
+        offset = 0
+        for name in self.sorted_names:
+            self.name_starts.append(offset)
+            offset += len(name) + 1
+        # Trigram postings of names, and of the other fields
+        self.name_postings: Dict[str, List[int]] = {}
+        self.postings: Dict[str, List[int]] = {}
+        # Each field's words padded the way word_trigrams pads them, so that
+        # `gram in text` tells whether the field has that trigram
+        self.texts: List[List[str]] = [[] for _ in items]
+        self._cache: Dict[Tuple[str, int], List[Tuple[float, ConfigItem]]] = {}
+        word_grams: Dict[str, Tuple[str, ...]] = {}
+        for field, _ in self.FIELD_WEIGHTS:
+            # Categories, requirements and descriptions repeat a lot, so index
+            # each distinct text once and extend its postings in bulk.
+            by_text: Dict[str, List[int]] = {}
+            for i, item in enumerate(items):
+                value = getattr(item, field)
+                text = " ".join(value) if isinstance(value, tuple) else value
+                by_text.setdefault(text.lower(), []).append(i)
+            for text, ids in by_text.items():
+                words = self.WORD.findall(text)
+                padded = "  " + "  ".join(words) + " "
+                for i in ids:
+                    self.texts[i].append(padded)
+                grams = set()
+                for word in words:
+                    cached = word_grams.get(word)
+                    if cached is None:
+                        cached = word_grams[word] = tuple(self.word_trigrams(word))
+                    grams.update(cached)
+                postings = self.name_postings if field == "name" else self.postings
+                for gram in grams:
+                    posting = postings.get(gram)
+                    if posting is None:
+                        postings[gram] = ids[:]
+                    else:
+                        posting += ids
+
+    @staticmethod
+    def word_trigrams(word: str, prefix: bool = False) -> List[str]:
+        padded = f"  {word}" if prefix else f"  {word} "
+        return [padded[k:k + 3] for k in range(len(padded) - 2)]
+
+    @classmethod
+    def trigrams(cls, text: str, prefix: bool = False) -> set:
+        """Padded trigrams of each word; with prefix the last word stays open-ended"""
+        words = cls.WORD.findall(text.lower())
+        grams = set()
+        for n, word in enumerate(words):
+            grams.update(cls.word_trigrams(word, prefix and n == len(words) - 1))
+        return grams
+
+    def name_prefixed(self, query: str) -> Tuple[int, int]:
+        """Range of sorted names that start with query"""
+        start = bisect.bisect_left(self.sorted_names, query)
+        return start, bisect.bisect_left(self.sorted_names, query + "\U0010ffff", start)
+
+    def name_containing(self, query: str, skip: Tuple[int, int], limit: int) -> List[int]:
+        """Up to limit sorted-name positions, outside skip, whose name contains query"""
+        found = []
+        pos = self.name_blob.find(query)
+        while pos != -1 and len(found) < limit:
+            k = bisect.bisect_right(self.name_starts, pos) - 1
+            if not skip[0] <= k < skip[1]:
+                found.append(k)
+            if k + 1 == len(self.name_starts):
+                break
+            pos = self.name_blob.find(query, self.name_starts[k + 1])
+        return found
+
+    def name_hits(self, grams: List[str]) -> Counter:
+        """How many of grams each item's name has, for items whose name has any"""
+        hits: Counter = Counter()
+        for gram in grams:
+            hits.update(self.name_postings.get(gram, ()))
+        return hits
+
+    def fuzzy_fields(self, grams: List[str], needed: int, skip: set) -> List[Tuple[float, int]]:
+        """Items outside skip that have `needed` of grams across all their fields
+
+        They score the weighted share of grams they have, at most 1.
+        """
+        bits = [(gram, 1 << n) for n, gram in enumerate(grams)]
+        weights = [weight for _, weight in self.FIELD_WEIGHTS]
+        most = sum(weights) * len(grams)
+        # Requirement, category and description texts are shared between
+        # items, so each distinct one is matched against the grams once
+        seen: Dict[str, Tuple[int, int]] = {}
+        postings = sorted(([self.name_postings.get(gram, ()), self.postings.get(gram, ())] for gram in grams),
+                          key=lambda pair: len(pair[0]) + len(pair[1]))
+        candidates = set()
+        for names, others in postings[:len(grams) - needed + 1]:
+            candidates.update(names)
+            candidates.update(others)
+        scored = []
+        for i in candidates - skip:
+            union = count = 0
+            for text, weight in zip(self.texts[i], weights):
+                hit = seen.get(text)
+                if hit is None:
+                    mask = 0
+                    for gram, bit in bits:
+                        if gram in text:
+                            mask |= bit
+                    hit = seen[text] = (mask, bin(mask).count("1"))
+                union |= hit[0]
+                count += weight * hit[1]
+            if bin(union).count("1") >= needed:
+                scored.append((count / most, i))
+        return scored
+
+    def _best(self, scored: List[Tuple[float, int]], limit: int) -> List[Tuple[float, int]]:
+        """The limit highest scores, ties broken by name"""
+        return heapq.nsmallest(limit, scored, key=lambda pair: (-pair[0], self.rank[pair[1]]))
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[float, ConfigItem]]:
+        """Return up to limit (score, item) pairs, best first"""
+        query = " ".join(self.WORD.findall(query.lower()))
+        key = (query, limit)
+        if key in self._cache:
+            return self._cache[key]
+        if not query:
+            return []
+
+        start, end = self.name_prefixed(query)
+        found = [(100.0 if self.sorted_names[k] == query else 50.0, self.by_name[k])
+                 for k in range(start, min(end, start + limit))]
+        if len(found) < limit:
+            found += [(25.0, self.by_name[k])
+                      for k in self.name_containing(query, (start, end), limit - len(found))]
+        if len(found) < limit:
+            skip = set(self.by_name[start:end])
+            skip.update(i for _, i in found)
+            grams = list(self.trigrams(query, prefix=True))
+            needed = max(1, len(grams) // 2)
+            hits = self.name_hits(grams)
+            named = [i for i, count in hits.items() if count >= needed and i not in skip]
+            best = heapq.nsmallest(limit - len(found), named, key=lambda i: (-hits[i], self.rank[i]))
+            found += [(10 + hits[i] / len(grams), i) for i in best]
+            if len(found) < limit:
+                skip.update(named)
+                found += self._best(self.fuzzy_fields(grams, needed, skip), limit - len(found))
+        ranked = [(score, self.items[i]) for score, i in found]
+
+        if len(self._cache) > 1024:
+            self._cache.clear()
+        self._cache[key] = ranked
+        return ranked
+
+    @classmethod
+    def is_strong_match(cls, query: str, item: ConfigItem) -> bool:
+        """Every query word starts a word of the item's name"""
+        name_words = cls.WORD.findall(item.name.lower())
+        words = cls.WORD.findall(query.lower())
+        return bool(words) and all(any(w.startswith(q) for w in name_words) for q in words)
+
+class RequirementResolver:
+    """Resolve required commands against PATH without forking `which`
+
+    PATH is scanned at most once per run and every lookup is memoized. When a
+    cache file is given, results are persisted together with a fingerprint of
+    PATH (its value plus the mtime of each directory), so later runs reuse them
+    until a directory on PATH changes.
+    """
+
+    def __init__(self, cache_file: Optional[Path] = None, path: Optional[str] = None):
+        self.path = os.environ.get("PATH", os.defpath) if path is None else path
+        self.cache_file = cache_file
+        self.dirs = list(dict.fromkeys(d for d in self.path.split(os.pathsep) if d))
+        self._resolved: Dict[str, Optional[str]] = {}
+        self._index: Optional[Dict[str, List[str]]] = None
+        self._scan_lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self._dirty = False
+        if self.cache_file:
+            self._load()
+
+    @property
+    def fingerprint(self) -> str:
+        """Hash of PATH and the mtimes of its directories"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256(self.path.encode())
+            for directory in self.dirs:
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    mtime = -1
+                digest.update(f"\0{directory}\0{mtime}".encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _load(self):
+        """Seed the memo from the on-disk cache if PATH is unchanged"""
+        try:
+            with open(self.cache_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("fingerprint") == self.fingerprint:
+            self._resolved.update(data.get("resolved", {}))
+
+    def save(self):
+        """Persist resolved commands if anything new was looked up"""
+        if not self.cache_file or not self._dirty:
+            return
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_file.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"fingerprint": self.fingerprint, "resolved": self._resolved}, f)
+            os.replace(tmp_path, self.cache_file)
+            self._dirty = False
+        except OSError:
+            pass
+
+    def _scan(self) -> Dict[str, List[str]]:
+        """List every PATH directory once, mapping names to candidate paths"""
+        index: Dict[str, List[str]] = {}
+        for directory in self.dirs:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        index.setdefault(entry.name, []).append(entry.path)
+            except OSError:
+                continue
+        return index
+
+    def resolve(self, command: str) -> Optional[str]:
+        """Return the full path of a command, or None if it is not on PATH"""
+        if command in self._resolved:
+            return self._resolved[command]
+
+        if os.sep in command:
+            candidates = [command]
+        else:
+            with self._scan_lock:
+                if self._index is None:
+                    with tracer.span("check.scan_path"):
+                        self._index = self._scan()
+            candidates = self._index.get(command, [])
+
+        found = None
+        for candidate in candidates:
+            if os.access(candidate, os.X_OK) and not os.path.isdir(candidate):
+                found = candidate
+                break
+
+        self._resolved[command] = found
+        self._dirty = True
+        return found
+
+    def missing(self, commands: List[str]) -> List[str]:
+        """Return the commands that cannot be resolved"""
+        return [command for command in commands if self.resolve(command) is None]
+
+def load_brewfile_parser():
+    """BrewfileParser from validate-brewfile-graph.py, whose file name is not importable"""
+    import importlib.util
+    path = Path(__file__).with_name("validate-brewfile-graph.py")
+    spec = importlib.util.spec_from_file_location("validate_brewfile_graph", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.BrewfileParser
+
+class PackageIndex:
+    """Which commands and app bundles each Homebrew package provides
+
+    A `requires` entry is either a command (git) or a Homebrew package whose
+    commands are named differently (ripgrep installs rg, awscli installs aws)
+    or that only installs an app bundle (karabiner-elements). The index joins
+    configs/packages.json (what the registry's packages provide), the Brewfile
+    (which packages are casks) and an optional snapshot of installed packages
+    in `brew info --json=v2 --installed` form, where formulae may also list
+    their "binaries". It is compiled once and cached keyed by the size and
+    mtime of those files, so a check is a few dict lookups plus at most a
+    PATH or app-bundle lookup, and never runs brew.
+    """
+
+    VERSION = 1
+    APP_DIRS = (Path("/Applications"), Path("~/Applications").expanduser())
+
+    def __init__(self, known_file: Path, brewfile: Path, snapshot_file: Path, cache_file: Path,
+                 resolver: RequirementResolver, stats: StatCache):
+        self.known_file = known_file
+        self.brewfile = brewfile
+        self.snapshot_file = snapshot_file
+        self.cache_file = cache_file
+        self.resolver = resolver
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.packages: Dict[str, dict] = {}
+        self.installed: set = set()
+        self.brewfile_order: Dict[str, int] = {}
+        self.aliases: Dict[str, List[str]] = {}
+
+    def fingerprint(self) -> list:
+        """Size and mtime of each input, so any edit or new snapshot recompiles"""
+        stamps: list = [self.VERSION]
+        for path in (self.known_file, self.brewfile, self.snapshot_file):
+            try:
+                st = os.stat(path)
+                stamps.append([os.fspath(path), st.st_size, st.st_mtime_ns])
+            except OSError:
+                stamps.append([os.fspath(path), -1, -1])
+        return stamps
+
+    def load(self):
+        """Use the cached index if its inputs are unchanged, compiling it otherwise"""
+        with self._lock:
+            if self._loaded:
+                return
+            fingerprint = self.fingerprint()
+            try:
+                with open(self.cache_file) as f:
+                    data = json.load(f)
+                if data.get("fingerprint") != fingerprint:
+                    data = None
+            except (OSError, ValueError):
+                data = None
+            if data is None:
+                with tracer.span("check.packages.compile"):
+                    data = self.compile()
+                data["fingerprint"] = fingerprint
+                try:
+                    write_json_atomic(self.cache_file, data)
+                except OSError:
+                    pass
+            self.packages = data["packages"]
+            self.installed = set(data["installed"])
+            self.brewfile_order = {name: position for position, name in enumerate(data["brewfile"])}
+            self.aliases = data["aliases"]
+            self._loaded = True
+
+    @staticmethod
+    def _read_json(path: Path) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def compile(self) -> dict:
+        """Merge the three sources into packages, installed names and aliases"""
+        packages: Dict[str, dict] = {}
+
+        def entry(name: str, cask: bool = False) -> dict:
+            info = packages.setdefault(name, {"cask": cask, "commands": [], "apps": []})
+            info["cask"] = info["cask"] or cask
+            return info
+
+        def add(items: list, names):
+            items.extend(name for name in names if name not in items)
+
+        known = self._read_json(self.known_file)
+        for kind in ("formulae", "casks"):
+            for name, provides in known.get(kind, {}).items():
+                info = entry(name, kind == "casks")
+                add(info["commands"], provides.get("commands", []))
+                add(info["apps"], provides.get("apps", []))
+                if "install" in provides:
+                    info["install"] = provides["install"]
+
+        brewfile_names = []
+        if self.brewfile.exists():
+            for declared in load_brewfile_parser()(str(self.brewfile), None).entries:
+                if declared.kind in ("brew", "cask"):
+                    entry(declared.name, declared.kind == "cask")
+                    brewfile_names.append(declared.name)
+
+        installed = []
+        aliases: Dict[str, List[str]] = {}
+        snapshot = self._read_json(self.snapshot_file)
+        for formula in snapshot.get("formulae", []):
+            info = entry(formula["name"])
+            add(info["commands"], formula.get("binaries", []))
+            if formula.get("installed"):
+                installed.append(formula["name"])
+            for alias in formula.get("aliases", []) + formula.get("oldnames", []):
+                add(aliases.setdefault(alias, []), [formula["name"]])
+        for cask in snapshot.get("casks", []):
+            info = entry(cask["token"], True)
+            for artifact in cask.get("artifacts", []):
+                if not isinstance(artifact, dict):
+                    continue
+                # Artifacts are [source, {"target": name}?] lists; the target wins
+                for key, field in (("app", "apps"), ("binary", "commands")):
+                    names = []
+                    for item in artifact.get(key, []):
+                        if isinstance(item, str):
+                            names.append(os.path.basename(item))
+                        elif isinstance(item, dict) and "target" in item and names:
+                            names[-1] = os.path.basename(item["target"])
+                    add(info[field], names)
+            if cask.get("installed"):
+                installed.append(cask["token"])
+
+        # postgresql@16 provides what postgresql does and satisfies it
+        for name in sorted(packages):
+            base = name.split("@", 1)[0]
+            if base != name:
+                if base in packages and not (packages[name]["commands"] or packages[name]["apps"]):
+                    packages[name]["commands"] = list(packages[base]["commands"])
+                    packages[name]["apps"] = list(packages[base]["apps"])
+                add(aliases.setdefault(base, []), [name])
+        # A command names the packages that provide it, e.g. code → visual-studio-code
+        for name in sorted(packages):
+            for command in packages[name]["commands"]:
+                if command != name:
+                    add(aliases.setdefault(command, []), [name])
+        return {"packages": packages, "installed": sorted(installed),
+                "brewfile": brewfile_names, "aliases": aliases}
+
+    def candidates(self, requirement: str) -> List[str]:
+        """The requirement and the packages that satisfy it"""
+        if not self._loaded:
+            self.load()
+        return [requirement] + self.aliases.get(requirement, [])
+
+    def commands(self, requirement: str) -> List[str]:
+        """Commands whose presence satisfies the requirement, itself last"""
+        found: List[str] = []
+        for name in self.candidates(requirement):
+            for command in self.packages.get(name, {}).get("commands", []):
+                if command not in found:
+                    found.append(command)
+        if requirement not in found:
+            found.append(requirement)
+        return found
+
+    def apps(self, requirement: str) -> List[str]:
+        """App bundles whose presence satisfies the requirement"""
+        found: List[str] = []
+        for name in self.candidates(requirement):
+            for app in self.packages.get(name, {}).get("apps", []):
+                if app not in found:
+                    found.append(app)
+        return found
+
+    def satisfied(self, requirement: str) -> bool:
+        """Installed per the snapshot, or one of its commands or app bundles is present"""
+        if any(name in self.installed for name in self.candidates(requirement)):
+            return True
+        if any(self.resolver.resolve(command) for command in self.commands(requirement)):
+            return True
+        return any(self.stats.exists(directory / app)
+                   for app in self.apps(requirement) for directory in self.APP_DIRS)
+
+    def missing(self, requirements: List[str]) -> List[str]:
+        return [requirement for requirement in requirements if not self.satisfied(requirement)]
+
+    def install_name(self, requirement: str) -> Tuple[str, bool]:
+        """The package to install for a requirement and whether it is a cask
+
+        The Brewfile's choice wins, so postgresql suggests postgresql@16 and
+        python3 the first python@ it lists.
+        """
+        candidates = self.candidates(requirement)
+        listed = [name for name in candidates if name in self.brewfile_order]
+        if listed:
+            name = min(listed, key=self.brewfile_order.__getitem__)
+        else:
+            name = next((name for name in candidates if name in self.packages), requirement)
+        info = self.packages.get(name, {})
+        return info.get("install", name), info.get("cask", False)
+
+    def install_commands(self, requirements) -> List[str]:
+        """brew install lines for the requirements, casks on their own line"""
+        formulae: Dict[str, None] = {}
+        casks: Dict[str, None] = {}
+        for requirement in requirements:
+            name, cask = self.install_name(requirement)
+            (casks if cask else formulae)[name] = None
+        lines = []
+        if formulae:
+            lines.append(f"brew install {' '.join(formulae)}")
+        if casks:
+            lines.append(f"brew install --cask {' '.join(casks)}")
+        return lines
+
+    @traced("check.packages.capture")
+    def capture(self) -> int:
+        """Record installed packages and their binaries as the snapshot, with one brew call"""
+        brew = self.resolver.resolve("brew")
+        if brew is None:
+            raise RuntimeError("brew not found on PATH")
+        proc = subprocess.run([brew, "info", "--json=v2", "--installed"], capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.decode(errors="replace").strip() or f"exit {proc.returncode}")
+        data = json.loads(proc.stdout)
+        prefix = Path(os.environ.get("HOMEBREW_PREFIX") or Path(brew).parent.parent)
+        for formula in data.get("formulae", []):
+            try:
+                formula["binaries"] = sorted(os.listdir(prefix / "opt" / formula["name"] / "bin"))
+            except OSError:
+                formula["binaries"] = []
+        write_json_atomic(self.snapshot_file, data)
+        with self._lock:
+            self._loaded = False
+        return len(data.get("formulae", [])) + len(data.get("casks", []))
+
+class BackupStore:
+    """Content-addressed backup storage
+
+    File contents are stored once under `objects/`, keyed by SHA-256, and each
+    backup writes a small JSON manifest under `snapshots/` recording which
+    config, destination and blob every entry refers to. Backing up a file that
+    has not changed since the last backup only costs a manifest entry.
+    Copies made before the store (`<file>.<timestamp>.bak` in the root) are
+    moved into it by `import_legacy`.
+    """
+
+    SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+    LEGACY_NAME = re.compile(r"^(?P<name>.+)\.(?P<stamp>\d{8}_\d{6})\.bak$")
+
+    def __init__(self, root: Path, compression: str = "none"):
+        if compression not in self.SUFFIXES:
+            raise ValueError(f"Unknown backup compression: {compression}")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.snapshots_dir = root / "snapshots"
+        self.compression = compression
+
+    def blob_path(self, digest: str, compression: str) -> Path:
+        """Location of a blob stored with the given compression"""
+        return self.objects_dir / digest[:2] / (digest[2:] + self.SUFFIXES[compression])
+
+    def find_blob(self, digest: str) -> Optional[str]:
+        """Return the compression of an existing blob, or None if it is not stored"""
+        for compression in self.SUFFIXES:
+            if self.blob_path(digest, compression).exists():
+                return compression
+        return None
+
+    @staticmethod
+    def _open_blob(f, compression: str, mode: str):
+        if compression == "gzip":
+            return gzip.GzipFile(fileobj=f, mode=mode)
+        if compression == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("Reading zstd backups requires the 'zstandard' package")
+            if mode == "wb":
+                return zstandard.ZstdCompressor().stream_writer(f, closefd=False)
+            return zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+        return open(f.fileno(), mode, closefd=False)
+
+    def store_file(self, path: Path) -> Tuple[str, str]:
+        """Add a file's contents to the store, returning (digest, compression)"""
+        digest = file_digest(path)
+        existing = self.find_blob(digest)
+        if existing:
+            return digest, existing
+
+        blob_path = self.blob_path(digest, self.compression)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_name(f"{blob_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(path, "rb") as src, open(tmp_path, "wb") as raw:
+            with self._open_blob(raw, self.compression, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, blob_path)
+        return digest, self.compression
+
+    def snapshot(self, configs: List["ConfigItem"]) -> Optional[Path]:
+        """Back up the installed files of configs into one snapshot manifest"""
+        entries = []
+        for config in configs:
+            dest_path = Path(config.dest).expanduser()
+            if not dest_path.is_file():
+                continue
+            st = dest_path.stat()
+            digest, compression = self.store_file(dest_path)
+            entries.append({
+                "config": config.name,
+                "dest": config.dest,
+                "hash": digest,
+                "compression": compression,
+                "size": st.st_size,
+                "mode": stat.S_IMODE(st.st_mode),
+                "mtime": st.st_mtime,
+            })
+        if not entries:
+            return None
+
+        created = datetime.now()
+        snapshot_id = f"{created:%Y%m%d_%H%M%S}-{uuid.uuid4().hex[:8]}"
+        manifest_path = self.snapshots_dir / f"{snapshot_id}.json"
+        write_json_atomic(manifest_path, {
+            "id": snapshot_id,
+            "created": created.isoformat(timespec="seconds"),
+            "entries": entries,
+        })
+        return manifest_path
+
+    def manifests(self, limit: Optional[int] = None) -> List[Tuple[Path, dict]]:
+        """Load snapshot manifests, newest first, stopping after limit"""
+        if not self.snapshots_dir.exists():
+            return []
+        manifests = []
+        for path in sorted(self.snapshots_dir.glob("*.json"), reverse=True):
+            if limit is not None and len(manifests) >= limit:
+                break
+            try:
+                with open(path) as f:
+                    manifests.append((path, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return manifests
+
+    @staticmethod
+    def find_entries(manifest_path: Path) -> List[dict]:
+        """Return all entries of a snapshot manifest"""
+        with open(manifest_path) as f:
+            return json.load(f)["entries"]
+
+    @classmethod
+    def find_entry(cls, manifest_path: Path, config_name: str) -> dict:
+        """Return the entry for config_name from a snapshot manifest"""
+        for entry in cls.find_entries(manifest_path):
+            if entry["config"] == config_name:
+                return entry
+        raise KeyError(f"{config_name} is not in snapshot {manifest_path.stem}")
+
+    def restore_entry(self, entry: dict, dest_path: Optional[Path] = None):
+        """Write a manifest entry's contents back to its destination"""
+        dest_path = dest_path or Path(entry["dest"]).expanduser()
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        blob_path = self.blob_path(entry["hash"], entry["compression"])
+        tmp_path = dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(blob_path, "rb") as raw, open(tmp_path, "wb") as dst:
+                with self._open_blob(raw, entry["compression"], "rb") as src:
+                    shutil.copyfileobj(src, dst)
+            os.chmod(tmp_path, entry["mode"])
+            os.utime(tmp_path, (entry["mtime"], entry["mtime"]))
+            os.replace(tmp_path, dest_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @traced("backup.import_legacy")
+    def import_legacy(self, configs: List["ConfigItem"]) -> Tuple[int, List[Path]]:
+        """Move the `.bak` copies made before the store into snapshot manifests
+
+        A copy belongs to the config whose destination has its file name, and
+        copies taken in the same second share a snapshot. Copies that match no
+        config, or several, are left in place. Returns how many copies were
+        imported and the paths left behind.
+        """
+        by_name: Dict[str, List[ConfigItem]] = {}
+        for config in configs:
+            by_name.setdefault(Path(config.dest).name, []).append(config)
+        snapshots: Dict[str, List[Tuple[Path, dict]]] = {}
+        left = []
+        for path in sorted(self.root.glob("*.bak")):
+            match = self.LEGACY_NAME.match(path.name)
+            candidates = by_name.get(match.group("name"), []) if match else []
+            if len(candidates) != 1:
+                left.append(path)
+                continue
+            st = path.stat()
+            digest, compression = self.store_file(path)
+            snapshots.setdefault(match.group("stamp"), []).append((path, {
+                "config": candidates[0].name,
+                "dest": candidates[0].dest,
+                "hash": digest,
+                "compression": compression,
+                "size": st.st_size,
+                "mode": stat.S_IMODE(st.st_mode),
+                "mtime": st.st_mtime,
+            }))
+
+        for stamp, imported in snapshots.items():
+            manifest_path = self.snapshots_dir / f"{stamp}-legacy.json"
+            entries = {entry["config"]: entry for _, entry in imported}
+            if manifest_path.exists():
+                # An earlier import stopped before removing all of its copies
+                entries = dict({entry["config"]: entry for entry in self.find_entries(manifest_path)}, **entries)
+            write_json_atomic(manifest_path, {
+                "id": f"{stamp}-legacy",
+                "created": datetime.strptime(stamp, "%Y%m%d_%H%M%S").isoformat(timespec="seconds"),
+                "entries": list(entries.values()),
+            })
+            for path, _ in imported:
+                path.unlink()
+        return sum(map(len, snapshots.values())), left
+
+    @traced("backup.gc")
+    def gc(self, keep: int = 10, dry_run: bool = False, pinned: set = frozenset()) -> Dict[str, int]:
+        """Keep the newest `keep` backups of each config and drop unreferenced blobs
+
+        Snapshots in pinned (those a deploy journal may still roll back to)
+        are kept whole and do not count towards `keep`.
+        """
+        kept: Dict[str, int] = {}
+        referenced = set()
+        stats = {"snapshots": 0, "entries": 0, "blobs": 0, "bytes": 0}
+
+        for path, manifest in self.manifests():
+            if path in pinned:
+                referenced.update((entry["hash"], entry["compression"])
+                                  for entry in manifest.get("entries", []))
+                continue
+            entries = []
+            for entry in manifest.get("entries", []):
+                count = kept.get(entry["config"], 0)
+                if count < keep:
+                    kept[entry["config"]] = count + 1
+                    entries.append(entry)
+                    referenced.add((entry["hash"], entry["compression"]))
+                else:
+                    stats["entries"] += 1
+            if not entries:
+                stats["snapshots"] += 1
+                if not dry_run:
+                    path.unlink()
+            elif len(entries) != len(manifest["entries"]) and not dry_run:
+                write_json_atomic(path, dict(manifest, entries=entries))
+
+        compressions = {suffix.lstrip("."): name for name, suffix in self.SUFFIXES.items()}
+        for blob in self.objects_dir.glob("*/*"):
+            if blob.name.endswith(".tmp"):
+                continue
+            rest, _, suffix = blob.name.partition(".")
+            key = (blob.parent.name + rest, compressions.get(suffix))
+            if key not in referenced:
+                stats["blobs"] += 1
+                stats["bytes"] += blob.stat().st_size
+                if not dry_run:
+                    blob.unlink()
+        return stats
+
+class DeployState:
+    """Persistent index of what was last deployed for each configuration
+
+    For every config the size, mtime and SHA-256 of both the source and the
+    deployed file are recorded. A file whose size and mtime still match its
+    record is assumed unchanged, so its hash is reused instead of re-reading it.
+    """
+
+    UP_TO_DATE = "up to date"
+    NOT_DEPLOYED = "not deployed"
+    SOURCE_CHANGED = "source changed"
+    DEST_CHANGED = "edited locally"
+    BOTH_CHANGED = "both changed"
+    UNTRACKED = "differs (untracked)"
+    SOURCE_MISSING = "source missing"
+
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self.records: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(state_file) as f:
+                self.records = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def signature(path: Path, recorded: Optional[dict] = None) -> Optional[dict]:
+        """Size, mtime and hash of path, reusing the recorded hash if stat matches"""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        if recorded and recorded["size"] == st.st_size and recorded["mtime_ns"] == st.st_mtime_ns:
+            return recorded
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": file_digest(path)}
+
+    def record(self, name: str, source: dict, dest: dict):
+        """Remember the source and destination signatures after a deploy"""
+        with self._lock:
+            self.records[name] = {"source": source, "dest": dest}
+            self._dirty = True
+
+    def compare(self, name: str, source_path: Path, dest_path: Path) -> Tuple[str, Optional[dict], Optional[dict]]:
+        """Classify drift, returning (status, source signature, dest signature)"""
+        record = self.records.get(name, {})
+        source = self.signature(source_path, record.get("source"))
+        dest = self.signature(dest_path, record.get("dest"))
+        if source is None:
+            return self.SOURCE_MISSING, source, dest
+        if dest is None:
+            return self.NOT_DEPLOYED, source, dest
+        if source["hash"] == dest["hash"]:
+            return self.UP_TO_DATE, source, dest
+        if not record:
+            return self.UNTRACKED, source, dest
+
+        source_changed = source["hash"] != record["source"]["hash"]
+        dest_changed = dest["hash"] != record["dest"]["hash"]
+        if source_changed and dest_changed:
+            return self.BOTH_CHANGED, source, dest
+        if dest_changed:
+            return self.DEST_CHANGED, source, dest
+        return self.SOURCE_CHANGED, source, dest
+
+    def forget(self, name: str):
+        """Drop the record for a config whose deploy was rolled back"""
+        with self._lock:
+            if self.records.pop(name, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        """Write the index back if any deploy updated it"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                write_json_atomic(self.state_file, self.records)
+                self._dirty = False
+            except OSError:
+                pass
+
+class DeployJournal:
+    """Write-ahead journal for one deploy batch
+
+    Before a destination is replaced, a record of what was there before
+    (nothing, a symlink, a hardlink to the source, or a backup snapshot) is
+    appended and flushed to disk. Committing deletes the journal; rolling back
+    replays the records in reverse. The batch holds an exclusive flock on its
+    journal while it runs, so a journal that can be locked at startup belongs
+    to a batch whose process has gone away, and is rolled back.
+    """
+
+    def __init__(self, path: Path, handle=None):
+        self.path = path
+        self._handle = handle
+        self._lock = threading.Lock()
+
+    @classmethod
+    def begin(cls, journal_dir: Path) -> "DeployJournal":
+        """Start a new batch journal, locked until it commits or rolls back"""
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        path = journal_dir / f"{datetime.now():%Y%m%d_%H%M%S}-{uuid.uuid4().hex[:8]}.log"
+        handle = open(path, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            if e.errno not in (errno.ENOLCK, errno.EOPNOTSUPP):
+                handle.close()
+                raise
+        journal = cls(path, handle)
+        journal._append({"op": "begin", "pid": os.getpid()})
+        return journal
+
+    @classmethod
+    def pending(cls, journal_dir: Path) -> List["DeployJournal"]:
+        """Journals left behind by batches that neither committed nor rolled back
+
+        Journals locked by a batch that is still running are skipped. Each
+        journal returned is locked by this process until it is rolled back.
+        """
+        if not journal_dir.exists():
+            return []
+        journals = []
+        for path in sorted(journal_dir.glob("*.log")):
+            try:
+                handle = open(path, "a")
+            except OSError:
+                continue
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                # Locked by a live batch; where locking is unsupported,
+                # fall back to the pid the batch recorded
+                if e.errno in (errno.EWOULDBLOCK, errno.EAGAIN) or cls(path).owner_alive():
+                    handle.close()
+                    continue
+            # The batch may have committed between the glob and the lock
+            if os.fstat(handle.fileno()).st_nlink == 0:
+                handle.close()
+                continue
+            journals.append(cls(path, handle))
+        return journals
+
+    @classmethod
+    def snapshots(cls, journal_dir: Path) -> set:
+        """Backup snapshots that running or interrupted batches may roll back to"""
+        if not journal_dir.exists():
+            return set()
+        return {Path(record["previous"]["snapshot"])
+                for path in journal_dir.glob("*.log")
+                for record in cls(path).records()
+                if record["previous"] and "snapshot" in record["previous"]}
+
+    def owner_alive(self) -> bool:
+        """Whether the process that began this batch is still running"""
+        try:
+            with open(self.path) as f:
+                pid = json.loads(f.readline())["pid"]
+            os.kill(pid, 0)
+        except PermissionError:
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        return pid != os.getpid()
+
+    def _append(self, record: dict):
+        with self._lock:
+            f = self._handle or open(self.path, "a")
+            try:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                if f is not self._handle:
+                    f.close()
+
+    def _release(self):
+        """Delete the journal, then drop its lock"""
+        self.path.unlink()
+        if self._handle:
+            self._handle.close()
+            self._handle = None
+
+    def prepare(self, config: "ConfigItem", dest_path: Path, previous: Optional[dict]):
+        """Record what dest_path held before config replaces it"""
+        self._append({"op": "replace", "config": config.name, "dest": str(dest_path),
+                      "previous": previous})
+
+    def records(self) -> List[dict]:
+        """Replace records in the order they were written, ignoring a torn last line"""
+        records = []
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if record.get("op") == "replace":
+                        records.append(record)
+        except OSError:
+            pass
+        return records
+
+    def commit(self):
+        """Mark the batch as applied"""
+        self._release()
+
+    def rollback(self, backups: "BackupStore") -> List[str]:
+        """Put every replaced destination back, newest first, returning config names"""
+        restored = []
+        for record in reversed(self.records()):
+            dest_path = Path(record["dest"])
+            previous = record["previous"]
+            if previous is None:
+                if os.path.lexists(dest_path) and not dest_path.is_dir():
+                    dest_path.unlink()
+            elif "symlink" in previous:
+                tmp_path = dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex}.tmp")
+                os.symlink(previous["symlink"], tmp_path)
+                os.replace(tmp_path, dest_path)
+            elif "hardlink" in previous:
+                ConfigManager.install_file(Path(previous["hardlink"]), dest_path, "hardlink")
+            else:
+                entry = backups.find_entry(Path(previous["snapshot"]), record["config"])
+                backups.restore_entry(entry, dest_path)
+            restored.append(record["config"])
+        self._release()
+        return restored
+
+class TemplateError(ValueError):
+    """A template that does not parse, or uses a variable with no value"""
+
+class Template:
+    """A configuration source with per-host placeholders, parsed once
+
+    `{{ name }}` is replaced by a variable and `{{ name | text }}` falls back to
+    text when the variable is unset. Whole lines of `{% if name %}`,
+    `{% if name == "value" %}` (or `!=`), `{% else %}` and `{% endif %}` keep
+    or drop the lines between them. Parsing yields a node tree plus the set of
+    variable names the template reads.
+    """
+    
+    TOKEN = re.compile(
+        r"\{\{\s*(\w+)\s*(?:\|\s*(.*?)\s*)?\}\}"
+        r"|^[ \t]*\{%\s*(if|else|endif)\b\s*(.*?)\s*%\}[ \t]*(?:\n|$)",
+        re.MULTILINE)
+    CONDITION = re.compile(r"(\w+)(?:\s*(==|!=)\s*(?:\"([^\"]*)\"|'([^']*)'|(\S+)))?$")
+    
+    def __init__(self, text: str):
+        self.names: set = set()
+        self.nodes = self._parse(text)
+        
+    def _parse(self, text: str) -> list:
+        root: list = []
+        stack = [(root, None)]
+        position = 0
+        for match in self.TOKEN.finditer(text):
+            nodes = stack[-1][0]
+            if match.start() > position:
+                nodes.append(text[position:match.start()])
+            position = match.end()
+            name, default, tag, argument = match.groups()
+            if name:
+                self.names.add(name)
+                nodes.append(("var", name, default))
+            elif tag == "if":
+                condition = self.CONDITION.match(argument)
+                if not condition:
+                    raise TemplateError(f"bad condition: {argument!r}")
+                variable, op, *values = condition.groups()
+                self.names.add(variable)
+                value = next((v for v in values if v is not None), None)
+                node = ("if", variable, op, value, [], [])
+                nodes.append(node)
+                stack.append((node[4], node))
+            elif tag == "else":
+                if stack[-1][1] is None:
+                    raise TemplateError("{% else %} outside {% if %}")
+                stack[-1] = (stack[-1][1][5], stack[-1][1])
+            else:
+                if stack[-1][1] is None:
+                    raise TemplateError("{% endif %} without {% if %}")
+                stack.pop()
+        if len(stack) > 1:
+            raise TemplateError("{% if %} without {% endif %}")
+        if position < len(text):
+            root.append(text[position:])
+        return root
+        
+    def render(self, variables: dict) -> str:
+        parts: List[str] = []
+        self._render(self.nodes, variables, parts)
+        return "".join(parts)
+        
+    def _render(self, nodes: list, variables: dict, parts: List[str]):
+        for node in nodes:
+            if isinstance(node, str):
+                parts.append(node)
+            elif node[0] == "var":
+                _, name, default = node
+                value = variables.get(name)
+                if value is None:
+                    if default is None:
+                        raise TemplateError(f"no value for {{{{ {name} }}}}")
+                    value = default
+                parts.append(str(value))
+            else:
+                _, name, op, value, then_nodes, else_nodes = node
+                actual = variables.get(name)
+                if op == "==":
+                    keep = str(actual) == value
+                elif op == "!=":
+                    keep = str(actual) != value
+                else:
+                    keep = bool(actual)
+                self._render(then_nodes if keep else else_nodes, variables, parts)
+
+class TemplateRenderer:
+    """Render template sources per host, caching both compilation and output
+
+    Compiled templates are kept in memory for the run, keyed by the hash of
+    the template text. Rendered files are stored under cache_dir, keyed by
+    that hash plus a hash of only the variables the template reads, so
+    re-rendering a fleet only does work for hosts whose inputs changed.
+    Renders of template text that no longer exists are removed by `prune`.
+    """
+    
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.compiled: Dict[str, Template] = {}
+        self.renders = 0
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        
+    def template(self, source_path: Path) -> Tuple[str, Template]:
+        """Template hash and compiled template, reread only when the file changes"""
+        st = source_path.stat()
+        with self._lock:
+            cached = self._hashes.get(str(source_path))
+        if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+            template_hash = cached[2]
+        else:
+            template_hash = file_digest(source_path)
+            with self._lock:
+                self._hashes[str(source_path)] = (st.st_size, st.st_mtime_ns, template_hash)
+        if template_hash not in self.compiled:
+            with self._lock:
+                if template_hash not in self.compiled:
+                    self.compiled[template_hash] = Template(source_path.read_text())
+        return template_hash, self.compiled[template_hash]
+        
+    @traced("deploy.render", lambda self, source_path, variables: {"template": source_path.name})
+    def render(self, source_path: Path, variables: dict) -> Path:
+        """Path of the rendered output for these variables, rendering it if needed"""
+        template_hash, template = self.template(source_path)
+        used = {name: variables.get(name) for name in sorted(template.names)}
+        vars_hash = hashlib.sha256(json.dumps(used, sort_keys=True, default=str).encode()).hexdigest()
+        rendered_path = self.cache_dir / template_hash[:2] / f"{template_hash[2:16]}-{vars_hash[:16]}"
+        if not rendered_path.exists():
+            text = template.render(variables)
+            rendered_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = rendered_path.with_name(f".{rendered_path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_text(text)
+            os.chmod(tmp_path, source_path.stat().st_mode & 0o777)
+            os.replace(tmp_path, rendered_path)
+            with self._lock:
+                self.renders += 1
+        return rendered_path
+        
+    def prune(self, source_paths: List[Path], dry_run: bool = False) -> Dict[str, int]:
+        """Delete rendered files whose template hash matches none of source_paths
+
+        Renders of the current templates are kept for every set of variables,
+        so hosts deployed earlier still hit the cache.
+        """
+        live = {self.template(path)[0][:16] for path in source_paths if path.exists()}
+        stats = {"renders": 0, "bytes": 0}
+        for rendered_path in self.cache_dir.glob("*/*"):
+            if rendered_path.name.endswith(".tmp"):
+                continue
+            if rendered_path.parent.name + rendered_path.name.partition("-")[0] not in live:
+                stats["renders"] += 1
+                stats["bytes"] += rendered_path.stat().st_size
+                if not dry_run:
+                    rendered_path.unlink()
+        return stats
+
+class StatusScan:
+    """Check which configs are installed, stat'ing their destinations concurrently
+
+    Run in the background, each item's installed flag is set as its stat
+    returns, so a view can render at once and fill in the rest as it redraws.
+    An item whose state is set while it is still queued, e.g. by a deploy,
+    keeps that state.
+    """
+
+    def __init__(self, stats: StatCache, configs: List[ConfigItem]):
+        self.stats = stats
+        self.configs = [config for config in configs if config.installed_state is None]
+        self._cancelled = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _check(self, config: ConfigItem):
+        if self._cancelled or config.installed_state is not None:
+            return
+        installed = self.stats.exists(Path(config.dest).expanduser())
+        if config.installed_state is None:
+            config.installed = installed
+
+    @traced("status.scan", lambda self: {"configs": len(self.configs)})
+    def run(self) -> "StatusScan":
+        map_concurrent(self._check, self.configs, self.stats.jobs)
+        return self
+
+    def start(self) -> "StatusScan":
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self):
+        if self._thread:
+            self._thread.join()
+
+    def cancel(self):
+        """Skip whatever is still queued and wait for in-flight stats"""
+        self._cancelled = True
+        self.wait()
+
+class ConfigManager:
+    """Main configuration manager"""
+    
+    DEPLOY_MODES = ("copy", "symlink", "hardlink")
+    
+    def __init__(self, base_path: str = ".", backup_compression: str = "none",
+                 registry_file: Optional[Path] = None, link: bool = False,
+                 brew_snapshot: Optional[Path] = None):
+        self.base_path = Path(base_path)
+        self.link = link
+        self.configs_dir = self.base_path / "configs"
+        self.backup_dir = self.base_path / ".config-backups"
+        self.journal_dir = self.backup_dir / "journal"
+        self.cache_dir = self.base_path / ".config-cache"
+        self.registry_file = Path(registry_file) if registry_file else self.configs_dir / "registry.json"
+        self.backups = BackupStore(self.backup_dir, backup_compression)
+        self.state = DeployState(self.cache_dir / "deploy-state.json")
+        self.resolver = RequirementResolver(self.cache_dir / "requirements.json")
+        self.hosts_file = self.configs_dir / "hosts.json"
+        self.renderer = TemplateRenderer(self.cache_dir / "rendered")
+        self.stats = StatCache()
+        self.packages = PackageIndex(self.configs_dir / "packages.json", self.base_path / "Brewfile",
+                                     Path(brew_snapshot) if brew_snapshot else self.cache_dir / "brew-snapshot.json",
+                                     self.cache_dir / "package-index.json", self.resolver, self.stats)
+        self._hosts: Optional[dict] = None
+        self.load_configurations()
+        
+    @traced("load")
+    def load_configurations(self):
+        """Load the configuration registry"""
+        self.registry = ConfigRegistry(self.registry_file, self.configs_dir, self.stats)
+        self._configs: Optional[Dict[str, List[ConfigItem]]] = None
+        self._search_index: Optional[SearchIndex] = None
+        
+    @property
+    def configs(self) -> Dict[str, List[ConfigItem]]:
+        """All available configurations by category, resolved on first access"""
+        if self._configs is None:
+            with tracer.span("load.resolve"):
+                self.stats.prefetch(self.registry.source_paths())
+                self._configs = {category: self.registry.category(category)
+                                 for category in self.registry.categories}
+        return self._configs
+        
+    def all_configs(self) -> List[ConfigItem]:
+        return [config for configs in self.configs.values() for config in configs]
+        
+    def scan_status(self, configs: List[ConfigItem], background: bool = False,
+                    refresh: bool = False) -> StatusScan:
+        """Check which configs are installed; in the background the scan is returned still running
+
+        With refresh, cached results are dropped and every config is re-checked,
+        e.g. after a restore rewrote their destinations.
+        """
+        if refresh:
+            for config in configs:
+                self.stats.forget(Path(config.dest).expanduser())
+                config.installed = None
+        scan = StatusScan(self.stats, configs)
+        return scan.start() if background else scan.run()
+        
+    def find_config(self, name: str) -> Optional[ConfigItem]:
+        """Find an available configuration by case-insensitive name"""
+        return self.registry.get(name)
+        
+    @property
+    def dependencies(self) -> DependencyGraph:
+        return self.registry.dependencies
+        
+    def with_prerequisites(self, configs: List[ConfigItem]) -> Tuple[List[ConfigItem], List[ConfigItem]]:
+        """configs plus the available configs they must be deployed after, and which of those were added"""
+        added = [config for config in self.dependencies.closure(configs)[len(configs):]
+                 if self.registry.available(config)]
+        return list(configs) + added, added
+        
+    def host_variables(self, host: Optional[str] = None) -> dict:
+        """Template variables for a --host spec, or this machine when host is None
+
+        Built-ins (host, user) are overridden by the defaults in hosts.json,
+        then by the entry for the full spec or its bare host name.
+        """
+        if self._hosts is None:
+            self._hosts = {}
+            if self.hosts_file.exists():
+                with open(self.hosts_file) as f:
+                    self._hosts = json.load(f)
+        if host is None:
+            name, user = os.uname().nodename.split(".")[0], os.environ.get("USER", "")
+        elif host.startswith("local:"):
+            name, user = Path(host[len("local:"):]).name, os.environ.get("USER", "")
+        else:
+            user, _, name = host.rpartition("@")
+        variables = {"host": name, "user": user or os.environ.get("USER", "")}
+        variables.update(self._hosts.get("defaults", {}))
+        entries = self._hosts.get("hosts", {})
+        variables.update(entries.get(host, entries.get(name, {})) if host else entries.get(name, {}))
+        return variables
+        
+    def source_path(self, config: ConfigItem, host: Optional[str] = None) -> Path:
+        """File to deploy for a config: its source, or the source rendered for host"""
+        source_path = self.configs_dir / config.source
+        if config.template and source_path.exists():
+            return self.renderer.render(source_path, self.host_variables(host))
+        return source_path
+        
+    def prune_renders(self, dry_run: bool = False) -> Dict[str, int]:
+        """Delete cached renders of template text no config uses any more"""
+        return self.renderer.prune([self.configs_dir / config.source
+                                    for config in self.all_configs() if config.template], dry_run)
+        
+    @property
+    def search_index(self) -> SearchIndex:
+        """Search index over the whole registry, built on first use"""
+        if self._search_index is None:
+            self._search_index = SearchIndex(list(self.registry.by_name.values()))
+        return self._search_index
+        
+    def search(self, query: str, limit: int = 20) -> List[ConfigItem]:
+        """Available configurations matching query, best first"""
+        return [item for _, item in self.search_index.search(query, limit * 2)
+                if self.registry.available(item)][:limit]
+        
+    def category_configs(self, category: str) -> Optional[List[ConfigItem]]:
+        """Available configurations in a category, or None if it is unknown"""
+        if category not in self.registry.by_category:
+            return None
+        return self.registry.category(category)
+        
+    @traced("backup", lambda self, config: {"config": config.name})
+    def create_backup(self, config: ConfigItem) -> bool:
+        """Create backup of existing configuration"""
+        dest_path = Path(config.dest).expanduser()
+        if not dest_path.exists():
+            return True
+            
+        try:
+            config.backup_path = self.backups.snapshot([config])
+            return True
+        except Exception as e:
+            console.print(f"[red]Failed to backup {dest_path}: {e}[/red]")
+            return False
+            
+    def import_legacy_backups(self) -> Tuple[int, List[Path]]:
+        """Bring `.bak` copies from before the backup store into it"""
+        return self.backups.import_legacy(self.all_configs())
+        
+    @traced("backup", lambda self, configs: {"configs": len(configs)})
+    def backup_configs(self, configs: List[ConfigItem]) -> Optional[Path]:
+        """Back up several installed configurations into a single snapshot"""
+        manifest_path = self.backups.snapshot(configs)
+        if manifest_path:
+            for config in configs:
+                config.backup_path = manifest_path
+        return manifest_path
+            
+    def config_status(self, config: ConfigItem) -> str:
+        """Report drift between a configuration's source and its deployed file"""
+        try:
+            source_path = self.source_path(config)
+        except TemplateError:
+            source_path = self.configs_dir / config.source
+        dest_path = Path(config.dest).expanduser()
+        return self.state.compare(config.name, source_path, dest_path)[0]
+        
+    def deploy_mode(self, config: ConfigItem) -> str:
+        """How a config is deployed: copied, or linked as the item specifies with --link
+
+        Templates are always copied, since what gets deployed is per-host output.
+        """
+        if config.template:
+            return "copy"
+        return config.link if self.link and config.link in self.DEPLOY_MODES else "copy"
+        
+    @staticmethod
+    def is_deployed_as(mode: str, source_path: Path, dest_path: Path) -> bool:
+        """Whether dest is already a copy, symlink or hardlink of source as mode asks"""
+        if mode == "symlink":
+            return dest_path.is_symlink() and os.path.realpath(dest_path) == os.path.realpath(source_path)
+        if dest_path.is_symlink():
+            return False
+        try:
+            linked = os.path.samefile(source_path, dest_path)
+        except OSError:
+            return False
+        return linked if mode == "hardlink" else not linked
+        
+    @staticmethod
+    @traced("deploy.install", lambda source_path, dest_path, mode: {"mode": mode})
+    def install_file(source_path: Path, dest_path: Path, mode: str) -> str:
+        """Atomically put source at dest by copying or linking, returning the mode used
+        
+        The new file is created under a temporary name next to dest and moved
+        into place with os.replace, so dest is never left half-written.
+        Hardlinks fall back to a copy when source and dest are on different
+        filesystems.
+        """
+        tmp_path = dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            if mode == "symlink":
+                os.symlink(source_path.resolve(), tmp_path)
+            elif mode == "hardlink":
+                try:
+                    os.link(source_path, tmp_path)
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        raise
+                    shutil.copy2(source_path, tmp_path)
+                    mode = "copy"
+            else:
+                shutil.copy2(source_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+        finally:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+        return mode
+        
+    @traced("deploy", lambda self, config, *args, **kwargs: {"config": config.name})
+    def deploy_config(self, config: ConfigItem, force: bool = False,
+                      journal: Optional[DeployJournal] = None) -> Optional[str]:
+        """Deploy a configuration file, skipping it if already up to date
+        
+        Returns "deployed", DeployState.UP_TO_DATE when nothing needed
+        writing, or None when the deploy failed.
+        """
+        try:
+            source_path = self.source_path(config)
+        except TemplateError as e:
+            console.print(f"[red]✗ Failed to render {config.name}: {e}[/red]")
+            return None
+        dest_path = Path(config.dest).expanduser()
+        mode = self.deploy_mode(config)
+        config.bytes_written = 0
+        
+        if os.path.lexists(dest_path) and not dest_path.is_symlink() and not dest_path.is_file():
+            # Only regular files and links can be backed up and rolled back
+            console.print(f"[red]✗ Failed to deploy {config.name}: {dest_path} is not a regular file[/red]")
+            return None
+        
+        status, source_sig, _ = self.state.compare(config.name, source_path, dest_path)
+        if (status == DeployState.UP_TO_DATE and not force
+                and self.is_deployed_as(mode, source_path, dest_path)):
+            console.print(f"[dim]= {config.name} is up to date[/dim]")
+            return DeployState.UP_TO_DATE
+        if status == DeployState.SOURCE_MISSING:
+            console.print(f"[red]✗ Failed to deploy {config.name}: {source_path} not found[/red]")
+            return None
+        
+        # Create parent directory if needed
+        with tracer.span("deploy.mkdir"):
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Create backup if file exists and is not just a link to our source
+        hardlinked = self.is_deployed_as("hardlink", source_path, dest_path)
+        linked = hardlinked or self.is_deployed_as("symlink", source_path, dest_path)
+        backup_path = None
+        if dest_path.exists() and not linked:
+            if not self.create_backup(config):
+                return None
+            backup_path = config.backup_path
+                
+        try:
+            if journal:
+                if dest_path.is_symlink():
+                    previous = {"symlink": os.readlink(dest_path)}
+                elif backup_path:
+                    previous = {"snapshot": str(backup_path)}
+                elif hardlinked:
+                    previous = {"hardlink": str(source_path)}
+                elif os.path.lexists(dest_path):
+                    raise OSError(f"{dest_path} appeared before it could be backed up")
+                else:
+                    previous = None
+                journal.prepare(config, dest_path, previous)
+            mode = self.install_file(source_path, dest_path, mode)
+            if mode == "copy":
+                config.bytes_written = dest_path.stat().st_size
+            self.state.record(config.name, source_sig, self.state.signature(dest_path, source_sig))
+            suffix = "" if mode == "copy" else f" ({mode})"
+            console.print(f"[green]✓[/green] Deployed {config.name}{suffix}")
+            return "deployed"
+        except Exception as e:
+            console.print(f"[red]✗ Failed to deploy {config.name}: {e}[/red]")
+            return None
+            
+    @traced("check", lambda self, config: {"config": config.name})
+    def check_requirements(self, config: ConfigItem) -> Tuple[bool, List[str]]:
+        """Check if required tools and packages are installed"""
+        missing = self.packages.missing(config.requires)
+        return len(missing) == 0, missing
+
+    @traced("save")
+    def close(self):
+        """Persist caches collected during this run"""
+        self.resolver.save()
+        self.state.save()
+        
+    @traced("restore", lambda self, config: {"config": config.name})
+    def restore_backup(self, config: ConfigItem) -> bool:
+        """Restore configuration from backup"""
+        if not config.backup_path or not config.backup_path.exists():
+            console.print(f"[yellow]No backup found for {config.name}[/yellow]")
+            return False
+            
+        try:
+            self.backups.restore_entry(self.backups.find_entry(config.backup_path, config.name))
+            console.print(f"[green]✓ Restored {config.name} from backup[/green]")
+            return True
+        except Exception as e:
+            console.print(f"[red]Failed to restore {config.name}: {e}[/red]")
+            return False
+
+    @traced("restore", lambda self, manifest_path: {"snapshot": manifest_path.name})
+    def restore_snapshot(self, manifest_path: Path) -> int:
+        """Restore every entry of a snapshot to its destination"""
+        restored = 0
+        for entry in self.backups.find_entries(manifest_path):
+            try:
+                self.backups.restore_entry(entry)
+                self.state.forget(entry["config"])
+                console.print(f"[green]✓ Restored {entry['config']}[/green]")
+                restored += 1
+            except Exception as e:
+                console.print(f"[red]Failed to restore {entry['config']}: {e}[/red]")
+        return restored
+        
+    def begin_batch(self) -> DeployJournal:
+        """Start a journaled deploy batch"""
+        return DeployJournal.begin(self.journal_dir)
+        
+    @traced("restore.rollback")
+    def rollback_batch(self, journal: DeployJournal) -> List[str]:
+        """Undo every replacement recorded in a batch journal"""
+        restored = journal.rollback(self.backups)
+        for name in restored:
+            self.state.forget(name)
+        return restored
+        
+    @traced("restore.recover")
+    def recover(self) -> int:
+        """Roll back batches interrupted by a crash, returning how many were found"""
+        journals = DeployJournal.pending(self.journal_dir)
+        for journal in journals:
+            try:
+                restored = self.rollback_batch(journal)
+                console.print(f"[yellow]Rolled back interrupted deploy {journal.path.stem} "
+                              f"({len(restored)} configs)[/yellow]")
+            except Exception as e:
+                console.print(f"[red]Failed to roll back interrupted deploy {journal.path.stem}: {e}[/red]")
+        return len(journals)
+
+class DeployResult:
+    """Outcome of deploying a single configuration"""
+    def __init__(self, config: ConfigItem, ok: bool, seconds: float,
+                 missing: List[str] = None, skipped: bool = False,
+                 backup_path: Optional[Path] = None, up_to_date: bool = False,
+                 blocked_by: List[str] = None):
+        self.config = config
+        self.ok = ok
+        self.seconds = seconds
+        self.missing = missing or []
+        self.skipped = skipped
+        self.up_to_date = up_to_date
+        self.blocked_by = blocked_by or []
+        self.rolled_back = False
+        self.bytes_written = config.bytes_written if ok else 0
+        self.backup_path = backup_path
+        
+    def record(self) -> dict:
+        """Machine-readable form for --format json/ndjson"""
+        return {"name": self.config.name, "category": self.config.category,
+                "status": result_status(self), "missing": self.missing,
+                "blocked_by": self.blocked_by,
+                "seconds": round(self.seconds, 6), "bytes": self.bytes_written,
+                "backup": str(self.backup_path) if self.backup_path else None}
+
+class DeployScheduler:
+    """Deploy independent configurations on a bounded thread pool
+
+    A batch runs in dependency waves (see DependencyGraph.layers): a wave
+    starts once the previous one has finished. Within a wave, configurations
+    that share a destination directory are chained on one worker and deployed
+    in their original order; everything else runs concurrently. Each batch
+    is journaled: if any deploy fails, the remaining ones are skipped and
+    everything already replaced is rolled back. Configs with missing
+    requirements are reported but do not abort the batch; configs deployed
+    after one that was not deployed are skipped too.
+    """
+
+    DEFAULT_JOBS = 8
+
+    def __init__(self, manager: ConfigManager, jobs: Optional[int] = None, force: bool = False):
+        self.manager = manager
+        self.jobs = max(1, jobs or self.DEFAULT_JOBS)
+        self.force = force
+
+    @staticmethod
+    def group_by_directory(configs: List[ConfigItem]) -> List[List[ConfigItem]]:
+        """Group configurations by destination directory, preserving order"""
+        groups: Dict[Path, List[ConfigItem]] = {}
+        for config in configs:
+            parent = Path(config.dest).expanduser().parent
+            groups.setdefault(parent, []).append(config)
+        return list(groups.values())
+
+    def deploy_one(self, config: ConfigItem, journal: Optional[DeployJournal] = None,
+                   abort: Optional[threading.Event] = None,
+                   not_deployed: Set[str] = frozenset()) -> DeployResult:
+        """Check requirements and deploy one configuration, timing both
+
+        Skips the configuration when one of its prerequisites is in
+        not_deployed.
+        """
+        if abort and abort.is_set():
+            return DeployResult(config, False, 0.0, skipped=True)
+        prerequisites = self.manager.dependencies.prerequisites.get(config.name, ())
+        blocked = [prerequisite.name for prerequisite in prerequisites if prerequisite.name in not_deployed]
+        if blocked:
+            console.print(f"[yellow]- Skipped {config.name}: prerequisite "
+                          f"{', '.join(blocked)} not deployed[/yellow]")
+            return DeployResult(config, False, 0.0, skipped=True, blocked_by=blocked)
+        start = time.perf_counter()
+        previous_backup = config.backup_path
+        ok, missing = self.manager.check_requirements(config)
+        if ok:
+            try:
+                outcome = self.manager.deploy_config(config, self.force, journal)
+            except Exception as e:
+                console.print(f"[red]✗ Failed to deploy {config.name}: {e}[/red]")
+                outcome = None
+            ok = outcome is not None
+            if not ok and abort:
+                abort.set()
+        else:
+            outcome = None
+        backup_path = config.backup_path if config.backup_path is not previous_backup else None
+        return DeployResult(config, ok, time.perf_counter() - start, missing, backup_path=backup_path,
+                            up_to_date=outcome == DeployState.UP_TO_DATE)
+
+    def _deploy_group(self, group: List[ConfigItem], results: Queue,
+                      journal: Optional[DeployJournal], abort: threading.Event, not_deployed: Set[str]):
+        for config in group:
+            results.put(self.deploy_one(config, journal, abort, not_deployed))
+
+    @traced("deploy.batch", lambda self, configs, *args, **kwargs: {"configs": len(configs), "jobs": self.jobs})
+    def run(self, configs: List[ConfigItem],
+            on_result: Optional[Callable[[DeployResult], None]] = None,
+            transactional: bool = True) -> List[DeployResult]:
+        """Deploy configs in dependency order, calling on_result from this thread as each one finishes"""
+        waves = [self.group_by_directory(layer) for layer in self.manager.dependencies.layers(configs)]
+        results: Queue = Queue()
+        finished: List[DeployResult] = []
+        if not waves:
+            return finished
+
+        # Imported here: concurrent.futures pulls in logging, which read-only
+        # commands have no use for.
+        from concurrent.futures import ThreadPoolExecutor
+        journal = self.manager.begin_batch() if transactional else None
+        abort = threading.Event()
+        # Read only by later waves: a config never shares a wave with its prerequisites
+        not_deployed: Set[str] = set()
+        with ThreadPoolExecutor(max_workers=min(self.jobs, max(map(len, waves)))) as pool:
+            for wave, groups in enumerate(waves):
+                with tracer.span("deploy.wave", wave=wave, groups=len(groups)):
+                    futures = [pool.submit(self._deploy_group, group, results, journal, abort, not_deployed)
+                               for group in groups]
+                    for _ in range(sum(map(len, groups))):
+                        result = results.get()
+                        finished.append(result)
+                        if not result.ok:
+                            not_deployed.add(result.config.name)
+                        if on_result:
+                            on_result(result)
+                    for future in futures:
+                        future.result()
+
+        if journal and abort.is_set():
+            restored = set(self.manager.rollback_batch(journal))
+            for result in finished:
+                if result.config.name in restored:
+                    result.ok = False
+                    result.rolled_back = True
+                    result.config.check_installed()
+            console.print(f"[yellow]↺ Deploy failed, rolled back {len(restored)} configurations[/yellow]")
+        elif journal:
+            journal.commit()
+        return finished
+
+class InotifyWatcher:
+    """Changed paths under a set of directories, from Linux inotify via ctypes
+
+    Directories are watched non-recursively; a subdirectory created under a
+    watched one is added as it appears. `wait` blocks in select() on the
+    inotify descriptor, so an idle watcher costs no CPU. When the kernel
+    queue overflows, every watched directory is reported as changed.
+    """
+
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    # Whole writes and renames, not every write(): editors save in many chunks
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux")
+
+    def __init__(self, directories: List[str]):
+        import ctypes
+        self._ctypes = ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            errno_value = ctypes.get_errno()
+            raise OSError(errno_value, f"inotify_init1: {os.strerror(errno_value)}")
+        self.watches: Dict[int, str] = {}
+        try:
+            for directory in directories:
+                self.add(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def add(self, directory: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            errno_value = self._ctypes.get_errno()
+            raise OSError(errno_value, f"inotify_add_watch: {os.strerror(errno_value)}", directory)
+        self.watches[wd] = directory
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """Paths changed since the last call, blocking up to timeout seconds (forever if None)"""
+        import select
+        import struct
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed: List[str] = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+            offset += 16 + length
+            if mask & self.IN_Q_OVERFLOW:
+                changed.extend(self.watches.values())
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & self.IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                try:
+                    self.add(path)
+                except OSError:
+                    pass
+            changed.append(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """Changed files among a fixed set, found by stat'ing them every interval seconds
+
+    The fallback where inotify is not available, e.g. on macOS. Each round
+    costs one stat per file and nothing else.
+    """
+
+    def __init__(self, paths: List[str], interval: float = 1.0):
+        self.interval = interval
+        self.signatures = {path: self.signature(path) for path in paths}
+
+    @staticmethod
+    def signature(path: str) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def wait(self, timeout: Optional[float] = None) -> List[str]:
+        """Files changed since the last call, checked once after at most interval seconds"""
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        changed = []
+        for path, previous in self.signatures.items():
+            current = self.signature(path)
+            if current != previous:
+                self.signatures[path] = current
+                changed.append(path)
+        return changed
+
+    def close(self):
+        pass
+
+class ConfigWatcher:
+    """Redeploy configurations whose sources change, for --watch
+
+    Changes come from an InotifyWatcher where inotify is available and a
+    PollingWatcher otherwise. Changed paths are mapped back to items through
+    the registry's source index. A burst of saves is collected until no
+    event has arrived for `debounce` seconds, or `max_delay` seconds after
+    the first, then the affected configs that are deployed on this machine
+    go out as one DeployScheduler batch. Editing hosts.json redeploys the
+    templates; editing the registry reloads it.
+    """
+
+    DEBOUNCE = 0.25
+    MAX_DELAY = 2.0
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, manager: ConfigManager, jobs: Optional[int] = None, polling: bool = False,
+                 debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY,
+                 poll_interval: float = POLL_INTERVAL):
+        self.manager = manager
+        self.scheduler = DeployScheduler(manager, jobs)
+        self.polling = polling or not InotifyWatcher.available()
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.pending: set = set()
+        self.first = self.last = 0.0
+        self.watcher = None
+        self.open()
+
+    def files(self) -> List[str]:
+        """Every registry source, present or not, plus the registry and hosts files"""
+        manager = self.manager
+        return sorted(set(manager.registry.by_source)
+                      | {os.path.abspath(manager.registry_file), os.path.abspath(manager.hosts_file)})
+
+    @staticmethod
+    def directories(files: List[str]) -> List[str]:
+        """The nearest existing directory of each file"""
+        found = set()
+        for path in files:
+            directory = os.path.dirname(path)
+            while not os.path.isdir(directory) and os.path.dirname(directory) != directory:
+                directory = os.path.dirname(directory)
+            found.add(directory)
+        return sorted(found)
+
+    def open(self):
+        """(Re)create the underlying watcher for the current registry"""
+        if self.watcher:
+            self.watcher.close()
+        files = self.files()
+        if not self.polling:
+            try:
+                self.watcher = InotifyWatcher(self.directories(files))
+                return
+            except (OSError, AttributeError):
+                # No inotify in this libc, or out of watches
+                self.polling = True
+        self.watcher = PollingWatcher(files, self.poll_interval)
+
+    def close(self):
+        self.watcher.close()
+
+    def step(self, timeout: Optional[float] = None) -> Optional[List[DeployResult]]:
+        """Wait for changes; once a burst has settled, deploy it and return the results"""
+        if self.pending:
+            due = max(0.0, min(self.last + self.debounce, self.first + self.max_delay) - time.monotonic())
+            timeout = due if timeout is None else min(timeout, due)
+        changed = self.watcher.wait(timeout)
+        now = time.monotonic()
+        if changed:
+            if not self.pending:
+                self.first = now
+            self.pending.update(changed)
+            self.last = now
+        if self.pending and now >= min(self.last + self.debounce, self.first + self.max_delay):
+            paths, self.pending = self.pending, set()
+            return self.flush(paths)
+        return None
+
+    def run(self, on_batch: Callable[[List[DeployResult]], None]):
+        """Watch until interrupted"""
+        while True:
+            results = self.step()
+            if results:
+                on_batch(results)
+
+    def reload(self) -> bool:
+        """Re-read the registry, keeping the previous one if the new file is invalid"""
+        manager = self.manager
+        previous = manager.registry
+        try:
+            manager.load_configurations()
+            manager.dependencies
+        except (OSError, KeyError, ValueError) as e:
+            manager.registry = previous
+            console.print(f"[red]✗ Keeping the previous registry, {manager.registry_file}: {e}[/red]")
+            return False
+        self.open()
+        console.print(f"[dim]Reloaded {manager.registry_file}[/dim]")
+        return True
+
+    @traced("watch.batch", lambda self, paths: {"paths": len(paths)})
+    def flush(self, paths: set) -> List[DeployResult]:
+        """Deploy the configs affected by a settled burst of changes"""
+        manager = self.manager
+        if os.path.abspath(manager.registry_file) in paths:
+            self.reload()
+        registry = manager.registry
+        affected: Dict[int, ConfigItem] = {}
+        if os.path.abspath(manager.hosts_file) in paths:
+            manager._hosts = None
+            affected.update((item.slot, item) for item in registry.by_name.values() if item.template)
+        by_source = registry.by_source
+        for path in paths:
+            items = by_source.get(path)
+            if items is None:
+                # A directory: a new subdirectory, or every watch after an overflow
+                prefix = path.rstrip(os.sep) + os.sep
+                items = [item for source, group in by_source.items()
+                         if source.startswith(prefix) for item in group]
+            affected.update((item.slot, item) for item in items)
+
+        configs = []
+        for _, item in sorted(affected.items()):
+            registry.forget(item)
+            if not registry.available(item):
+                continue
+            if item.check_installed():
+                configs.append(item)
+            else:
+                console.print(f"[dim]· {item.name} changed but is not deployed here[/dim]")
+        if not configs:
+            return []
+        results = self.scheduler.run(configs)
+        manager.state.save()
+        return results
+
+class SSHTransport:
+    """Run shell scripts on a remote host over one multiplexed SSH connection
+
+    The first command starts a ControlMaster that later commands reuse, so a
+    host costs one handshake however many round trips a deploy makes.
+    BatchMode keeps a host that wants a password from stalling the fan-out.
+    """
+    
+    def __init__(self, host: str, control_dir: Path, persist: int = 60):
+        self.host = host
+        self.options = ["-o", "BatchMode=yes", "-o", "ControlMaster=auto",
+                        "-o", f"ControlPath={control_dir}/%C", "-o", f"ControlPersist={persist}"]
         
-    def check_installed(self):
-        """Check if configuration is already installed"""
-        dest_path = Path(self.dest).expanduser()
-        self.installed = dest_path.exists()
-        return self.installed
+    def run(self, script: str, data: bytes = b"") -> subprocess.CompletedProcess:
+        return subprocess.run(["ssh", *self.options, self.host, f"sh -c {shlex.quote(script)}"],
+                              input=data, capture_output=True)
+        
+    def close(self):
+        """Shut down the master connection"""
+        subprocess.run(["ssh", *self.options, "-O", "exit", self.host], capture_output=True)
 
-class ConfigManager:
-    """Main configuration manager"""
+class LocalTransport:
+    """Stand-in target that runs the same scripts locally with HOME set to a directory"""
     
-    def __init__(self, base_path: str = "."):
-        self.base_path = Path(base_path)
-        self.configs_dir = self.base_path / "configs"
-        self.backup_dir = self.base_path / ".config-backups"
-        self.configs: Dict[str, List[ConfigItem]] = {}
-        self.load_configurations()
+    def __init__(self, home: Path):
+        self.host = f"local:{home}"
+        self.env = {**os.environ, "HOME": str(home)}
+        home.mkdir(parents=True, exist_ok=True)
         
-    def load_configurations(self):
-        """Load all available configurations"""
-        # Define all configurations with their mappings
-        config_definitions = {
-            "shell": [
-                ConfigItem("Starship Prompt", "shell/starship.toml", "~/.config/starship.toml", 
-                          "shell", "Fast, customizable prompt for any shell", ["starship"]),
-                ConfigItem("Bash Configuration", "shell/bashrc", "~/.bashrc", 
-                          "shell", "Bash shell configuration with aliases and functions", ["bash"]),
-                ConfigItem("Bash Profile", "shell/bash_profile", "~/.bash_profile", 
-                          "shell", "Bash login shell configuration", ["bash"]),
-                ConfigItem("Fish Shell", "shell/config.fish", "~/.config/fish/config.fish", 
-                          "shell", "User-friendly shell with autosuggestions", ["fish"]),
-                ConfigItem("Zsh Configuration", "shell/zshrc", "~/.zshrc", 
-                          "shell", "Z shell configuration with oh-my-zsh", ["zsh"]),
-            ],
-            "terminal": [
-                ConfigItem("Alacritty", "terminal/alacritty.yml", "~/.config/alacritty/alacritty.yml", 
-                          "terminal", "GPU-accelerated terminal emulator", ["alacritty"]),
-                ConfigItem("Kitty", "terminal/kitty.conf", "~/.config/kitty/kitty.conf", 
-                          "terminal", "Feature-rich GPU terminal", ["kitty"]),
-                ConfigItem("WezTerm", "terminal/wezterm.lua", "~/.config/wezterm/wezterm.lua", 
-                          "terminal", "GPU-accelerated cross-platform terminal", ["wezterm"]),
-                ConfigItem("tmux", "terminal/tmux.conf", "~/.tmux.conf", 
-                          "terminal", "Terminal multiplexer configuration", ["tmux"]),
-                ConfigItem("Warp", "terminal/warp-preferences.yaml", "~/.warp/preferences.yaml", 
-                          "terminal", "Modern terminal with AI features", ["warp"]),
-            ],
-            "editors": [
-                ConfigItem("Neovim", "editors/init.lua", "~/.config/nvim/init.lua", 
-                          "editors", "Modern Neovim config with LSP and plugins", ["neovim"]),
-                ConfigItem("Vim", "editors/vimrc", "~/.vimrc", 
-                          "editors", "Classic Vim configuration", ["vim"]),
-                ConfigItem("VS Code Settings", "editors/vscode-settings.json", 
-                          "~/Library/Application Support/Code/User/settings.json", 
-                          "editors", "Visual Studio Code settings", ["code"]),
-                ConfigItem("VS Code Keybindings", "editors/vscode-keybindings.json", 
-                          "~/Library/Application Support/Code/User/keybindings.json", 
-                          "editors", "VS Code keyboard shortcuts", ["code"]),
-                ConfigItem("Helix", "editors/helix-config.toml", "~/.config/helix/config.toml", 
-                          "editors", "Post-modern modal text editor", ["helix"]),
-            ],
-            "dev-tools": [
-                ConfigItem("Git", "git/gitconfig", "~/.gitconfig", 
-                          "dev-tools", "Git version control configuration", ["git"]),
-                ConfigItem("Git Ignore", "git/gitignore_global", "~/.gitignore_global", 
-                          "dev-tools", "Global Git ignore patterns", ["git"]),
-                ConfigItem("Git Message", "git/gitmessage", "~/.gitmessage", 
-                          "dev-tools", "Git commit message template", ["git"]),
-                ConfigItem("Lazygit", "dev-tools/lazygit.yml", "~/.config/lazygit/config.yml", 
-                          "dev-tools", "Terminal UI for git", ["lazygit"]),
-                ConfigItem("GitHub CLI", "dev-tools/gh-config.yml", "~/.config/gh/config.yml", 
-                          "dev-tools", "GitHub command line tool config", ["gh"]),
-                ConfigItem("Direnv", "dev-tools/direnvrc", "~/.config/direnv/direnvrc", 
-                          "dev-tools", "Directory-based environments", ["direnv"]),
-            ],
-            "languages": [
-                ConfigItem("Rust/Cargo", "languages/cargo-config.toml", "~/.cargo/config.toml", 
-                          "languages", "Rust package manager configuration", ["rust"]),
-                ConfigItem("NPM", "languages/npmrc", "~/.npmrc", 
-                          "languages", "Node.js package manager config", ["node"]),
-                ConfigItem("Python pip", "languages/pip.conf", "~/.pip/pip.conf", 
-                          "languages", "Python package installer config", ["python3"]),
-                ConfigItem("Poetry", "languages/poetry-config.toml", "~/.config/pypoetry/config.toml", 
-                          "languages", "Python dependency management", ["poetry"]),
-            ],
-            "database": [
-                ConfigItem("PostgreSQL", "database/psqlrc", "~/.psqlrc", 
-                          "database", "PostgreSQL client configuration", ["postgresql"]),
-                ConfigItem("MySQL", "database/my.cnf", "~/.my.cnf", 
-                          "database", "MySQL client configuration", ["mysql"]),
-                ConfigItem("pgcli", "database/pgcli-config", "~/.config/pgcli/config", 
-                          "database", "PostgreSQL CLI with auto-completion", ["pgcli"]),
-            ],
-            "cloud": [
-                ConfigItem("AWS CLI", "cloud/aws-config", "~/.aws/config", 
-                          "cloud", "Amazon Web Services CLI config", ["awscli"]),
-                ConfigItem("Kubernetes", "cloud/kube-config", "~/.kube/config", 
-                          "cloud", "Kubernetes cluster configuration", ["kubectl"]),
-                ConfigItem("Terraform", "cloud/terraformrc", "~/.terraformrc", 
-                          "cloud", "Infrastructure as Code tool config", ["terraform"]),
-            ],
-            "monitoring": [
-                ConfigItem("htop", "monitoring/htoprc", "~/.config/htop/htoprc", 
-                          "monitoring", "Interactive process viewer", ["htop"]),
-                ConfigItem("bat", "monitoring/bat-config", "~/.config/bat/config", 
-                          "monitoring", "Cat clone with syntax highlighting", ["bat"]),
-                ConfigItem("ripgrep", "monitoring/ripgreprc", "~/.ripgreprc", 
-                          "monitoring", "Fast recursive grep", ["ripgrep"]),
-                ConfigItem("fd", "monitoring/fdignore", "~/.fdignore", 
-                          "monitoring", "Fast find alternative", ["fd"]),
-            ],
-            "system": [
-                ConfigItem("Karabiner", "system/karabiner.json", "~/.config/karabiner/karabiner.json", 
-                          "system", "Keyboard customization tool", ["karabiner-elements"]),
-                ConfigItem("yabai", "system/yabairc", "~/.config/yabai/yabairc", 
-                          "system", "Tiling window manager", ["yabai"]),
-                ConfigItem("skhd", "system/skhdrc", "~/.config/skhd/skhdrc", 
-                          "system", "Simple hotkey daemon", ["skhd"]),
-                ConfigItem("AeroSpace", "system/aerospace.toml", "~/.config/aerospace/aerospace.toml", 
-                          "system", "i3-like tiling window manager", ["aerospace"]),
-            ],
-            "security": [
-                ConfigItem("SSH", "security/ssh_config", "~/.ssh/config", 
-                          "security", "SSH client configuration", ["openssh"]),
-                ConfigItem("GnuPG", "security/gpg.conf", "~/.gnupg/gpg.conf", 
-                          "security", "GNU Privacy Guard configuration", ["gnupg"]),
-            ]
-        }
+    def run(self, script: str, data: bytes = b"") -> subprocess.CompletedProcess:
+        return subprocess.run(["sh", "-c", script], input=data, capture_output=True, env=self.env)
         
-        # Load configurations into the manager
-        for category, items in config_definitions.items():
-            self.configs[category] = []
-            for item in items:
-                # Check if source file exists
-                source_path = self.configs_dir / item.source
-                if source_path.exists():
-                    item.check_installed()
-                    self.configs[category].append(item)
-                    
-    def create_backup(self, config: ConfigItem) -> bool:
-        """Create backup of existing configuration"""
-        dest_path = Path(config.dest).expanduser()
-        if not dest_path.exists():
-            return True
-            
-        # Create backup directory
-        self.backup_dir.mkdir(parents=True, exist_ok=True)
+    def close(self):
+        pass
+
+class HostResult:
+    """Outcome of checking or deploying a selection on one host"""
+    def __init__(self, host: str):
+        self.host = host
+        self.ready: List[ConfigItem] = []
+        self.missing: Dict[str, List[str]] = {}
+        self.failed: Dict[str, str] = {}
+        self.deployed = False
+        self.bytes_written = 0
+        self.backup_path: Optional[str] = None
+        self.error: Optional[str] = None
+        self.seconds = 0.0
         
-        # Generate backup filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{dest_path.name}.{timestamp}.bak"
-        backup_path = self.backup_dir / backup_name
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.failed
         
-        try:
-            shutil.copy2(dest_path, backup_path)
-            config.backup_path = backup_path
-            return True
-        except Exception as e:
-            console.print(f"[red]Failed to backup {dest_path}: {e}[/red]")
-            return False
-            
-    def deploy_config(self, config: ConfigItem) -> bool:
-        """Deploy a configuration file"""
-        source_path = self.configs_dir / config.source
-        dest_path = Path(config.dest).expanduser()
+    def records(self, configs: List[ConfigItem]) -> List[dict]:
+        """One record per configuration for --format json/ndjson"""
+        ready = {config.name for config in self.ready}
+        records = []
+        for config in configs:
+            record = {"host": self.host, "name": config.name, "category": config.category,
+                      "missing": self.missing.get(config.name, [])}
+            if self.error:
+                record.update(status="failed", error=self.error)
+            elif config.name in self.failed:
+                record.update(status="failed", error=self.failed[config.name])
+            elif record["missing"]:
+                record["status"] = "missing requirements"
+            elif config.name in ready:
+                record["status"] = "deployed" if self.deployed else "ready"
+                if self.deployed:
+                    record["backup"] = self.backup_path
+            records.append(record)
+        return records
+
+class FanOutDeployer:
+    """Check or deploy one selection of configurations on many hosts at once
+
+    Hosts are handled concurrently, at most `jobs` at a time. Each host takes
+    two round trips over its transport: one script probes every requirement
+    of the selection, then the configurations whose requirements are met go
+    over as a single tar stream, with templates rendered for that host. The
+    remote side backs up the files about to be replaced into one tar under
+    ~/.config-backups/remote before unpacking. Destinations must live under ~.
+    """
+    
+    DEFAULT_JOBS = 8
+    BACKUP_DIR = ".config-backups/remote"
+    
+    def __init__(self, manager: ConfigManager, hosts: List[str], jobs: Optional[int] = None):
+        self.manager = manager
+        self.hosts = hosts
+        self.jobs = max(1, jobs or self.DEFAULT_JOBS)
         
-        # Create parent directory if needed
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
+    @staticmethod
+    def transport(spec: str, control_dir: Path):
+        """local:DIR targets a directory as $HOME, anything else is an SSH destination"""
+        if spec.startswith("local:"):
+            return LocalTransport(Path(spec[len("local:"):]).expanduser())
+        return SSHTransport(spec, control_dir)
         
-        # Create backup if file exists
-        if dest_path.exists():
-            if not self.create_backup(config):
-                return False
-                
+    @staticmethod
+    def home_path(config: ConfigItem) -> Optional[str]:
+        """Destination relative to the remote home directory"""
+        return config.dest[2:] if config.dest.startswith("~/") else None
+        
+    @traced("fanout.probe", lambda self, transport, tools, apps=(): {"host": transport.host, "tools": len(tools)})
+    def probe(self, transport, tools: List[str], apps: List[str] = ()) -> set:
+        """Which of tools are on the host's PATH and which app bundles it has, in one round trip"""
+        if not tools and not apps:
+            return set()
+        script = (f"for t in {' '.join(shlex.quote(tool) for tool in tools)}; do "
+                  f'command -v "$t" >/dev/null 2>&1 && echo "$t"; done; '
+                  f"for a in {' '.join(shlex.quote(app) for app in apps)}; do "
+                  f'if [ -d "/Applications/$a" ] || [ -d "$HOME/Applications/$a" ]; then echo "$a"; fi; '
+                  f"done; exit 0")
+        proc = transport.run(script)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.decode(errors="replace").strip() or f"exit {proc.returncode}")
+        return set(proc.stdout.decode().splitlines())
+        
+    def archive(self, files: List[Tuple[ConfigItem, Path]]) -> bytes:
+        """Tar of each config's (possibly rendered) source, laid out relative to ~"""
+        import tarfile
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for config, source_path in files:
+                data = source_path.read_bytes()
+                info = tarfile.TarInfo(self.home_path(config))
+                info.size = len(data)
+                info.mode = source_path.stat().st_mode & 0o777
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(data))
+        return buffer.getvalue()
+        
+    def deploy_script(self, configs: List[ConfigItem]) -> str:
+        """Back up the files about to be replaced, then unpack stdin into ~"""
+        paths = " ".join(shlex.quote(self.home_path(config)) for config in configs)
+        backup = shlex.quote(f"{self.BACKUP_DIR}/{datetime.now():%Y%m%d_%H%M%S}-{uuid.uuid4().hex[:8]}.tar")
+        return (
+            'cd "$HOME" || exit 1\n'
+            "set --\n"
+            f'for f in {paths}; do if [ -e "$f" ] || [ -L "$f" ]; then set -- "$@" "$f"; fi; done\n'
+            'if [ "$#" -gt 0 ]; then\n'
+            f"  mkdir -p {shlex.quote(self.BACKUP_DIR)} && tar -cf {backup} \"$@\" || exit 1\n"
+            f"  echo {backup}\n"
+            "fi\n"
+            "tar -xf - || exit 1\n"
+        )
+        
+    @traced("fanout.host", lambda self, spec, *args, **kwargs: {"host": spec})
+    def run_host(self, spec: str, configs: List[ConfigItem], control_dir: Path,
+                 deploy: bool = True) -> HostResult:
+        """Check, and unless deploy is False install, the selection on one host"""
+        result = HostResult(spec)
+        start = time.perf_counter()
+        transport = None
         try:
-            shutil.copy2(source_path, dest_path)
-            console.print(f"[green]✓[/green] Deployed {config.name}")
-            return True
-        except Exception as e:
-            console.print(f"[red]✗ Failed to deploy {config.name}: {e}[/red]")
-            return False
-            
-    def check_requirements(self, config: ConfigItem) -> Tuple[bool, List[str]]:
-        """Check if required tools are installed"""
-        missing = []
-        for req in config.requires:
-            # Check if command exists
-            result = subprocess.run(['which', req], capture_output=True, text=True)
-            if result.returncode != 0:
-                missing.append(req)
-        return len(missing) == 0, missing
+            transport = self.transport(spec, control_dir)
+            packages = self.manager.packages
+            requirements = {tool for config in configs for tool in config.requires}
+            found = self.probe(transport,
+                               sorted({command for tool in requirements for command in packages.commands(tool)}),
+                               sorted({app for tool in requirements for app in packages.apps(tool)}))
+            sources = {}
+            for config in configs:
+                missing = [tool for tool in config.requires
+                           if found.isdisjoint(packages.commands(tool) + packages.apps(tool))]
+                if missing:
+                    result.missing[config.name] = missing
+                elif self.home_path(config) is None:
+                    result.failed[config.name] = f"destination {config.dest} is outside ~"
+                else:
+                    try:
+                        sources[config.name] = self.manager.source_path(config, spec)
+                    except TemplateError as e:
+                        result.failed[config.name] = f"template: {e}"
+                        continue
+                    result.ready.append(config)
+            if deploy and result.ready:
+                data = self.archive([(config, sources[config.name]) for config in result.ready])
+                with tracer.span("fanout.transfer", host=spec, bytes=len(data)):
+                    proc = transport.run(self.deploy_script(result.ready), data)
+                if proc.returncode != 0:
+                    raise RuntimeError(proc.stderr.decode(errors="replace").strip() or f"exit {proc.returncode}")
+                result.deployed = True
+                result.bytes_written = len(data)
+                result.backup_path = proc.stdout.decode().strip() or None
+        except (OSError, RuntimeError) as e:
+            result.error = str(e)
+        finally:
+            if transport:
+                transport.close()
+            result.seconds = time.perf_counter() - start
+        return result
         
-    def restore_backup(self, config: ConfigItem) -> bool:
-        """Restore configuration from backup"""
-        if not config.backup_path or not config.backup_path.exists():
-            console.print(f"[yellow]No backup found for {config.name}[/yellow]")
-            return False
-            
-        dest_path = Path(config.dest).expanduser()
+    def run(self, configs: List[ConfigItem], on_result: Optional[Callable[[HostResult], None]] = None,
+            deploy: bool = True) -> List[HostResult]:
+        """Fan out over every host, calling on_result as each host finishes"""
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        # Short path: ControlPath sockets have a ~100 byte limit
+        control_dir = Path(tempfile.mkdtemp(prefix="cm-", dir="/tmp"))
+        results = []
         try:
-            shutil.copy2(config.backup_path, dest_path)
-            console.print(f"[green]✓ Restored {config.name} from backup[/green]")
-            return True
-        except Exception as e:
-            console.print(f"[red]Failed to restore {config.name}: {e}[/red]")
-            return False
+            with ThreadPoolExecutor(max_workers=min(self.jobs, len(self.hosts) or 1)) as pool:
+                futures = [pool.submit(self.run_host, host, configs, control_dir, deploy)
+                           for host in self.hosts]
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+        finally:
+            shutil.rmtree(control_dir, ignore_errors=True)
+        return results
+
+def result_status(result: DeployResult) -> str:
+    """One-word outcome of a deploy"""
+    if result.ok:
+        return DeployState.UP_TO_DATE if result.up_to_date else "deployed"
+    if result.rolled_back:
+        return "rolled back"
+    if result.skipped:
+        return "skipped"
+    if result.missing:
+        return "missing requirements"
+    return "failed"
+
+@traced("output")
+def print_timings(results: List[DeployResult]):
+    """Print per-configuration deploy times, slowest first"""
+    if not results:
+        return
+    if isinstance(console, PlainConsole):
+        for result in sorted(results, key=lambda r: r.seconds, reverse=True):
+            console.print(f"{result.seconds * 1000:8.1f} ms  {result_status(result):<20} {result.config.name}")
+        return
+    table = Table(title="Deploy Timings", box=box.ROUNDED)
+    table.add_column("Configuration", style="bold")
+    table.add_column("Status", justify="center")
+    table.add_column("Time", justify="right")
+    styles = {"deployed": "green", DeployState.UP_TO_DATE: "dim", "rolled back": "yellow",
+              "skipped": "dim", "missing requirements": "yellow", "failed": "red"}
+    for result in sorted(results, key=lambda r: r.seconds, reverse=True):
+        status = result_status(result)
+        table.add_row(result.config.name, f"[{styles[status]}]{status.capitalize()}[/{styles[status]}]",
+                      f"{result.seconds * 1000:.1f} ms")
+    console.print(table)
+
+class KeyReader:
+    """Read single keypresses from the terminal
+
+    On a TTY the terminal is put in cbreak mode so keys arrive without Enter
+    and arrow/page keys are decoded from their escape sequences. Without a TTY
+    whole lines are read instead, so scripted input still works.
+    """
+    
+    ESCAPES = {
+        "[A": "up", "[B": "down", "[C": "right", "[D": "left",
+        "[5~": "pageup", "[6~": "pagedown", "[H": "home", "[F": "end",
+        "OA": "up", "OB": "down", "OC": "right", "OD": "left", "OH": "home", "OF": "end",
+    }
+    NAMES = {"\r": "enter", "\n": "enter", " ": "space", "\x7f": "backspace", "\x08": "backspace",
+             "\t": "tab", "\x03": "ctrl-c"}
+    
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self.fd = self.stream.fileno() if self.stream.isatty() else None
+        self._saved = None
+        
+    def __enter__(self) -> "KeyReader":
+        self.raw()
+        return self
+        
+    def __exit__(self, *exc):
+        self.restore()
+        
+    def raw(self):
+        """Switch the terminal to cbreak mode"""
+        if self.fd is not None and self._saved is None:
+            import termios
+            import tty
+            self._saved = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+            
+    def restore(self):
+        """Give the terminal back its previous mode, e.g. before a Prompt"""
+        if self._saved is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self._saved)
+            self._saved = None
+            
+    def _pending(self, timeout: float = 0.02) -> bool:
+        import select
+        return bool(select.select([self.fd], [], [], timeout)[0])
+            
+    def read(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Return the next key as a character or a name such as 'up' or 'enter'
+
+        With a timeout, None is returned if no key arrives in time.
+        """
+        if timeout is not None:
+            import select
+            if not select.select([self.stream if self.fd is None else self.fd], [], [], timeout)[0]:
+                return None
+        if self.fd is None:
+            line = self.stream.readline()
+            if not line:
+                return "q"
+            line = line.rstrip("\n")
+            return {"": "enter", " ": "space"}.get(line, line.strip().lower())
+            
+        char = os.read(self.fd, 1).decode(errors="ignore")
+        if char == "\x1b":
+            sequence = ""
+            while self._pending() and len(sequence) < 4:
+                sequence += os.read(self.fd, 1).decode(errors="ignore")
+                if sequence in self.ESCAPES:
+                    return self.ESCAPES[sequence]
+            return "esc" if not sequence else sequence
+        if char == "\x03":
+            raise KeyboardInterrupt
+        return self.NAMES.get(char, char)
+
+class DiffScreen:
+    """Full-window screen that rewrites only the lines that changed
+
+    Each frame is rendered to lines in memory and compared with the frame
+    already on the terminal; only the lines that differ are written, each
+    after a cursor move, so moving the cursor in a table sends two rows
+    instead of the whole window. A resize, or coming back from a suspended
+    dialog, repaints everything.
+    """
+    
+    def __init__(self, console):
+        self.console = console
+        self.lines: List[List["Segment"]] = []
+        self.size = None
+        self.lines_written = 0
+        
+    def __enter__(self) -> "DiffScreen":
+        self.start()
+        return self
+        
+    def __exit__(self, *exc):
+        self.stop()
+        
+    def start(self):
+        """Switch to the alternate screen; the next frame is drawn in full"""
+        self.console.set_alt_screen(True)
+        self.console.show_cursor(False)
+        self.size = None
+        
+    def stop(self):
+        self.console.show_cursor(True)
+        self.console.set_alt_screen(False)
+        
+    def update(self, renderable):
+        """Draw a frame, writing the lines that differ from the previous one"""
+        size = self.console.size
+        lines = self.console.render_lines(renderable, self.console.options.update_dimensions(*size), pad=True)
+        previous = self.lines if size == self.size else []
+        with self.console:
+            if not previous:
+                self.console.control(Control.clear(), Control.home())
+            for y, line in enumerate(lines):
+                if y < len(previous) and previous[y] == line:
+                    continue
+                self.console.control(Control.move_to(0, y))
+                self.console.print(Segments(line), end="")
+                self.lines_written += 1
+        self.lines = lines
+        self.size = size
 
 class ConfigUI:
-    """Terminal UI for configuration management"""
+    """Terminal UI for configuration management
+
+    The screen is a DiffScreen that is only redrawn after a key changes
+    something, and then only where the frame changed. Keys are read one at
+    a time without Enter. Category views render only the rows that fit on
+    screen. Install states come from a background scan: the first screen is
+    drawn straight away and redrawn as results arrive until the scan
+    finishes.
+    """
     
-    def __init__(self, manager: ConfigManager):
+    POLL_INTERVAL = 0.1
+    HEADER_HEIGHT = 4
+    FOOTER_HEIGHT = 3
+    DETAILS_HEIGHT = 5
+    TABLE_CHROME = 5
+    
+    def __init__(self, manager: ConfigManager, jobs: Optional[int] = None, force: bool = False):
         self.manager = manager
+        self.scheduler = DeployScheduler(manager, jobs, force)
         self.current_category = 0
         self.current_item = 0
+        self.scroll_offset = 0
         self.categories = list(self.manager.configs.keys())
+        self.message = ""
+        self.screen: Optional[DiffScreen] = None
+        self.keys: Optional[KeyReader] = None
+        self.scan: Optional[StatusScan] = None
         
-    def display_menu(self):
-        """Display the main menu"""
-        while True:
-            console.clear()
-            self.show_header()
-            
-            # Create menu table
-            table = Table(title="Configuration Categories", box=box.ROUNDED)
-            table.add_column("", style="cyan", width=3)
-            table.add_column("Category", style="bold")
-            table.add_column("Configs", justify="center")
-            table.add_column("Installed", justify="center", style="green")
-            
-            for i, category in enumerate(self.categories):
-                items = self.manager.configs[category]
-                total = len(items)
-                installed = sum(1 for item in items if item.installed)
+    def run(self):
+        """Run the TUI until the user quits"""
+        self.scan = self.manager.scan_status(self.manager.all_configs(), background=True)
+        try:
+            with KeyReader() as self.keys, DiffScreen(console) as self.screen:
+                self.display_menu()
+        finally:
+            if self.scan:
+                self.scan.cancel()
                 
-                marker = "▶" if i == self.current_category else " "
-                table.add_row(
-                    marker,
-                    category.replace("-", " ").title(),
-                    str(total),
-                    f"{installed}/{total}"
-                )
+    def next_key(self) -> Optional[str]:
+        """Next key, or None when the screen should be redrawn with new statuses"""
+        if self.scan is None:
+            return self.keys.read()
+        if self.scan.running:
+            return self.keys.read(self.POLL_INTERVAL)
+        # One last redraw with the final statuses, then block on keys again
+        self.scan = None
+        return None
                 
-            console.print(table)
-            console.print("\n[bold]Navigation:[/bold] ↑/k Up | ↓/j Down | →/Enter Select | q Quit")
-            console.print("[bold]Actions:[/bold] a Select All | n Select None | d Deploy Selected | b Backup/Restore")
+    @contextmanager
+    def suspended(self):
+        """Leave the full-window screen and raw keys for prompt-driven dialogs"""
+        self.screen.stop()
+        self.keys.restore()
+        try:
+            yield
+        finally:
+            self.keys.raw()
+            self.screen.start()
+            
+    @traced("ui.render")
+    def redraw(self, renderable):
+        self.screen.update(renderable)
+        
+    def layout(self, body, footer: str) -> Layout:
+        """Header, body and footer filling the terminal"""
+        layout = Layout()
+        message = f"\n{self.message}" if self.message else ""
+        layout.split_column(
+            Layout(self.header(), name="header", size=self.HEADER_HEIGHT),
+            Layout(body, name="body"),
+            Layout(Text.from_markup(footer + message), name="footer", size=self.FOOTER_HEIGHT),
+        )
+        return layout
+        
+    def header(self) -> Panel:
+        return Panel(
+            "[bold cyan]Mac Setup Configuration Manager[/bold cyan]\n"
+            "[dim]Select and deploy development environment configurations[/dim]",
+            box=box.DOUBLE,
+            expand=False
+        )
+        
+    def render_menu(self) -> Layout:
+        """Main menu: one row per category"""
+        table = Table(title="Configuration Categories", box=box.ROUNDED)
+        table.add_column("", style="cyan", width=3)
+        table.add_column("Category", style="bold")
+        table.add_column("Configs", justify="center")
+        table.add_column("Installed", justify="center", style="green")
+        
+        for i, category in enumerate(self.categories):
+            items = self.manager.configs[category]
+            total = len(items)
+            states = [item.installed_state for item in items]
+            installed = f"{states.count(True)}/{total}"
+            if None in states:
+                installed += " [dim]…[/dim]"
             
-            key = Prompt.ask("\nCommand", default="", show_default=False)
+            marker = "▶" if i == self.current_category else " "
+            table.add_row(
+                marker,
+                category.replace("-", " ").title(),
+                str(total),
+                installed
+            )
+            
+        return self.layout(table,
+            "[bold]Navigation:[/bold] ↑/k Up | ↓/j Down | →/Enter Select | q Quit\n"
+            "[bold]Actions:[/bold] a Select All | n Select None | d Deploy Selected | b Backup/Restore | / Search")
+        
+    def display_menu(self):
+        """Display the main menu"""
+        while True:
+            self.redraw(self.render_menu())
+            key = self.next_key()
+            if key is None:
+                continue
+            self.message = ""
             
-            if key.lower() in ['q', 'quit', 'exit']:
+            if key in ['q', 'esc', 'quit', 'exit']:
                 break
-            elif key.lower() in ['j', 'down']:
+            elif key in ['j', 'down']:
                 self.current_category = (self.current_category + 1) % len(self.categories)
-            elif key.lower() in ['k', 'up']:
+            elif key in ['k', 'up']:
                 self.current_category = (self.current_category - 1) % len(self.categories)
-            elif key.lower() in ['', 'enter', 'right', 'l']:
+            elif key in ['enter', 'right', 'l']:
                 self.show_category_configs()
-            elif key.lower() == 'a':
+            elif key == 'a':
                 self.select_all_configs()
-            elif key.lower() == 'n':
+            elif key == 'n':
                 self.deselect_all_configs()
-            elif key.lower() == 'd':
-                self.deploy_selected_configs()
-            elif key.lower() == 'b':
-                self.show_backup_menu()
+            elif key == 'd':
+                with self.suspended():
+                    self.deploy_selected_configs()
+            elif key == 'b':
+                with self.suspended():
+                    self.show_backup_menu()
+            elif key == '/':
+                self.show_search()
                 
     def show_header(self):
         """Display header"""
-        header = Panel(
-            "[bold cyan]Mac Setup Configuration Manager[/bold cyan]\n"
-            "[dim]Select and deploy development environment configurations[/dim]",
-            box=box.DOUBLE,
-            expand=False
-        )
-        console.print(header)
+        console.print(self.header())
         console.print()
         
+    def visible_rows(self) -> int:
+        """How many table rows fit between the header, details panel and footer"""
+        height = console.size.height - self.HEADER_HEIGHT - self.FOOTER_HEIGHT
+        return max(1, height - self.DETAILS_HEIGHT - self.TABLE_CHROME)
+        
+    def row_cells(self, config: ConfigItem, is_current: bool) -> Tuple[str, ...]:
+        """Cells for one config row"""
+        installed = config.installed_state
+        return (
+            "▶" if is_current else " ",
+            "☑" if config.selected else "☐",
+            config.name,
+            "[dim]checking…[/dim]" if installed is None else
+            "[green]Installed[/green]" if installed else "[dim]Not installed[/dim]",
+            config.description,
+        )
+        
+    def render_category(self, category: str, configs: List[ConfigItem],
+                        title: Optional[str] = None, footer: Optional[str] = None) -> Layout:
+        """Category view showing only the window of rows around the cursor"""
+        window = self.visible_rows()
+        if self.current_item < self.scroll_offset:
+            self.scroll_offset = self.current_item
+        elif self.current_item >= self.scroll_offset + window:
+            self.scroll_offset = self.current_item - window + 1
+        start = self.scroll_offset
+        end = min(len(configs), start + window)
+        
+        title = title or f"[bold]{category.replace('-', ' ').title()} Configurations[/bold]"
+        if len(configs) > window:
+            title += f" [dim]({start + 1}-{end} of {len(configs)})[/dim]"
+        table = Table(title=title, box=box.ROUNDED, expand=True)
+        table.add_column("", width=3)
+        table.add_column("", width=3)
+        table.add_column("Configuration", style="bold", no_wrap=True)
+        table.add_column("Status", justify="center", no_wrap=True)
+        table.add_column("Description", no_wrap=True)
+        
+        for i in range(start, end):
+            table.add_row(*self.row_cells(configs[i], i == self.current_item))
+            
+        body = Layout()
+        if configs:
+            current_config = configs[self.current_item]
+            details = Panel(
+                f"[bold]Source:[/bold] {current_config.source}\n"
+                f"[bold]Destination:[/bold] {current_config.dest}\n"
+                f"[bold]Requires:[/bold] {', '.join(current_config.requires) if current_config.requires else 'None'}",
+                title=f"[cyan]{current_config.name}[/cyan]",
+                box=box.ROUNDED
+            )
+            body.split_column(Layout(table), Layout(details, size=self.DETAILS_HEIGHT))
+        else:
+            body.update(table)
+            
+        return self.layout(body, footer or
+            "[bold]Navigation:[/bold] ↑/k Up | ↓/j Down | PgUp/PgDn Page | Space Toggle | ← Back\n"
+            "[bold]Actions:[/bold] a Select All | n None | d Deploy | c Check Requirements | / Search")
+        
     def show_category_configs(self):
         """Show configurations in selected category"""
         category = self.categories[self.current_category]
         configs = self.manager.configs[category]
-        current_item = 0
+        self.current_item = 0
+        self.scroll_offset = 0
         
         while True:
-            console.clear()
-            self.show_header()
-            
-            # Category header
-            console.print(f"[bold]{category.replace('-', ' ').title()} Configurations[/bold]\n")
-            
-            # Configuration table
-            table = Table(box=box.ROUNDED)
-            table.add_column("", width=3)
-            table.add_column("", width=3)
-            table.add_column("Configuration", style="bold")
-            table.add_column("Status", justify="center")
-            table.add_column("Description")
-            
-            for i, config in enumerate(configs):
-                marker = "▶" if i == current_item else " "
-                selected = "☑" if config.selected else "☐"
-                status = "[green]Installed[/green]" if config.installed else "[dim]Not installed[/dim]"
-                
-                table.add_row(
-                    marker,
-                    selected,
-                    config.name,
-                    status,
-                    config.description
-                )
-                
-            console.print(table)
-            
-            # Show details for current item
-            if configs:
-                current_config = configs[current_item]
-                details = Panel(
-                    f"[bold]Source:[/bold] {current_config.source}\n"
-                    f"[bold]Destination:[/bold] {current_config.dest}\n"
-                    f"[bold]Requires:[/bold] {', '.join(current_config.requires) if current_config.requires else 'None'}",
-                    title=f"[cyan]{current_config.name}[/cyan]",
-                    box=box.ROUNDED
-                )
-                console.print("\n", details)
-            
-            console.print("\n[bold]Navigation:[/bold] ↑/k Up | ↓/j Down | Space Toggle | ← Back")
-            console.print("[bold]Actions:[/bold] a Select All | n None | d Deploy | c Check Requirements")
-            
-            key = Prompt.ask("\nCommand", default="", show_default=False)
+            self.redraw(self.render_category(category, configs))
+            key = self.next_key()
+            if key is None:
+                continue
+            self.message = ""
+            page = self.visible_rows()
             
-            if key.lower() in ['', 'left', 'back', 'h', 'q']:
+            if key in ['left', 'back', 'h', 'q', 'esc']:
                 break
-            elif key.lower() in ['j', 'down'] and configs:
-                current_item = (current_item + 1) % len(configs)
-            elif key.lower() in ['k', 'up'] and configs:
-                current_item = (current_item - 1) % len(configs)
-            elif key.lower() == ' ' and configs:
-                configs[current_item].selected = not configs[current_item].selected
-            elif key.lower() == 'a':
+            elif not configs:
+                continue
+            elif key in ['j', 'down']:
+                self.current_item = (self.current_item + 1) % len(configs)
+            elif key in ['k', 'up']:
+                self.current_item = (self.current_item - 1) % len(configs)
+            elif key == 'pagedown':
+                self.current_item = min(len(configs) - 1, self.current_item + page)
+            elif key == 'pageup':
+                self.current_item = max(0, self.current_item - page)
+            elif key in ['home', 'g']:
+                self.current_item = 0
+            elif key in ['end', 'G']:
+                self.current_item = len(configs) - 1
+            elif key == 'space':
+                configs[self.current_item].selected = not configs[self.current_item].selected
+            elif key == 'a':
                 for config in configs:
                     config.selected = True
-            elif key.lower() == 'n':
+            elif key == 'n':
                 for config in configs:
                     config.selected = False
-            elif key.lower() == 'd':
-                self.deploy_category_configs(category)
-            elif key.lower() == 'c' and configs:
-                self.check_config_requirements(configs[current_item])
+            elif key == 'd':
+                with self.suspended():
+                    self.deploy_category_configs(category)
+            elif key == 'c':
+                self.check_config_requirements(configs[self.current_item])
+            elif key == '/':
+                self.show_search()
                 
-    def check_config_requirements(self, config: ConfigItem):
-        """Check and display requirements for a configuration"""
-        console.print(f"\n[bold]Checking requirements for {config.name}...[/bold]")
+    def show_search(self):
+        """Filter all configurations as the query is typed"""
+        query = ""
+        results: List[ConfigItem] = []
+        position = (self.current_item, self.scroll_offset)
+        self.current_item = 0
+        self.scroll_offset = 0
         
+        while True:
+            title = f"[bold]Search:[/bold] {query}█"
+            if query and not results:
+                title += " [dim](no matches)[/dim]"
+            self.redraw(self.render_category("search", results, title,
+                "[bold]Search:[/bold] type to filter | ↑/↓ Move | Tab Toggle | Backspace Delete\n"
+                "[bold]Actions:[/bold] Enter/Esc Back to the previous view (selections are kept)"))
+            key = self.next_key()
+            if key is None:
+                continue
+            self.message = ""
+            
+            if key in ['esc', 'enter']:
+                break
+            elif key == 'up' and results:
+                self.current_item = (self.current_item - 1) % len(results)
+                continue
+            elif key == 'down' and results:
+                self.current_item = (self.current_item + 1) % len(results)
+                continue
+            elif key == 'tab' and results:
+                results[self.current_item].selected = not results[self.current_item].selected
+                continue
+            elif key == 'backspace':
+                query = query[:-1]
+            elif key == 'space':
+                query += " "
+            elif key not in KeyReader.NAMES.values() and key not in KeyReader.ESCAPES.values():
+                query += key
+            else:
+                continue
+                
+            results = self.manager.search(query, 200) if query.strip() else []
+            self.current_item = 0
+            self.scroll_offset = 0
+        self.current_item, self.scroll_offset = position
+            
+    def check_config_requirements(self, config: ConfigItem):
+        """Check requirements for a configuration and show them in the footer"""
         ok, missing = self.manager.check_requirements(config)
         
         if ok:
-            console.print("[green]✓ All requirements satisfied![/green]")
+            self.message = f"[green]✓ {config.name}: all requirements satisfied![/green]"
         else:
-            console.print("[red]✗ Missing requirements:[/red]")
-            for req in missing:
-                console.print(f"  - {req}")
-            console.print(f"\n[yellow]Install with: brew install {' '.join(missing)}[/yellow]")
-            
-        Prompt.ask("\nPress Enter to continue")
+            self.message = (f"[red]✗ {config.name} is missing: {', '.join(missing)}[/red]  "
+                            f"[yellow]Install with: {' && '.join(self.manager.packages.install_commands(missing))}[/yellow]")
         
     def select_all_configs(self):
         """Select all configurations"""
@@ -416,8 +3097,7 @@ class ConfigUI:
                 if not config.selected:
                     config.selected = True
                     count += 1
-        console.print(f"[green]Selected {count} configurations[/green]")
-        Prompt.ask("Press Enter to continue")
+        self.message = f"[green]Selected {count} configurations[/green]"
         
     def deselect_all_configs(self):
         """Deselect all configurations"""
@@ -427,9 +3107,16 @@ class ConfigUI:
                 if config.selected:
                     config.selected = False
                     count += 1
-        console.print(f"[yellow]Deselected {count} configurations[/yellow]")
-        Prompt.ask("Press Enter to continue")
+        self.message = f"[yellow]Deselected {count} configurations[/yellow]"
         
+    def print_plan(self, configs: List[ConfigItem], added: List[ConfigItem]):
+        """List what a deploy will touch, marking prerequisites that were pulled in"""
+        for config in configs:
+            status = "[yellow]Will overwrite[/yellow]" if config.installed else "[green]New[/green]"
+            if config in added:
+                status += ", [cyan]prerequisite[/cyan]"
+            console.print(f"  • {config.name} ({status})")
+            
     def deploy_selected_configs(self):
         """Deploy all selected configurations"""
         selected = []
@@ -440,11 +3127,10 @@ class ConfigUI:
             console.print("[yellow]No configurations selected![/yellow]")
             Prompt.ask("Press Enter to continue")
             return
+        selected, added = self.manager.with_prerequisites(selected)
             
         console.print(f"\n[bold]Ready to deploy {len(selected)} configurations:[/bold]")
-        for config in selected:
-            status = "[yellow]Will overwrite[/yellow]" if config.installed else "[green]New[/green]"
-            console.print(f"  • {config.name} ({status})")
+        self.print_plan(selected, added)
             
         if not Confirm.ask("\nProceed with deployment?"):
             return
@@ -452,35 +3138,32 @@ class ConfigUI:
         # Deploy with progress
         console.print("\n[bold]Deploying configurations...[/bold]\n")
         
-        success = 0
-        failed = 0
-        
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed}/{task.total}"),
             transient=True
         ) as progress:
             task = progress.add_task("Deploying...", total=len(selected))
             
-            for config in selected:
-                progress.update(task, description=f"Deploying {config.name}...")
-                
-                # Check requirements first
-                ok, missing = self.manager.check_requirements(config)
-                if not ok:
-                    console.print(f"[red]✗ {config.name} - missing requirements: {', '.join(missing)}[/red]")
-                    failed += 1
-                    continue
-                    
-                if self.manager.deploy_config(config):
-                    success += 1
-                    config.selected = False
-                    config.check_installed()
-                else:
-                    failed += 1
-                    
+            def on_result(result: DeployResult):
+                config = result.config
+                if result.missing:
+                    console.print(f"[red]✗ {config.name} - missing requirements: {', '.join(result.missing)}[/red]")
+                progress.update(task, description=f"Deployed {config.name}")
                 progress.advance(task)
                 
+            results = self.scheduler.run(selected, on_result)
+            
+        for result in results:
+            if result.ok:
+                result.config.selected = False
+                result.config.check_installed()
+        success = sum(1 for result in results if result.ok)
+        failed = len(results) - success
+                
+        print_timings(results)
         console.print(f"\n[bold]Deployment complete![/bold]")
         console.print(f"[green]✓ Success: {success}[/green]")
         if failed > 0:
@@ -497,26 +3180,26 @@ class ConfigUI:
             Prompt.ask("Press Enter to continue")
             return
             
+        configs, added = self.manager.with_prerequisites(configs)
+            
         console.print(f"\n[bold]Ready to deploy {len(configs)} configurations from {category}:[/bold]")
-        for config in configs:
-            status = "[yellow]Will overwrite[/yellow]" if config.installed else "[green]New[/green]"
-            console.print(f"  • {config.name} ({status})")
+        self.print_plan(configs, added)
             
         if not Confirm.ask("\nProceed with deployment?"):
             return
             
         console.print("\n[bold]Deploying...[/bold]\n")
         
-        for config in configs:
-            ok, missing = self.manager.check_requirements(config)
-            if not ok:
-                console.print(f"[red]✗ {config.name} - missing: {', '.join(missing)}[/red]")
-                continue
-                
-            if self.manager.deploy_config(config):
-                config.selected = False
-                config.check_installed()
+        def on_result(result: DeployResult):
+            if result.missing:
+                console.print(f"[red]✗ {result.config.name} - missing: {', '.join(result.missing)}[/red]")
                 
+        results = self.scheduler.run(configs, on_result)
+        for result in results:
+            if result.ok:
+                result.config.selected = False
+                result.config.check_installed()
+        print_timings(results)
         Prompt.ask("\nPress Enter to continue")
         
     def show_backup_menu(self):
@@ -526,27 +3209,39 @@ class ConfigUI:
         
         console.print("[bold]Backup Management[/bold]\n")
         
-        # List backups
-        if self.manager.backup_dir.exists():
-            backups = sorted(self.manager.backup_dir.glob("*.bak"), key=lambda p: p.stat().st_mtime, reverse=True)
+        try:
+            imported, left = self.manager.import_legacy_backups()
+        except OSError as e:
+            console.print(f"[red]Failed to import old backups: {e}[/red]")
+            imported, left = 0, []
+        if imported:
+            console.print(f"[green]Imported {imported} backups from before the backup store[/green]")
+        if left:
+            console.print(f"[yellow]{len(left)} old backups match no single config and were left in "
+                          f"{self.manager.backup_dir}: {', '.join(path.name for path in left)}[/yellow]")
+        
+        # List backups; restore picks from the same list instead of reloading it
+        manifests = self.manager.backups.manifests(limit=10)
+        if manifests:
+            table = Table(title="Recent Backups", box=box.ROUNDED)
+            table.add_column("#", width=3)
+            table.add_column("Snapshot", style="cyan")
+            table.add_column("Configs")
+            table.add_column("Date", style="dim")
+            table.add_column("Size", justify="right")
             
-            if backups:
-                table = Table(title="Recent Backups", box=box.ROUNDED)
-                table.add_column("#", width=3)
-                table.add_column("File", style="cyan")
-                table.add_column("Date", style="dim")
-                table.add_column("Size", justify="right")
+            for i, (path, manifest) in enumerate(manifests):
+                entries = manifest.get("entries", [])
+                date = datetime.fromisoformat(manifest["created"]).strftime("%Y-%m-%d %H:%M")
+                total = sum(entry["size"] for entry in entries)
+                size = f"{total / 1024:.1f} KB" if total > 1024 else f"{total} B"
+                names = ", ".join(entry["config"] for entry in entries[:3])
+                if len(entries) > 3:
+                    names += f" +{len(entries) - 3} more"
                 
-                for i, backup in enumerate(backups[:10]):
-                    stat = backup.stat()
-                    date = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M")
-                    size = f"{stat.st_size / 1024:.1f} KB" if stat.st_size > 1024 else f"{stat.st_size} B"
-                    
-                    table.add_row(str(i+1), backup.name, date, size)
-                    
-                console.print(table)
-            else:
-                console.print("[dim]No backups found[/dim]")
+                table.add_row(str(i+1), manifest["id"], names, date, size)
+                
+            console.print(table)
         else:
             console.print("[dim]No backups found[/dim]")
             
@@ -561,7 +3256,7 @@ class ConfigUI:
         if choice == "1":
             self.backup_all_configs()
         elif choice == "2":
-            self.restore_from_backup()
+            self.restore_from_backup(manifests)
         elif choice == "3":
             self.clean_old_backups()
             
@@ -569,45 +3264,67 @@ class ConfigUI:
         """Backup all installed configurations"""
         console.print("\n[bold]Creating backups...[/bold]\n")
         
-        backed_up = 0
-        for configs in self.manager.configs.values():
-            for config in configs:
-                if config.installed:
-                    if self.manager.create_backup(config):
-                        console.print(f"[green]✓[/green] Backed up {config.name}")
-                        backed_up += 1
-                        
-        console.print(f"\n[green]Created {backed_up} backups[/green]")
-        Prompt.ask("Press Enter to continue")
-        
-    def restore_from_backup(self):
-        """Restore a specific backup"""
-        # This would need more implementation for selecting specific backups
-        console.print("[yellow]Restore functionality coming soon![/yellow]")
+        if self.scan:
+            self.scan.wait()
+        installed = [config for config in self.manager.all_configs() if config.installed]
+        try:
+            manifest_path = self.manager.backup_configs(installed)
+        except Exception as e:
+            console.print(f"[red]Backup failed: {e}[/red]")
+            manifest_path = None
+            
+        if manifest_path:
+            for config in installed:
+                console.print(f"[green]✓[/green] Backed up {config.name}")
+            console.print(f"\n[green]Created snapshot {manifest_path.stem} with {len(installed)} configs[/green]")
+        else:
+            console.print("\n[yellow]Nothing to back up[/yellow]")
         Prompt.ask("Press Enter to continue")
         
-    def clean_old_backups(self):
-        """Clean old backup files"""
-        if not self.manager.backup_dir.exists():
-            console.print("[yellow]No backups to clean[/yellow]")
+    def restore_from_backup(self, manifests: List[Tuple[Path, dict]]):
+        """Restore every config in one of the listed snapshots"""
+        if not manifests:
+            console.print("[yellow]No backups to restore[/yellow]")
             Prompt.ask("Press Enter to continue")
             return
             
-        backups = sorted(self.manager.backup_dir.glob("*.bak"), key=lambda p: p.stat().st_mtime)
+        choice = Prompt.ask("Snapshot # to restore", choices=[str(i + 1) for i in range(len(manifests))])
+        path, manifest = manifests[int(choice) - 1]
+        entries = manifest.get("entries", [])
+        
+        console.print(f"\n[bold]Snapshot {manifest['id']} will overwrite:[/bold]")
+        for entry in entries:
+            console.print(f"  • {entry['config']} → {entry['dest']}")
+            
+        if Confirm.ask("\nProceed with restore?"):
+            restored = self.manager.restore_snapshot(path)
+            if self.scan:
+                self.scan.cancel()
+            self.scan = self.manager.scan_status(self.manager.all_configs(), background=True, refresh=True)
+            console.print(f"\n[green]Restored {restored} of {len(entries)} configs[/green]")
+        Prompt.ask("Press Enter to continue")
+        
+    def clean_old_backups(self, keep: int = 10):
+        """Drop all but the newest backups of each config, unreferenced blobs and stale renders"""
+        pinned = DeployJournal.snapshots(self.manager.journal_dir)
+        plan = self.manager.backups.gc(keep, dry_run=True, pinned=pinned)
+        renders = self.manager.prune_renders(dry_run=True)
         
-        if len(backups) <= 10:
-            console.print("[yellow]Less than 10 backups found, nothing to clean[/yellow]")
+        if not plan["entries"] and not plan["blobs"] and not renders["renders"]:
+            console.print(f"[yellow]No config has more than {keep} backups, nothing to clean[/yellow]")
             Prompt.ask("Press Enter to continue")
             return
             
-        to_delete = backups[:-10]  # Keep last 10
-        
-        console.print(f"[bold]Will delete {len(to_delete)} old backups[/bold]")
+        console.print(f"[bold]Will delete {plan['entries']} old backup entries "
+                      f"({plan['snapshots']} snapshots), {plan['blobs']} unreferenced blobs "
+                      f"and {renders['renders']} stale rendered templates[/bold]")
         
         if Confirm.ask("Proceed?"):
-            for backup in to_delete:
-                backup.unlink()
-            console.print(f"[green]Deleted {len(to_delete)} old backups[/green]")
+            result = self.manager.backups.gc(keep, pinned=DeployJournal.snapshots(self.manager.journal_dir))
+            renders = self.manager.prune_renders()
+            console.print(f"[green]Deleted {result['snapshots']} snapshots, {result['blobs']} blobs and "
+                          f"{renders['renders']} renders, "
+                          f"freed {(result['bytes'] + renders['bytes']) / 1024:.1f} KB[/green]")
         
         Prompt.ask("Press Enter to continue")
 
@@ -615,78 +3332,370 @@ def main():
     """Main entry point"""
     parser = argparse.ArgumentParser(description="Mac Setup Configuration Manager")
     parser.add_argument("--list", action="store_true", help="List all configurations")
-    parser.add_argument("--deploy", metavar="CONFIG", help="Deploy specific configuration")
+    parser.add_argument("--deploy", metavar="CONFIG", help="Deploy specific configuration (fuzzy matched)")
+    parser.add_argument("--search", metavar="QUERY", help="Search configurations by name, description or requirement")
     parser.add_argument("--category", metavar="CAT", help="Deploy all configs in category")
     parser.add_argument("--check", action="store_true", help="Check all requirements")
+    parser.add_argument("--status", action="store_true",
+                        help="Show drift between sources and deployed configs")
+    parser.add_argument("--watch", action="store_true",
+                        help="Redeploy deployed configs whenever their sources in configs/ change")
+    parser.add_argument("--watch-polling", action="store_true",
+                        help="With --watch, poll with stat() instead of using inotify")
+    parser.add_argument("--force", action="store_true",
+                        help="Redeploy configs even if they are up to date")
+    parser.add_argument("--link", action="store_true",
+                        help="Symlink or hardlink configs (per registry entry) instead of copying")
+    parser.add_argument("--registry", metavar="FILE",
+                        help="Configuration registry (default: configs/registry.json)")
+    parser.add_argument("--brew-snapshot", metavar="FILE",
+                        help="Installed-package snapshot in `brew info --json=v2 --installed` form "
+                             "(default: .config-cache/brew-snapshot.json)")
+    parser.add_argument("--refresh-brew-snapshot", action="store_true",
+                        help="Record installed Homebrew packages in the snapshot, then run any other command")
+    parser.add_argument("--backup-compression", choices=list(BackupStore.SUFFIXES), default="none",
+                        help="Compress new backup blobs (default: %(default)s)")
+    parser.add_argument("--jobs", "-j", type=int, default=DeployScheduler.DEFAULT_JOBS,
+                        help="Parallel deployments (default: %(default)s)")
+    parser.add_argument("--host", action="append", metavar="HOST",
+                        help="Run --deploy, --category or --check on HOST instead of locally: an SSH "
+                             "destination, or local:DIR to use DIR as $HOME (repeatable)")
+    parser.add_argument("--host-jobs", type=int, default=FanOutDeployer.DEFAULT_JOBS,
+                        help="Hosts handled concurrently with --host (default: %(default)s)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Record timing spans, write them to FILE and print a per-phase summary")
+    parser.add_argument("--trace-format", choices=tracer.FORMATS, default="chrome",
+                        help="Trace file format: Chrome/Perfetto trace events or OTLP JSON "
+                             "(default: %(default)s)")
+    parser.add_argument("--format", choices=["auto", "rich", "plain", "json", "ndjson"], default="auto",
+                        help="Output for non-interactive commands; auto is rich on a terminal, "
+                             "plain otherwise, json/ndjson stream one record per configuration "
+                             "(default: %(default)s)")
     
     args = parser.parse_args()
+    if args.backup_compression == "zstd" and not ZSTD_AVAILABLE:
+        parser.error("zstd compression requires the 'zstandard' package (pip3 install zstandard)")
+    if args.trace:
+        tracer.enable()
+        
+    global console
+    interactive = not (args.list or args.deploy or args.category or args.check
+                       or args.status or args.search or args.watch or args.refresh_brew_snapshot)
+    if interactive or args.format == "rich":
+        if not load_rich():
+            print("Error: the interactive UI and --format rich require the 'rich' library.", file=sys.stderr)
+            print("Please install it with: pip3 install rich", file=sys.stderr)
+            sys.exit(1)
+        console = Console()
+    elif args.format == "auto" and sys.stdout.isatty() and load_rich():
+        console = Console()
+    elif args.format in ("json", "ndjson"):
+        # Progress messages go to stderr so stdout only carries records
+        console = PlainConsole(sys.stderr)
     
     # Find project root
     script_dir = Path(__file__).parent
     project_root = script_dir.parent
     
-    manager = ConfigManager(project_root)
+    manager = None
+    try:
+        manager = ConfigManager(project_root, args.backup_compression, args.registry, args.link,
+                                args.brew_snapshot)
+        manager.recover()
+        code = run_command(manager, args)
+    except RegistryError as e:
+        console.print(f"[red]Error: {e}[/red]")
+        code = EXIT_FAILED
+    except DependencyError as e:
+        console.print(f"[red]Error in {manager.registry_file}: {e}[/red]")
+        code = EXIT_FAILED
+    finally:
+        if manager:
+            manager.close()
+        tracer.finish(args.trace, args.trace_format)
+    sys.exit(code)
+
+# Exit codes for command-line modes; argparse itself exits with 2 on bad usage
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_MISSING = 3
+EXIT_NOT_FOUND = 4
+EXIT_DRIFT = 5
+
+class RecordWriter:
+    """Report one record per configuration as text, a JSON array or NDJSON
+
+    Records are written and flushed as they are produced, so a consumer can
+    process a long run incrementally. In the JSON formats text-only lines
+    such as headings are dropped; messages still go to the console (stderr).
+    """
+    
+    def __init__(self, fmt: str, stream=None):
+        self.fmt = fmt if fmt in ("json", "ndjson") else "text"
+        self.stream = stream or sys.stdout
+        self.count = 0
+        
+    def heading(self, line: str):
+        if self.fmt == "text":
+            console.print(line)
+            
+    def write(self, record: dict, line: Optional[str] = None):
+        if self.fmt == "text":
+            if line is not None:
+                console.print(line)
+            return
+        data = json.dumps(record, ensure_ascii=False)
+        if self.fmt == "ndjson":
+            self.stream.write(data + "\n")
+        else:
+            self.stream.write(("[\n  " if self.count == 0 else ",\n  ") + data)
+        self.stream.flush()
+        self.count += 1
+        
+    def close(self):
+        if self.fmt == "json":
+            self.stream.write("[]\n" if self.count == 0 else "\n]\n")
+            self.stream.flush()
+
+def run_command(manager: ConfigManager, args: argparse.Namespace) -> int:
+    """Dispatch the parsed command line and return the process exit code"""
+    if args.refresh_brew_snapshot:
+        try:
+            count = manager.packages.capture()
+        except (OSError, ValueError, RuntimeError) as e:
+            console.print(f"[red]✗ Could not record installed packages: {e}[/red]")
+            return EXIT_FAILED
+        console.print(f"[green]✓ Recorded {count} installed packages in {manager.packages.snapshot_file}[/green]")
+        if not (args.list or args.deploy or args.category or args.check or args.status or args.search
+                or args.watch):
+            return EXIT_OK
+        
+    if not (args.list or args.deploy or args.category or args.check or args.status or args.search
+            or args.watch):
+        # Interactive TUI mode
+        ui = ConfigUI(manager, args.jobs, args.force)
+        try:
+            ui.run()
+        except KeyboardInterrupt:
+            console.print("\n[yellow]Interrupted by user[/yellow]")
+        except Exception as e:
+            console.print(f"\n[red]Error: {e}[/red]")
+            return EXIT_FAILED
+        return EXIT_OK
+        
+    out = RecordWriter(args.format)
+    try:
+        return run_report(manager, args, out)
+    finally:
+        out.close()
+        
+def lookup_config(manager: ConfigManager, query: str, out: RecordWriter) -> Optional[ConfigItem]:
+    """Find a configuration by name, falling back to a single strong fuzzy match"""
+    config = manager.find_config(query)
+    if config:
+        return config
+    suggestions = manager.search(query, 5)
+    strong = [item for item in suggestions if SearchIndex.is_strong_match(query, item)]
+    if len(strong) == 1:
+        console.print(f"[dim]Matched '{query}' to '{strong[0].name}'[/dim]")
+        return strong[0]
+    console.print(f"[red]Configuration '{query}' not found[/red]")
+    if suggestions:
+        console.print("Did you mean:")
+        for item in suggestions:
+            console.print(f"  • {item.name} [dim]({item.category})[/dim]")
+    out.write({"name": query, "status": "not found", "suggestions": [item.name for item in suggestions]})
+    return None
+
+def run_fanout(manager: ConfigManager, args: argparse.Namespace, out: RecordWriter) -> int:
+    """--deploy, --category or --check against every --host"""
+    if args.deploy:
+        config = lookup_config(manager, args.deploy, out)
+        if not config:
+            return EXIT_NOT_FOUND
+        configs = [config]
+    elif args.category:
+        configs = manager.category_configs(args.category)
+        if configs is None:
+            console.print(f"[red]Category '{args.category}' not found[/red]")
+            out.write({"category": args.category, "status": "not found"})
+            return EXIT_NOT_FOUND
+    else:
+        configs = manager.all_configs()
+        
+    deploy = not args.check
+    if deploy:
+        configs, added = manager.with_prerequisites(configs)
+        if added:
+            console.print(f"[dim]Also deploying prerequisites: {', '.join(config.name for config in added)}[/dim]")
+    
+    def on_result(result: HostResult):
+        for record in result.records(configs):
+            out.write(record)
+        if out.fmt != "text":
+            return
+        if result.error:
+            console.print(f"[red]✗ {result.host}: {result.error}[/red]")
+            return
+        action = "deployed" if deploy else "ready"
+        line = f"{len(result.ready)} {action}"
+        if result.missing:
+            line += f", {len(result.missing)} missing requirements"
+        if result.failed:
+            line += f", {len(result.failed)} failed"
+        mark = "[green]✓[/green]" if result.ok else "[red]✗[/red]"
+        console.print(f"{mark} {result.host}: {line} in {result.seconds:.2f}s")
+        for name, missing in result.missing.items():
+            console.print(f"    [yellow]{name}: missing {', '.join(missing)}[/yellow]")
+        for name, error in result.failed.items():
+            console.print(f"    [red]{name}: {error}[/red]")
+        if result.backup_path:
+            console.print(f"    [dim]backup: {result.backup_path}[/dim]")
+            
+    results = FanOutDeployer(manager, args.host, args.host_jobs).run(configs, on_result, deploy)
+    if any(not result.ok for result in results):
+        return EXIT_FAILED
+    return EXIT_MISSING if any(result.missing for result in results) else EXIT_OK
+        
+def run_batch(manager: ConfigManager, configs: List[ConfigItem], added: List[ConfigItem],
+              args: argparse.Namespace, out: RecordWriter) -> int:
+    """Deploy a batch in dependency waves, streaming one record per configuration"""
+    if added:
+        console.print(f"[dim]Also deploying prerequisites: {', '.join(config.name for config in added)}[/dim]")
+        
+    def on_result(result: DeployResult):
+        if result.missing:
+            console.print(f"[red]{result.config.name} - missing: {', '.join(result.missing)}[/red]")
+        out.write(result.record())
+        
+    results = DeployScheduler(manager, args.jobs, args.force).run(configs, on_result)
+    # A failed batch is rolled back after its records were streamed, so
+    # report the rollback as a later record for the same configuration
+    for result in results:
+        if result.rolled_back:
+            out.write(result.record())
+    if out.fmt == "text":
+        print_timings(results)
+    if any(not result.ok and not result.missing and not result.blocked_by for result in results):
+        return EXIT_FAILED
+    return EXIT_MISSING if any(result.missing for result in results) else EXIT_OK
+        
+def run_watch(manager: ConfigManager, args: argparse.Namespace, out: RecordWriter) -> int:
+    """Redeploy changed sources until interrupted, one record per deploy"""
+    watcher = ConfigWatcher(manager, args.jobs, args.watch_polling)
+    mode = f"polling every {watcher.poll_interval:g}s" if watcher.polling else "inotify"
+    console.print(f"[bold]Watching {manager.configs_dir} ({mode}), Ctrl-C to stop[/bold]")
     
+    def on_batch(results: List[DeployResult]):
+        for result in results:
+            if result.missing:
+                console.print(f"[red]{result.config.name} - missing: {', '.join(result.missing)}[/red]")
+            out.write(result.record())
+        seconds = sum(result.seconds for result in results)
+        console.print(f"[dim]{datetime.now():%H:%M:%S} batch of {len(results)} in {seconds * 1000:.1f} ms[/dim]")
+        
+    try:
+        watcher.run(on_batch)
+    except KeyboardInterrupt:
+        console.print("\n[yellow]Stopped watching[/yellow]")
+    finally:
+        watcher.close()
+    return EXIT_OK
+        
+def run_report(manager: ConfigManager, args: argparse.Namespace, out: RecordWriter) -> int:
+    """Run a non-interactive command, writing one record per configuration"""
     if args.list:
         # List mode
+        manager.scan_status(manager.all_configs())
         for category, configs in manager.configs.items():
-            console.print(f"\n[bold]{category.replace('-', ' ').title()}:[/bold]")
+            out.heading(f"\n[bold]{category.replace('-', ' ').title()}:[/bold]")
             for config in configs:
                 status = "✓" if config.installed else "✗"
-                console.print(f"  {status} {config.name}")
-    elif args.deploy:
-        # Deploy specific config
-        found = False
-        for configs in manager.configs.values():
-            for config in configs:
-                if config.name.lower() == args.deploy.lower():
-                    found = True
-                    ok, missing = manager.check_requirements(config)
-                    if not ok:
-                        console.print(f"[red]Missing requirements: {', '.join(missing)}[/red]")
-                    else:
-                        manager.deploy_config(config)
-                    break
-        if not found:
-            console.print(f"[red]Configuration '{args.deploy}' not found[/red]")
-    elif args.category:
+                out.write({"name": config.name, "category": category, "installed": config.installed},
+                          f"  {status} {config.name}")
+        return EXIT_OK
+        
+    if args.watch:
+        return run_watch(manager, args, out)
+        
+    if args.host and (args.deploy or args.category or args.check):
+        return run_fanout(manager, args, out)
+        
+    if args.deploy:
+        config = lookup_config(manager, args.deploy, out)
+        if not config:
+            return EXIT_NOT_FOUND
+        configs, added = manager.with_prerequisites([config])
+        if added:
+            return run_batch(manager, configs, added, args, out)
+        result = DeployScheduler(manager, args.jobs, args.force).deploy_one(config)
+        if result.missing:
+            console.print(f"[red]Missing requirements: {', '.join(result.missing)}[/red]")
+        out.write(result.record())
+        return EXIT_OK if result.ok else EXIT_MISSING if result.missing else EXIT_FAILED
+        
+    if args.category:
         # Deploy category
-        if args.category in manager.configs:
-            for config in manager.configs[args.category]:
-                ok, missing = manager.check_requirements(config)
-                if ok:
-                    manager.deploy_config(config)
-                else:
-                    console.print(f"[red]{config.name} - missing: {', '.join(missing)}[/red]")
-        else:
+        configs = manager.category_configs(args.category)
+        if configs is None:
             console.print(f"[red]Category '{args.category}' not found[/red]")
-    elif args.check:
-        # Check all requirements
-        console.print("[bold]Checking all requirements...[/bold]\n")
-        all_missing = set()
+            out.write({"category": args.category, "status": "not found"})
+            return EXIT_NOT_FOUND
+        return run_batch(manager, *manager.with_prerequisites(configs), args, out)
+        
+    if args.search:
+        # Ranked fuzzy search
+        results = manager.search(args.search)
+        for item in results:
+            out.write({"name": item.name, "category": item.category, "description": item.description},
+                      f"  {item.name} [dim]({item.category}) {item.description}[/dim]")
+        if not results:
+            console.print(f"[yellow]No configurations match '{args.search}'[/yellow]")
+            return EXIT_NOT_FOUND
+        return EXIT_OK
+        
+    if args.status:
+        # Show drift against the deploy-state index
+        styles = {
+            DeployState.UP_TO_DATE: "green",
+            DeployState.NOT_DEPLOYED: "dim",
+            DeployState.SOURCE_CHANGED: "cyan",
+            DeployState.DEST_CHANGED: "yellow",
+            DeployState.BOTH_CHANGED: "red",
+            DeployState.UNTRACKED: "yellow",
+            DeployState.SOURCE_MISSING: "red",
+        }
+        drift = False
+        statuses = iter(map_concurrent(manager.config_status, manager.all_configs()))
         for category, configs in manager.configs.items():
-            console.print(f"[bold]{category}:[/bold]")
+            out.heading(f"\n[bold]{category.replace('-', ' ').title()}:[/bold]")
             for config in configs:
-                ok, missing = manager.check_requirements(config)
-                if ok:
-                    console.print(f"  [green]✓[/green] {config.name}")
-                else:
-                    console.print(f"  [red]✗[/red] {config.name}: {', '.join(missing)}")
-                    all_missing.update(missing)
+                status = next(statuses)
+                drift |= status not in (DeployState.UP_TO_DATE, DeployState.NOT_DEPLOYED)
+                out.write({"name": config.name, "category": category, "status": status},
+                          f"  [{styles[status]}]{status:<20}[/{styles[status]}] {config.name}")
+        return EXIT_DRIFT if drift else EXIT_OK
         
-        if all_missing:
-            console.print(f"\n[yellow]Install missing tools with:[/yellow]")
-            console.print(f"brew install {' '.join(sorted(all_missing))}")
-    else:
-        # Interactive TUI mode
-        ui = ConfigUI(manager)
-        try:
-            ui.display_menu()
-        except KeyboardInterrupt:
-            console.print("\n[yellow]Interrupted by user[/yellow]")
-        except Exception as e:
-            console.print(f"\n[red]Error: {e}[/red]")
-            sys.exit(1)
+    # Check all requirements
+    out.heading("[bold]Checking all requirements...[/bold]\n")
+    all_missing = set()
+    for category, configs in manager.configs.items():
+        out.heading(f"[bold]{category}:[/bold]")
+        for config in configs:
+            ok, missing = manager.check_requirements(config)
+            record = {"name": config.name, "category": category, "ok": ok, "missing": missing}
+            if ok:
+                out.write(record, f"  [green]✓[/green] {config.name}")
+            else:
+                out.write(record, f"  [red]✗[/red] {config.name}: {', '.join(missing)}")
+                all_missing.update(missing)
+    
+    if all_missing:
+        out.heading(f"\n[yellow]Install missing tools with:[/yellow]")
+        for line in manager.packages.install_commands(sorted(all_missing)):
+            out.heading(line)
+        return EXIT_MISSING
+    return EXIT_OK
 
 if __name__ == "__main__":
     main()
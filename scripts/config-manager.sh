@@ -190,8 +190,9 @@ deploy_config() {
         create_backup "$dest"
     fi
     
-    # Deploy the configuration
-    if cp "$CONFIGS_DIR/$source" "$dest"; then
+    # Deploy the configuration, filling template placeholders
+    # ({{ name | default }}) with their defaults
+    if sed -E 's/\{\{ *[A-Za-z_][A-Za-z0-9_]* *\| *([^}]*[^ }]) *\}\}/\1/g' "$CONFIGS_DIR/$source" > "$dest"; then
         echo -e "${GREEN}✓${NC} Deployed $name"
         return 0
     else
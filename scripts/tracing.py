@@ -0,0 +1,186 @@
+"""
+Span tracing for the mac-setup scripts
+
+Wrap an operation in `tracer.span("name")` or decorate it with
+`@traced("name")`. Nothing is recorded until `tracer.enable()` is called:
+a disabled tracer hands out one shared no-op span, so instrumented hot paths
+cost a single attribute check. An enabled tracer keeps every finished span
+and can write them as a Chrome trace (chrome://tracing, ui.perfetto.dev) or
+as OpenTelemetry OTLP/JSON, and print a per-phase timing summary.
+"""
+
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+class Span:
+    """One timed operation; nested spans on the same thread record their parent"""
+    __slots__ = ("tracer", "name", "attrs", "start", "end", "thread", "span_id", "parent_id")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start = self.end = 0
+        self.thread = 0
+        self.span_id = next(tracer._ids)
+        self.parent_id: Optional[int] = None
+
+    def set(self, **attrs):
+        """Add attributes once the span is running"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        self.parent_id = stack[-1].span_id if stack else None
+        stack.append(self)
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._stack().pop()
+        with self.tracer._lock:
+            self.tracer.spans.append(self)
+        return False
+
+class Tracer:
+    """Collects spans while enabled and exports them at the end of a run"""
+
+    FORMATS = ("chrome", "otlp")
+
+    def __init__(self, service: str = "mac-setup"):
+        self.service = service
+        self.enabled = False
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        # Offset from perf_counter_ns to wall-clock epoch nanoseconds
+        self._epoch_offset = time.time_ns() - time.perf_counter_ns()
+
+    def enable(self):
+        self.enabled = True
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name: str, **attrs):
+        """Context manager timing one operation; a shared no-op while disabled"""
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attrs)
+
+    def summary(self) -> List[Dict[str, float]]:
+        """Count, total, mean and max milliseconds per span name, largest total first"""
+        phases: Dict[str, List[float]] = {}
+        for span in self.spans:
+            phases.setdefault(span.name, []).append((span.end - span.start) / 1e6)
+        rows = [{"name": name, "count": len(times), "total_ms": sum(times),
+                 "mean_ms": sum(times) / len(times), "max_ms": max(times)}
+                for name, times in phases.items()]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def print_summary(self, file=None):
+        """Per-phase timing table, on stderr by default so it never mixes with data output"""
+        file = file or sys.stderr
+        rows = self.summary()
+        if not rows:
+            return
+        print(f"\n{'phase':<28}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}", file=file)
+        for row in rows:
+            print(f"{row['name']:<28}{row['count']:>8}{row['total_ms']:>12.2f}"
+                  f"{row['mean_ms']:>10.3f}{row['max_ms']:>10.3f}", file=file)
+
+    def chrome_trace(self) -> dict:
+        """Spans as Chrome trace-event JSON ("X" complete events, microseconds)"""
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for span in self.spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            events.append({"name": span.name, "cat": span.name.split(".")[0], "ph": "X",
+                           "ts": span.start / 1000, "dur": (span.end - span.start) / 1000,
+                           "pid": pid, "tid": tid,
+                           "args": {key: str(value) for key, value in span.attrs.items()}})
+        events.sort(key=lambda event: event["ts"])
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_trace(self) -> dict:
+        """Spans as an OTLP/JSON ExportTraceServiceRequest, one trace per run"""
+        trace_id = os.urandom(16).hex()
+        spans = []
+        for span in self.spans:
+            record = {
+                "traceId": trace_id,
+                "spanId": f"{span.span_id:016x}",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start + self._epoch_offset),
+                "endTimeUnixNano": str(span.end + self._epoch_offset),
+                "attributes": [{"key": key, "value": {"stringValue": str(value)}}
+                               for key, value in span.attrs.items()],
+            }
+            if span.parent_id is not None:
+                record["parentSpanId"] = f"{span.parent_id:016x}"
+            if "error" in span.attrs:
+                record["status"] = {"code": 2, "message": span.attrs["error"]}
+            spans.append(record)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service}}]},
+            "scopeSpans": [{"scope": {"name": "mac-setup.tracing"}, "spans": spans}],
+        }]}
+
+    def export(self, path: str, fmt: str = "chrome"):
+        """Write the collected spans to path as a Chrome trace or OTLP/JSON"""
+        data = self.otlp_trace() if fmt == "otlp" else self.chrome_trace()
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    def finish(self, path: Optional[str], fmt: str = "chrome"):
+        """End of run: export to path if given, then print the summary"""
+        if not self.enabled:
+            return
+        if path:
+            self.export(path, fmt)
+        self.print_summary()
+
+tracer = Tracer()
+
+def traced(name: str, attrs: Optional[Callable[..., dict]] = None):
+    """Decorator recording each call as a span; attrs maps the call's arguments to span attributes"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name, **(attrs(*args, **kwargs) if attrs else {})):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -12,7 +12,18 @@ Usage:
 import os
 import re
 import sys
-from typing import Set, Dict, List, Tuple
+import json
+import atexit
+import hashlib
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from tracing import tracer, traced
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = PROJECT_ROOT / ".config-cache"
 
 # Check if neo4j driver is available
 try:
@@ -20,76 +31,649 @@ try:
     NEO4J_AVAILABLE = True
 except ImportError:
     NEO4J_AVAILABLE = False
-    print("Warning: neo4j-driver not installed. Install with: pip install neo4j")
+
+class BrewfileEntry(NamedTuple):
+    """A single Brewfile declaration"""
+    kind: str
+    name: str
+    args: Dict[str, Any]
+    line: int
+    comment: Optional[str]
+    section: Optional[str] = None
+
+# One match per line: a `kind "name"` declaration, the options that follow it
+# and an optional inline comment
+BREWFILE_LINE = re.compile(r"""
+    [ \t]*(?P<kind>tap|brew|cask|mas|vscode|whalebrew)[ \t]+
+    (?:"(?P<double>[^"]*)"|'(?P<single>[^']*)')
+    (?P<args>[^#]*)
+    (?:\#[ \t]?(?P<comment>.*))?
+""", re.VERBOSE)
+
+BREWFILE_OPTION = re.compile(r"""
+    (?P<key>\w+):\s*(?P<value>"[^"]*"|'[^']*'|\[[^\]]*\]|[^,]+)
+""", re.VERBOSE)
+
+BREWFILE_STRING = re.compile(r""""([^"]*)"|'([^']*)'""")
+
+def _parse_option_value(value: str) -> Any:
+    """Convert a Ruby literal from a Brewfile options hash to Python"""
+    value = value.strip()
+    if value[:1] in ('"', "'"):
+        return value[1:-1]
+    if value.startswith("["):
+        return [a or b for a, b in BREWFILE_STRING.findall(value)]
+    if value in ("true", "false"):
+        return value == "true"
+    if value.lstrip("-").isdigit():
+        return int(value)
+    return value
+
+def parse_brewfile_options(text: Optional[str]) -> Dict[str, Any]:
+    """Parse the `key: value, ...` options that follow a Brewfile entry's name"""
+    if not text or ":" not in text:
+        return {}
+    return {key: _parse_option_value(value) for key, value in BREWFILE_OPTION.findall(text)}
 
 class BrewfileParser:
-    """Parse Brewfile to extract tools"""
+    """Parse Brewfile to extract tools
+
+    Lines are tokenized in a single pass with one precompiled pattern into
+    typed entries. The entries are cached on disk as one list per field, a
+    cache file per Brewfile, and reused while the SHA-256 of the Brewfile's
+    contents is unchanged; `parse` reads only the kind and name columns.
+    """
     
-    def __init__(self, brewfile_path: str):
+    CACHE_VERSION = 4
+    
+    def __init__(self, brewfile_path: str, cache_dir: Optional[Path] = DEFAULT_CACHE_DIR):
         self.brewfile_path = brewfile_path
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self._columns: Optional[List[list]] = None
+        self._entries: Optional[List[BrewfileEntry]] = None
         self.formulas: Set[str] = set()
         self.casks: Set[str] = set()
+        self.taps: Set[str] = set()
+        self.mas: Set[str] = set()
+        self.vscode: Set[str] = set()
         
-    def parse(self) -> Dict[str, Set[str]]:
-        """Parse Brewfile and return formulas and casks"""
+    @property
+    def columns(self) -> List[list]:
+        """One list per BrewfileEntry field, read on first use"""
+        if self._columns is None:
+            self._columns = self.read_columns()
+        return self._columns
+        
+    @property
+    def entries(self) -> List[BrewfileEntry]:
+        """Every declaration in file order, read on first use"""
+        if self._entries is None:
+            if self.cache_dir:
+                make = tuple.__new__
+                self._entries = [make(BrewfileEntry, row) for row in zip(*self.columns)]
+            else:
+                self._entries = list(self.tokenize(self._read().decode().splitlines()))
+        return self._entries
+        
+    def _cache_path(self) -> Optional[Path]:
+        if not self.cache_dir:
+            return None
+        key = hashlib.sha256(os.path.abspath(self.brewfile_path).encode()).hexdigest()[:16]
+        return self.cache_dir / f"brewfile-v{self.CACHE_VERSION}-{key}.json"
+        
+    def tokenize(self, lines: Iterable[str]) -> Iterator[BrewfileEntry]:
+        """Yield an entry for every declaration among the Brewfile's lines
+
+        A comment line that follows a blank line starts a new section, e.g.
+        `# Database Tools`; entries remember the section they appear in.
+        """
+        match_line = BREWFILE_LINE.match
+        make = tuple.__new__
+        section = None
+        after_blank = True
+        for number, line in enumerate(lines, 1):
+            match = match_line(line)
+            if not match:
+                stripped = line.strip()
+                if after_blank and stripped.startswith('#'):
+                    section = stripped.lstrip('#').strip()
+                after_blank = not stripped
+                continue
+            after_blank = False
+            kind, double, single, args, comment = match.groups()
+            yield make(BrewfileEntry, (kind, single if double is None else double,
+                                       parse_brewfile_options(args) if ':' in args else {}, number,
+                                       comment.rstrip() if comment else None, section))
+                
+    def _read(self) -> bytes:
         if not os.path.exists(self.brewfile_path):
             raise FileNotFoundError(f"Brewfile not found at {self.brewfile_path}")
-            
-        with open(self.brewfile_path, 'r') as f:
-            for line in f:
-                line = line.strip()
+        with open(self.brewfile_path, 'rb') as f:
+            return f.read()
+        
+    def read_columns(self) -> List[list]:
+        """Entry fields as parallel lists, from the parse cache while the Brewfile's contents are unchanged"""
+        data = self._read()
+        cache_path = self._cache_path()
+        if cache_path:
+            digest = hashlib.sha256(data).hexdigest()
+            try:
+                with tracer.span("brewfile.cache_read"), open(cache_path) as f:
+                    cached = json.load(f)
+                if cached["sha256"] == digest:
+                    return cached["columns"]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
                 
-                # Skip comments and empty lines
-                if not line or line.startswith('#'):
-                    continue
-                    
-                # Match brew formulas
-                brew_match = re.match(r'brew\s+"([^"]+)"', line)
-                if brew_match:
-                    self.formulas.add(brew_match.group(1))
-                    
-                # Match cask applications
-                cask_match = re.match(r'cask\s+"([^"]+)"', line)
-                if cask_match:
-                    self.casks.add(cask_match.group(1))
+        self._entries = list(self.tokenize(data.decode().splitlines()))
+        columns = [list(column) for column in zip(*self._entries)] or [[] for _ in BrewfileEntry._fields]
+        if cache_path:
+            self._write_cache(cache_path, {"sha256": digest, "columns": columns})
+        return columns
+            
+    @traced("brewfile.cache_write")
+    def _write_cache(self, cache_path: Path, data: dict):
+        """Store the parsed entries; a failed write only costs a reparse next time"""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(data))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+        
+    @traced("brewfile.parse", lambda self: {"brewfile": self.brewfile_path})
+    def parse(self) -> Dict[str, Set[str]]:
+        """Parse Brewfile and return its tools grouped by kind"""
+        groups = {'brew': self.formulas, 'cask': self.casks, 'tap': self.taps,
+                  'mas': self.mas, 'vscode': self.vscode}
+        if self.cache_dir:
+            declared = zip(*self.columns[:2])
+        else:
+            declared = (entry[:2] for entry in self.entries)
+        for kind, name in declared:
+            if kind in groups:
+                groups[kind].add(name)
                     
         return {
             'formulas': self.formulas,
-            'casks': self.casks
+            'casks': self.casks,
+            'taps': self.taps,
+            'mas': self.mas,
+            'vscode': self.vscode,
         }
 
+def parse_brewfile_tools(path: str, cache_dir: Optional[str] = None) -> Set[str]:
+    """Formula and cask names in one Brewfile (module level so a process pool can run it)"""
+    data = BrewfileParser(path, cache_dir).parse()
+    return data['formulas'] | data['casks']
+
+@traced("brewfile.parse_many", lambda paths, *args, **kwargs: {"files": len(paths)})
+def parse_brewfiles(paths: List[str], cache_dir: Optional[str] = None,
+                    jobs: Optional[int] = None) -> Dict[str, Set[str]]:
+    """Tools of each Brewfile, parsed in a process pool when there is more than one"""
+    paths = list(dict.fromkeys(paths))
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs < 2:
+        return {path: parse_brewfile_tools(path, cache_dir) for path in paths}
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return dict(zip(paths, pool.map(parse_brewfile_tools, paths, [cache_dir] * len(paths))))
+
+def load_targets(pairs: Optional[List[str]], pairs_file: Optional[str]) -> Dict[str, str]:
+    """Project id -> Brewfile path from PROJECT=BREWFILE arguments and a JSON file
+
+    The file is a JSON object of the same pairs; relative Brewfile paths in it
+    are taken relative to the file.
+    """
+    targets: Dict[str, str] = {}
+    if pairs_file:
+        with open(pairs_file) as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{pairs_file} must map project ids to Brewfile paths")
+        base = os.path.dirname(os.path.abspath(pairs_file))
+        for project, path in data.items():
+            targets[project] = os.path.join(base, path)
+    for pair in pairs or []:
+        project, sep, path = pair.partition('=')
+        if not (sep and project and path):
+            raise ValueError(f"expected PROJECT=BREWFILE, got {pair!r}")
+        targets[project] = path
+    return targets
+
+BREW_INSTALL = re.compile(r'brew\s+install\s+(?:--cask\s+)?([^\s]+)')
+
+def brew_name_from_command(command: Optional[str]) -> Optional[str]:
+    """Extract the formula or cask name from a `brew install` command"""
+    match = BREW_INSTALL.search(command or '')
+    return match.group(1) if match else None
+
+def diff_brew_names(graph_names: Set[str], brewfile: List[str]) -> List[Dict[str, Any]]:
+    """DIFF_QUERY records for a project's graph brew names against a Brewfile"""
+    brewfile_names = set(brewfile)
+    records = [{'side': 'graph_only', 'name': name}
+               for name in sorted(graph_names) if name not in brewfile_names]
+    records += [{'side': 'brewfile_only', 'name': name}
+                for name in brewfile if name not in graph_names]
+    return records
+
 class KnowledgeGraphValidator:
-    """Validate tools in Neo4j knowledge graph"""
+    """Validate tools in Neo4j knowledge graph
+
+    The brew formula name is derived server-side, from `tool.brew_name` when
+    present or else from `tool.command` with Cypher string functions, and the
+    comparison with the Brewfile runs in the database, so only mismatches
+    travel over Bolt. One pooled session is reused for every query.
+    """
+    
+    DEFAULT_PROJECT = 'macbook-m4-max-setup'
+    
+    BREW_NAME = """coalesce(tool.brew_name,
+        CASE WHEN tool.command CONTAINS 'brew install '
+             THEN head(split(trim(replace(split(tool.command, 'brew install ')[1], '--cask ', '')), ' '))
+        END)"""
+    
+    TOOLS_QUERY = f"""
+    MATCH (p:Project {{id: $project}})-[:HAS_CATEGORY]->(cat:Category)-[:CONTAINS]->(tool:Tool)
+    WITH tool.tool_key AS key, {BREW_NAME} AS brew_name
+    WHERE brew_name IS NOT NULL
+    RETURN key, brew_name
+    """
+    
+    DIFF_QUERY = f"""
+    OPTIONAL MATCH (p:Project {{id: $project}})-[:HAS_CATEGORY]->(cat:Category)-[:CONTAINS]->(tool:Tool)
+    WITH collect(DISTINCT {BREW_NAME}) AS graph_names
+    UNWIND [name IN graph_names WHERE NOT name IN $brewfile | ['graph_only', name]] +
+           [name IN $brewfile WHERE NOT name IN graph_names | ['brewfile_only', name]] AS row
+    RETURN row[0] AS side, row[1] AS name
+    """
+    
+    # DIFF_QUERY for many projects in one round trip; $targets is a list of
+    # {project, brewfile} maps and rows carry the project they belong to
+    MULTI_DIFF_QUERY = f"""
+    UNWIND $targets AS target
+    OPTIONAL MATCH (p:Project {{id: target.project}})-[:HAS_CATEGORY]->(cat:Category)-[:CONTAINS]->(tool:Tool)
+    WITH target, collect(DISTINCT {BREW_NAME}) AS graph_names
+    UNWIND [name IN graph_names WHERE NOT name IN target.brewfile | ['graph_only', name]] +
+           [name IN target.brewfile WHERE NOT name IN graph_names | ['brewfile_only', name]] AS row
+    RETURN target.project AS project, row[0] AS side, row[1] AS name
+    """
+    
+    # What changed on the server, per project: its `updated` property, how
+    # many tools it has and the newest tool timestamp
+    MARKERS_QUERY = """
+    UNWIND $projects AS id
+    MATCH (p:Project {id: id})
+    OPTIONAL MATCH (p)-[:HAS_CATEGORY]->(:Category)-[:CONTAINS]->(tool:Tool)
+    WITH id, p.updated AS updated, count(tool) AS tools,
+         max(coalesce(tool.updated, tool.created)) AS newest
+    RETURN id AS project,
+           coalesce(toString(updated), '') + '|' + toString(tools) + '|' +
+           coalesce(toString(newest), '') AS marker
+    """
+    
+    EXPORT_QUERY = f"""
+    MATCH (p:Project {{id: $project}})-[:HAS_CATEGORY]->(cat:Category)-[:CONTAINS]->(tool:Tool)
+    RETURN cat.name AS category, tool.tool_key AS tool_key, tool.name AS name,
+           tool.command AS command, {BREW_NAME} AS brew_name
+    """
     
-    def __init__(self, uri: str, user: str, password: str):
-        if not NEO4J_AVAILABLE:
-            raise ImportError("neo4j-driver is required for knowledge graph validation")
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    SYNC_CREATE_QUERY = """
+    MATCH (p:Project {id: $project})
+    UNWIND $tools AS t
+    MERGE (cat:Category {name: t.category})
+    MERGE (p)-[:HAS_CATEGORY]->(cat)
+    MERGE (tool:Tool {tool_key: t.tool_key})
+      ON CREATE SET tool.name = t.name, tool.description = t.description,
+                    tool.command = t.command, tool.brew_name = t.brew_name,
+                    tool.status = 'active', tool.created = datetime()
+    MERGE (cat)-[:CONTAINS]->(tool)
+    """
+    
+    SYNC_PRUNE_QUERY = f"""
+    MATCH (p:Project {{id: $project}})-[:HAS_CATEGORY]->(cat:Category)-[r:CONTAINS]->(tool:Tool)
+    WHERE {BREW_NAME} IN $names
+    DELETE r
+    WITH DISTINCT tool
+    WHERE NOT (tool)<-[:CONTAINS]-()
+    DETACH DELETE tool
+    """
+    
+    def __init__(self, uri: str, user: str, password: str, project: str = DEFAULT_PROJECT,
+                 driver=None, fetch_size: int = 1000, pool_size: int = 10):
+        if driver is None:
+            if not NEO4J_AVAILABLE:
+                raise ImportError("neo4j-driver is required for knowledge graph validation")
+            with tracer.span("graph.connect", uri=uri):
+                driver = GraphDatabase.driver(uri, auth=(user, password),
+                                              max_connection_pool_size=pool_size)
+        self.driver = driver
+        self.project = project
+        self.fetch_size = fetch_size
+        self._session = None
+        
+    def session(self):
+        """The shared session, opened on first use"""
+        if self._session is None:
+            self._session = self.driver.session(fetch_size=self.fetch_size)
+        return self._session
         
     def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
         self.driver.close()
         
+    @traced("graph.tools")
     def get_tools_from_graph(self) -> Dict[str, str]:
-        """Get all tools from the knowledge graph"""
-        tools = {}
+        """Get all tools from the knowledge graph, keyed by tool_key"""
+        result = self.session().run(self.TOOLS_QUERY, project=self.project)
+        return {record['key']: record['brew_name'] for record in result}
         
-        query = """
-        MATCH (p:Project {id: 'macbook-m4-max-setup'})-[:HAS_CATEGORY]->(cat:Category)-[:CONTAINS]->(tool:Tool)
-        RETURN tool.tool_key as key, tool.name as name, tool.command as command
-        """
+    @traced("graph.diff", lambda self, brewfile_tools: {"tools": len(brewfile_tools)})
+    def diff(self, brewfile_tools: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """Return (brewfile_only, graph_only) computed by the database"""
+        brewfile_only: Set[str] = set()
+        graph_only: Set[str] = set()
+        result = self.session().run(self.DIFF_QUERY, project=self.project,
+                                    brewfile=sorted(brewfile_tools))
+        for record in result:
+            side = brewfile_only if record['side'] == 'brewfile_only' else graph_only
+            side.add(record['name'])
+        return brewfile_only, graph_only
+
+    @traced("graph.diff_projects", lambda self, targets: {"projects": len(targets)})
+    def diff_projects(self, targets: Dict[str, Set[str]]) -> Dict[str, Tuple[Set[str], Set[str]]]:
+        """(brewfile_only, graph_only) for each project, from a single query"""
+        diffs: Dict[str, Tuple[Set[str], Set[str]]] = {project: (set(), set()) for project in targets}
+        result = self.session().run(self.MULTI_DIFF_QUERY, targets=[
+            {'project': project, 'brewfile': sorted(tools)} for project, tools in targets.items()])
+        for record in result:
+            brewfile_only, graph_only = diffs[record['project']]
+            (brewfile_only if record['side'] == 'brewfile_only' else graph_only).add(record['name'])
+        return diffs
+
+    @traced("graph.markers", lambda self, projects: {"projects": len(projects)})
+    def change_markers(self, projects: List[str]) -> Dict[str, str]:
+        """Change marker of each project that exists on the server"""
+        result = self.session().run(self.MARKERS_QUERY, projects=list(projects))
+        return {record['project']: record['marker'] for record in result}
         
-        with self.driver.session() as session:
-            result = session.run(query)
-            for record in result:
-                key = record['key']
-                command = record['command'] or ''
-                
-                # Extract brew formula/cask name from command
-                brew_match = re.search(r'brew\s+install\s+(?:--cask\s+)?([^\s]+)', command)
-                if brew_match:
-                    tools[key] = brew_match.group(1)
-                    
-        return tools
+    def export(self, project: str):
+        """Every (category, tool) row of a project, with the derived brew name"""
+        return self.session().run(self.EXPORT_QUERY, project=project)
+
+    @traced("graph.sync", lambda self, plan, *args, **kwargs: {"create": len(plan.create),
+                                                              "prune": len(plan.prune)})
+    def apply_sync(self, plan: "GraphSyncPlan", batch_size: int = 1000):
+        """Apply a sync plan in a single transaction, in batches of UNWIND rows"""
+        tx = self.session().begin_transaction()
+        try:
+            for start in range(0, len(plan.create), batch_size):
+                tx.run(self.SYNC_CREATE_QUERY, project=self.project,
+                       tools=plan.create[start:start + batch_size])
+            for start in range(0, len(plan.prune), batch_size):
+                tx.run(self.SYNC_PRUNE_QUERY, project=self.project,
+                       names=plan.prune[start:start + batch_size])
+            tx.commit()
+        except Exception:
+            tx.rollback()
+            raise
+
+class GraphSyncPlan:
+    """Changes that bring a project's graph in line with the Brewfile
+
+    Missing tools are created under the category their Brewfile section maps
+    to; tools only in the graph are pruned when requested.
+    """
+    
+    SECTION_CATEGORIES = {
+        'Command Line Tools': 'Terminal_Environment',
+        'Development Tools': 'Programming_Languages',
+        'Database Tools': 'Database_Tools',
+        'Cloud and DevOps Tools': 'Cloud_DevOps_Tools',
+        'Additional Tools': 'Terminal_Environment',
+        'Cask Applications (GUI Apps)': 'Development_IDEs',
+        'Fonts (for terminal and coding)': 'Terminal_Environment',
+        'Java Development Kits': 'Programming_Languages',
+        'Cloud Platform Tools': 'Cloud_DevOps_Tools',
+        'Additional Development Tools': 'Development_IDEs',
+    }
+    DEFAULT_CATEGORY = 'System_Tools'
+    
+    def __init__(self, project: str, create: List[Dict[str, str]], prune: List[str]):
+        self.project = project
+        self.create = create
+        self.prune = prune
+        
+    @staticmethod
+    def tool_key(name: str) -> str:
+        """Lower-case, hyphenated key in the style of existing Tool nodes"""
+        return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+        
+    @classmethod
+    def build(cls, project: str, entries: List[BrewfileEntry], brewfile_only: Set[str],
+              graph_only: Set[str], prune: bool = False,
+              section_categories: Optional[Dict[str, str]] = None) -> "GraphSyncPlan":
+        """Plan creations for brewfile_only tools and, optionally, removal of graph_only ones"""
+        categories = dict(cls.SECTION_CATEGORIES, **(section_categories or {}))
+        create = []
+        seen = set()
+        for entry in entries:
+            if entry.kind not in ('brew', 'cask') or entry.name not in brewfile_only or entry.name in seen:
+                continue
+            seen.add(entry.name)
+            cask = '--cask ' if entry.kind == 'cask' else ''
+            create.append({
+                'tool_key': cls.tool_key(entry.name),
+                'name': entry.name,
+                'description': entry.comment or '',
+                'command': f'brew install {cask}{entry.name}',
+                'brew_name': entry.name,
+                'category': categories.get(entry.section, cls.DEFAULT_CATEGORY),
+            })
+        return cls(project, create, sorted(graph_only) if prune else [])
+        
+    def print_plan(self, dry_run: bool):
+        """Print the planned changes grouped by category"""
+        print("\n" + "="*60)
+        print(f"GRAPH SYNC PLAN FOR {self.project}" + (" (DRY RUN)" if dry_run else ""))
+        print("="*60)
+        by_category: Dict[str, List[str]] = {}
+        for tool in self.create:
+            by_category.setdefault(tool['category'], []).append(tool['name'])
+        print(f"\nCREATE {len(self.create)} tools:")
+        for category in sorted(by_category):
+            print(f"  {category}:")
+            for name in sorted(by_category[category]):
+                print(f"    + {name}")
+        if self.prune:
+            print(f"\nPRUNE {len(self.prune)} tools:")
+            for name in self.prune:
+                print(f"    - {name}")
+        print("\n" + "="*60)
+
+class InMemoryGraphDriver:
+    """In-process stand-in for a Neo4j driver
+
+    Answers KnowledgeGraphValidator's queries from a dict mapping project ids
+    to lists of tool properties (`tool_key`, `name`, `command`, `brew_name`,
+    `category`), so validation can run without a Bolt server. Only the queries
+    defined on the validator are understood.
+    """
+    
+    def __init__(self, projects: Dict[str, List[Dict[str, Any]]]):
+        self.projects = projects
+        self.queries_run = 0
+        self.records_returned = 0
+        
+    @classmethod
+    def from_json(cls, path: str) -> "InMemoryGraphDriver":
+        with open(path) as f:
+            return cls(json.load(f))
+        
+    def session(self, **config):
+        return self
+        
+    def begin_transaction(self):
+        return self
+        
+    def commit(self):
+        pass
+        
+    def rollback(self):
+        pass
+        
+    def close(self):
+        pass
+        
+    def _brew_names(self, project: str) -> Dict[str, str]:
+        names = {}
+        for tool in self.projects.get(project, []):
+            brew_name = tool.get('brew_name') or brew_name_from_command(tool.get('command'))
+            if brew_name:
+                names[tool['tool_key']] = brew_name
+        return names
+        
+    def _diff(self, project: str, brewfile: List[str]) -> List[Dict[str, Any]]:
+        return diff_brew_names(set(self._brew_names(project).values()), brewfile)
+        
+    def run(self, query: str, **params) -> List[Dict[str, Any]]:
+        self.queries_run += 1
+        if query == KnowledgeGraphValidator.TOOLS_QUERY:
+            records = [{'key': key, 'brew_name': name}
+                       for key, name in self._brew_names(params['project']).items()]
+        elif query == KnowledgeGraphValidator.DIFF_QUERY:
+            records = self._diff(params['project'], params['brewfile'])
+        elif query == KnowledgeGraphValidator.MULTI_DIFF_QUERY:
+            records = [dict(record, project=target['project']) for target in params['targets']
+                       for record in self._diff(target['project'], target['brewfile'])]
+        elif query == KnowledgeGraphValidator.MARKERS_QUERY:
+            records = [{'project': project, 'marker': hashlib.sha256(json.dumps(
+                           self.projects[project], sort_keys=True, default=str).encode()).hexdigest()[:16]}
+                       for project in params['projects'] if project in self.projects]
+        elif query == KnowledgeGraphValidator.EXPORT_QUERY:
+            records = [{'category': tool.get('category'), 'tool_key': tool['tool_key'],
+                        'name': tool.get('name'), 'command': tool.get('command'),
+                        'brew_name': tool.get('brew_name') or brew_name_from_command(tool.get('command'))}
+                       for tool in self.projects.get(params['project'], [])]
+        elif query == KnowledgeGraphValidator.SYNC_CREATE_QUERY:
+            tools = self.projects.setdefault(params['project'], [])
+            existing = {tool['tool_key'] for tool in tools}
+            tools.extend(dict(tool) for tool in params['tools'] if tool['tool_key'] not in existing)
+            records = []
+        elif query == KnowledgeGraphValidator.SYNC_PRUNE_QUERY:
+            names = set(params['names'])
+            self.projects[params['project']] = [
+                tool for tool in self.projects.get(params['project'], [])
+                if (tool.get('brew_name') or brew_name_from_command(tool.get('command'))) not in names
+            ]
+            records = []
+        else:
+            raise NotImplementedError("InMemoryGraphDriver does not understand this query")
+        self.records_returned += len(records)
+        return records
+
+class GraphSnapshot:
+    """Offline copy of projects' Category/Tool subgraphs in SQLite
+
+    Has the same driver interface as InMemoryGraphDriver and answers the
+    validator's read queries from an indexed table that stores each tool's
+    derived brew name, so validation needs no server. `refresh` re-exports a
+    project only when its change marker on the server differs from the one
+    recorded at the last export, and drops projects the server no longer
+    has. The file is a cache: a schema change simply
+    starts it over.
+    """
+    
+    SCHEMA_VERSION = 1
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS projects (
+        id TEXT PRIMARY KEY,
+        marker TEXT NOT NULL,
+        exported TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS tools (
+        project TEXT NOT NULL,
+        category TEXT NOT NULL,
+        tool_key TEXT NOT NULL,
+        name TEXT,
+        command TEXT,
+        brew_name TEXT,
+        PRIMARY KEY (project, category, tool_key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS tools_by_brew_name ON tools (project, brew_name);
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS tools; DROP TABLE IF EXISTS projects;")
+            self.db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.db.executescript(self.SCHEMA)
+        self.queries_run = 0
+        self.records_returned = 0
+        
+    def session(self, **config):
+        return self
+        
+    def close(self):
+        self.db.close()
+        
+    def projects(self) -> Dict[str, Tuple[str, str]]:
+        """Marker and export time of every project in the snapshot"""
+        return {row[0]: (row[1], row[2]) for row in self.db.execute("SELECT id, marker, exported FROM projects")}
+        
+    @traced("snapshot.refresh", lambda self, validator, projects: {"projects": len(projects)})
+    def refresh(self, validator: KnowledgeGraphValidator,
+                projects: List[str]) -> Tuple[List[str], List[str]]:
+        """Re-export the projects whose server marker moved and drop those the
+        server no longer has; returns the refreshed and the removed projects"""
+        markers = validator.change_markers(projects)
+        stored = self.projects()
+        stale = [project for project in projects
+                 if project in markers and stored.get(project, (None,))[0] != markers[project]]
+        removed = [project for project in projects if project in stored and project not in markers]
+        exported = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        with self.db:
+            for project in removed:
+                self.db.execute("DELETE FROM tools WHERE project = ?", (project,))
+                self.db.execute("DELETE FROM projects WHERE id = ?", (project,))
+            for project in stale:
+                self.db.execute("DELETE FROM tools WHERE project = ?", (project,))
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO tools VALUES (?, ?, ?, ?, ?, ?)",
+                    ((project, record['category'] or '', record['tool_key'], record['name'],
+                      record['command'], record['brew_name']) for record in validator.export(project)))
+                self.db.execute("INSERT OR REPLACE INTO projects VALUES (?, ?, ?)",
+                                (project, markers[project], exported))
+        return stale, removed
+        
+    def _brew_names(self, project: str) -> Set[str]:
+        return {row[0] for row in self.db.execute(
+            "SELECT DISTINCT brew_name FROM tools WHERE project = ? AND brew_name IS NOT NULL", (project,))}
+        
+    def _diff(self, project: str, brewfile: List[str]) -> List[Dict[str, Any]]:
+        return diff_brew_names(self._brew_names(project), brewfile)
+        
+    def run(self, query: str, **params) -> List[Dict[str, Any]]:
+        self.queries_run += 1
+        if query == KnowledgeGraphValidator.TOOLS_QUERY:
+            records = [{'key': key, 'brew_name': name} for key, name in self.db.execute(
+                "SELECT tool_key, brew_name FROM tools WHERE project = ? AND brew_name IS NOT NULL",
+                (params['project'],))]
+        elif query == KnowledgeGraphValidator.DIFF_QUERY:
+            records = self._diff(params['project'], params['brewfile'])
+        elif query == KnowledgeGraphValidator.MULTI_DIFF_QUERY:
+            records = [dict(record, project=target['project']) for target in params['targets']
+                       for record in self._diff(target['project'], target['brewfile'])]
+        else:
+            raise NotImplementedError("GraphSnapshot is read-only and answers only validation queries")
+        self.records_returned += len(records)
+        return records
 
 class ValidationReport:
     """Generate validation report"""
@@ -100,6 +684,7 @@ class ValidationReport:
         self.matched: Set[str] = set()
         self.command_mismatches: List[Tuple[str, str, str]] = []
         
+    @traced("report.compare")
     def compare(self, brewfile_tools: Set[str], graph_tools: Dict[str, str]):
         """Compare Brewfile tools with graph tools"""
         graph_formulas = set(graph_tools.values())
@@ -114,6 +699,13 @@ class ValidationReport:
             elif formula in brewfile_tools:
                 self.matched.add(formula)
                 
+    def record_diff(self, brewfile_tools: Set[str], brewfile_only: Set[str], graph_only: Set[str]):
+        """Fill the report from a diff computed by the database"""
+        self.brewfile_only = set(brewfile_only)
+        self.graph_only = set(graph_only)
+        self.matched = brewfile_tools - self.brewfile_only
+                
+    @traced("output")
     def print_report(self):
         """Print validation report"""
         print("\n" + "="*60)
@@ -160,6 +752,119 @@ class ValidationReport:
                 
         print("\n" + "="*60)
 
+@traced("output")
+def print_project_reports(reports: Dict[str, ValidationReport], targets: Dict[str, str]):
+    """One summary line per project, then the mismatched tools of each project that has any"""
+    print("\n" + "="*60)
+    print(f"BREWFILE vs KNOWLEDGE GRAPH: {len(reports)} PROJECTS")
+    print("="*60)
+    width = max([len('project')] + [len(project) for project in reports])
+    print(f"\n  {'project':<{width}} {'brewfile':>9} {'graph':>7} {'matched':>8} "
+          f"{'brew only':>10} {'graph only':>11}")
+    for project, report in reports.items():
+        print(f"  {project:<{width}} {len(report.matched) + len(report.brewfile_only):>9} "
+              f"{len(report.matched) + len(report.graph_only):>7} {len(report.matched):>8} "
+              f"{len(report.brewfile_only):>10} {len(report.graph_only):>11}")
+    for project, report in reports.items():
+        if not (report.brewfile_only or report.graph_only):
+            continue
+        print(f"\n{project} ({targets[project]}):")
+        if report.brewfile_only:
+            print(f"  Only in Brewfile: {', '.join(sorted(report.brewfile_only))}")
+        if report.graph_only:
+            print(f"  Only in graph: {', '.join(sorted(report.graph_only))}")
+    in_sync = sum(1 for report in reports.values() if not (report.brewfile_only or report.graph_only))
+    print(f"\n{in_sync} of {len(reports)} projects in sync")
+    print("\n" + "="*60)
+
+def validate_projects(args, neo4j_password: Optional[str], driver=None) -> int:
+    """--pair/--pairs mode: every Brewfile parsed in parallel, every project diffed in one query"""
+    try:
+        targets = load_targets(args.pair, args.pairs)
+        print(f"Parsing {len(set(targets.values()))} Brewfiles for {len(targets)} projects")
+        tools = parse_brewfiles(list(targets.values()), None if args.no_cache else args.cache_dir, args.jobs)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+    project_tools = {project: tools[path] for project, path in targets.items()}
+    
+    if driver is None and args.snapshot and not args.skip_graph:
+        try:
+            driver = open_snapshot(args, neo4j_password, list(project_tools))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error reading graph snapshot: {e}")
+            return 1
+    if driver is None and (args.skip_graph or not NEO4J_AVAILABLE or not neo4j_password):
+        print_skip_reason(args, neo4j_password)
+        for project, names in project_tools.items():
+            print(f"  {project}: {len(names)} tools in {targets[project]}")
+        return 0
+        
+    if driver is None:
+        print("\nConnecting to Neo4j knowledge graph...")
+    try:
+        validator = KnowledgeGraphValidator(args.neo4j_uri, args.neo4j_user, neo4j_password,
+                                            driver=driver, fetch_size=args.fetch_size)
+        try:
+            diffs = validator.diff_projects(project_tools)
+        finally:
+            validator.close()
+    except Exception as e:
+        print(f"Error validating knowledge graph: {e}")
+        return 1
+    reports = {}
+    for project, (brewfile_only, graph_only) in diffs.items():
+        reports[project] = ValidationReport()
+        reports[project].record_diff(project_tools[project], brewfile_only, graph_only)
+    print_project_reports(reports, targets)
+    return 1 if any(report.brewfile_only or report.graph_only for report in reports.values()) else 0
+
+def open_snapshot(args, neo4j_password: Optional[str], projects: List[str]) -> GraphSnapshot:
+    """The --snapshot store, first refreshed from the server when one is configured and not --offline
+
+    A failed refresh falls back to the stored rows, and is an error when a
+    project has none yet.
+    """
+    online = not args.offline and NEO4J_AVAILABLE and neo4j_password
+    if not online and not os.path.exists(args.snapshot):
+        raise FileNotFoundError(f"no graph snapshot at {args.snapshot}; create it with a live server first")
+    snapshot = GraphSnapshot(args.snapshot)
+    if online:
+        try:
+            validator = KnowledgeGraphValidator(args.neo4j_uri, args.neo4j_user, neo4j_password,
+                                                fetch_size=args.fetch_size)
+            try:
+                refreshed, removed = snapshot.refresh(validator, projects)
+            finally:
+                validator.close()
+            print(f"Graph snapshot {args.snapshot}: refreshed {len(refreshed)} of {len(projects)} projects")
+            for project in removed:
+                print(f"Removed {project} from the graph snapshot, the server no longer has it")
+        except Exception as e:
+            empty = [project for project in projects if project not in snapshot.projects()]
+            if empty:
+                snapshot.close()
+                raise ConnectionError(f"could not refresh graph snapshot, which has no rows for "
+                                      f"{', '.join(empty)} yet: {e}") from e
+            print(f"Warning: could not refresh graph snapshot, using it as is: {e}")
+    stored = snapshot.projects()
+    for project in projects:
+        if project in stored:
+            print(f"Using snapshot of {project} exported {stored[project][1]}")
+        else:
+            print(f"Warning: {project} is not in the graph snapshot and counts as empty")
+    return snapshot
+
+def print_skip_reason(args, neo4j_password: Optional[str]):
+    """Why the graph comparison is not running"""
+    if args.skip_graph:
+        print("\nSkipping knowledge graph validation (--skip-graph specified)")
+    elif not NEO4J_AVAILABLE:
+        print("\nSkipping knowledge graph validation (neo4j-driver not installed)")
+    elif not neo4j_password:
+        print("\nSkipping knowledge graph validation (no password provided)")
+        print("Set NEO4J_PASSWORD environment variable or use --neo4j-password")
+
 def main():
     """Main validation function"""
     # Parse command line arguments
@@ -170,33 +875,106 @@ def main():
     parser.add_argument('--neo4j-user', default='neo4j', help='Neo4j username')
     parser.add_argument('--neo4j-password', help='Neo4j password (or set NEO4J_PASSWORD env var)')
     parser.add_argument('--skip-graph', action='store_true', help='Skip knowledge graph validation')
+    parser.add_argument('--project', default=KnowledgeGraphValidator.DEFAULT_PROJECT,
+                        help='Knowledge graph project id')
+    parser.add_argument('--pair', action='append', metavar='PROJECT=BREWFILE',
+                        help='Validate BREWFILE against graph project PROJECT (repeatable)')
+    parser.add_argument('--pairs', metavar='FILE',
+                        help='JSON object mapping project ids to Brewfile paths, validated together')
+    parser.add_argument('--jobs', type=int, help='Processes parsing Brewfiles with --pair/--pairs '
+                                                 '(default: one per CPU)')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='Validate against a SQLite snapshot of the graph, refreshed first from the '
+                             'server (when configured) for projects that changed')
+    parser.add_argument('--offline', action='store_true',
+                        help='With --snapshot, never contact the server')
+    parser.add_argument('--fetch-size', type=int, default=1000, help='Records fetched per Bolt round trip')
+    parser.add_argument('--sync', action='store_true',
+                        help='Create missing tools in the graph instead of only reporting them')
+    parser.add_argument('--prune', action='store_true',
+                        help='With --sync, also remove tools that are not in the Brewfile')
+    parser.add_argument('--dry-run', action='store_true', help='With --sync, only print the plan')
+    parser.add_argument('--category-map', metavar='FILE',
+                        help='JSON object mapping Brewfile section comments to graph categories')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per UNWIND batch when syncing')
+    parser.add_argument('--cache-dir', default=str(DEFAULT_CACHE_DIR), help='Directory for the Brewfile parse cache')
+    parser.add_argument('--no-cache', action='store_true', help='Always reparse the Brewfile')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Record timing spans, write them to FILE and print a per-phase summary')
+    parser.add_argument('--trace-format', choices=tracer.FORMATS, default='chrome',
+                        help='Trace file format (default: %(default)s)')
     
     args = parser.parse_args()
+    if not NEO4J_AVAILABLE:
+        print("Warning: neo4j-driver not installed. Install with: pip install neo4j")
+    if args.trace:
+        tracer.enable()
+        # Registered at exit so the trace is written on every sys.exit path too
+        atexit.register(tracer.finish, args.trace, args.trace_format)
     
     # Get Neo4j password from env or args
     neo4j_password = args.neo4j_password or os.environ.get('NEO4J_PASSWORD')
     
+    if args.sync and args.snapshot:
+        parser.error('--sync writes to the live graph; drop --snapshot')
+    if args.offline and not args.snapshot:
+        parser.error('--offline needs --snapshot')
+    if args.pair or args.pairs:
+        if args.sync:
+            parser.error('--sync works on one --brewfile and --project at a time')
+        sys.exit(validate_projects(args, neo4j_password))
+    
     # Parse Brewfile
     print(f"Parsing Brewfile at: {args.brewfile}")
-    parser = BrewfileParser(args.brewfile)
+    parser = BrewfileParser(args.brewfile, None if args.no_cache else args.cache_dir)
     brewfile_data = parser.parse()
     
     all_brewfile_tools = brewfile_data['formulas'] | brewfile_data['casks']
     print(f"Found {len(all_brewfile_tools)} tools in Brewfile")
     
+    if args.snapshot and not args.skip_graph:
+        try:
+            validator = KnowledgeGraphValidator(None, None, None, args.project,
+                                                driver=open_snapshot(args, neo4j_password, [args.project]))
+            report = ValidationReport()
+            report.compare(all_brewfile_tools, validator.get_tools_from_graph())
+            validator.close()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error reading graph snapshot: {e}")
+            sys.exit(1)
+        print(f"Found {len(report.matched) + len(report.graph_only)} tools in the graph snapshot")
+        report.print_report()
+        sys.exit(1 if report.brewfile_only or report.graph_only else 0)
+    
     # Validate against knowledge graph if available
     if not args.skip_graph and NEO4J_AVAILABLE and neo4j_password:
         print("\nConnecting to Neo4j knowledge graph...")
         try:
-            validator = KnowledgeGraphValidator(args.neo4j_uri, args.neo4j_user, neo4j_password)
-            graph_tools = validator.get_tools_from_graph()
-            print(f"Found {len(graph_tools)} tools in knowledge graph")
+            validator = KnowledgeGraphValidator(args.neo4j_uri, args.neo4j_user, neo4j_password,
+                                                args.project, fetch_size=args.fetch_size)
+            brewfile_only, graph_only = validator.diff(all_brewfile_tools)
             
             # Generate report
             report = ValidationReport()
-            report.compare(all_brewfile_tools, graph_tools)
+            report.record_diff(all_brewfile_tools, brewfile_only, graph_only)
+            print(f"Found {len(report.matched) + len(report.graph_only)} tools in knowledge graph")
             report.print_report()
             
+            if args.sync and (report.brewfile_only or (args.prune and report.graph_only)):
+                section_categories = None
+                if args.category_map:
+                    with open(args.category_map) as f:
+                        section_categories = json.load(f)
+                plan = GraphSyncPlan.build(args.project, parser.entries, report.brewfile_only,
+                                           report.graph_only, args.prune, section_categories)
+                plan.print_plan(args.dry_run)
+                if not args.dry_run:
+                    validator.apply_sync(plan, args.batch_size)
+                    print(f"Synced: created {len(plan.create)}, pruned {len(plan.prune)} tools")
+                    validator.close()
+                    unresolved = report.graph_only if not args.prune else set()
+                    sys.exit(1 if unresolved else 0)
+            
             validator.close()
             
             # Exit with error if discrepancies found
@@ -207,17 +985,14 @@ def main():
             print(f"Error validating knowledge graph: {e}")
             sys.exit(1)
     else:
-        if args.skip_graph:
-            print("\nSkipping knowledge graph validation (--skip-graph specified)")
-        elif not NEO4J_AVAILABLE:
-            print("\nSkipping knowledge graph validation (neo4j-driver not installed)")
-        elif not neo4j_password:
-            print("\nSkipping knowledge graph validation (no password provided)")
-            print("Set NEO4J_PASSWORD environment variable or use --neo4j-password")
+        print_skip_reason(args, neo4j_password)
             
         print("\nBrewfile Summary:")
+        print(f"  Taps: {len(brewfile_data['taps'])}")
         print(f"  Formulas: {len(brewfile_data['formulas'])}")
         print(f"  Casks: {len(brewfile_data['casks'])}")
+        print(f"  Mac App Store: {len(brewfile_data['mas'])}")
+        print(f"  VS Code extensions: {len(brewfile_data['vscode'])}")
         print(f"  Total: {len(all_brewfile_tools)}")
 
 if __name__ == "__main__":